@@ -3,13 +3,18 @@ Backtester mejorado para usar datos reales de Kraken.
 Realiza backtesting significativo con datos históricos.
 """
 
-import json
 import logging
-from typing import Dict, List, Optional
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 import numpy as np
+import orjson
 
-from backtester import Backtester
+from backtester import Backtester, OHLCVFrame
 from download_historical_data import KrakenDataDownloader
 
 
@@ -20,20 +25,177 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def _npy_cache_dir(filename: str) -> str:
+    """
+    Obtener el directorio de caché binaria asociado a un archivo JSON.
+    
+    Args:
+        filename: Archivo JSON de datos
+        
+    Returns:
+        Ruta del directorio con un .npy por par
+    """
+    return os.path.splitext(filename)[0] + "_npy"
+
+
+# Lista de pares del JSON, escrita al final: su presencia marca una caché completa
+_NPY_MANIFEST = "pairs.json"
+
+
+def _load_npy_cache(filename: str) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Cargar la caché .npy si está completa y no es más antigua que el JSON.
+    
+    Args:
+        filename: Archivo JSON de datos
+        
+    Returns:
+        Datos por par mapeados en memoria, o None si la caché no es válida
+    """
+    cache_dir = _npy_cache_dir(filename)
+    manifest_path = os.path.join(cache_dir, _NPY_MANIFEST)
+    if not os.path.isfile(manifest_path):
+        return None
+    
+    with open(manifest_path, 'rb') as f:
+        pairs = orjson.loads(f.read())
+    
+    # Los shards deben ser exactamente los pares del manifiesto
+    shards = {name[:-4] for name in os.listdir(cache_dir) if name.endswith(".npy")}
+    if not pairs or shards != set(pairs):
+        return None
+    
+    json_mtime = os.path.getmtime(filename)
+    paths = [manifest_path] + [os.path.join(cache_dir, f"{pair}.npy") for pair in pairs]
+    if any(os.path.getmtime(path) < json_mtime for path in paths):
+        return None
+    
+    return {
+        pair: np.load(path, mmap_mode='r')
+        for pair, path in zip(pairs, paths[1:])
+    }
+
+
+def _write_npy_cache(
+    filename: str,
+    items: Iterable[Tuple[str, List[List]]]
+) -> Dict[str, np.ndarray]:
+    """
+    Convertir datos JSON a float64 y guardarlos como .npy por par.
+    
+    Los shards se escriben en un directorio temporal que sustituye a la
+    caché anterior solo si la conversión termina: no quedan shards de
+    pares que ya no están en el JSON ni cachés parciales.
+    
+    Args:
+        filename: Archivo JSON de origen
+        items: Pares (par, datos OHLCV), consumidos uno a uno
+        
+    Returns:
+        Datos por par mapeados en memoria desde la caché recién escrita
+    """
+    cache_dir = _npy_cache_dir(filename)
+    tmp_dir = tempfile.mkdtemp(
+        prefix=".tmp-", suffix="_npy", dir=os.path.dirname(cache_dir) or "."
+    )
+    
+    pairs = []
+    try:
+        for pair, ohlcv_data in items:
+            np.save(os.path.join(tmp_dir, f"{pair}.npy"), np.asarray(ohlcv_data, dtype=np.float64))
+            pairs.append(pair)
+        with open(os.path.join(tmp_dir, _NPY_MANIFEST), 'wb') as f:
+            f.write(orjson.dumps(pairs))
+        
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    
+    logger.info(f"Caché binaria escrita en {cache_dir}")
+    return {
+        pair: np.load(os.path.join(cache_dir, f"{pair}.npy"), mmap_mode='r')
+        for pair in pairs
+    }
+
+
+def _run_one(
+    pair: str,
+    ohlcv_data: List[List],
+    lookback_period: int,
+    initial_capital: float,
+    include_curve: bool = False
+) -> Dict:
+    """
+    Ejecutar el backtest de un par (función de módulo para poder usarla en procesos).
+    
+    Args:
+        pair: Par de trading
+        ohlcv_data: Datos OHLCV
+        lookback_period: Período de lookback
+        initial_capital: Capital inicial
+        include_curve: Incluir la cola de la curva de equity en el reporte
+        
+    Returns:
+        Resultados del backtest
+    """
+    backtester = Backtester(initial_capital=initial_capital)
+    return backtester.run_backtest(
+        ohlcv_data=OHLCVFrame.from_rows(ohlcv_data),
+        pair=pair,
+        lookback_period=lookback_period,
+        include_curve=include_curve
+    )
+
+
+@lru_cache(maxsize=8)
+def _load_cached(filename: str, mtime: float) -> Dict[str, np.ndarray]:
+    """
+    Cargar datos de un archivo, memorizando el resultado por (archivo, mtime).
+    
+    Args:
+        filename: Archivo JSON de datos
+        mtime: Fecha de modificación del archivo (invalida la entrada al cambiar)
+        
+    Returns:
+        Datos por par (arrays mapeados en memoria si la caché .npy es válida)
+    """
+    try:
+        cached = _load_npy_cache(filename)
+        if cached is not None:
+            logger.info(f"Datos cargados desde caché binaria de {filename}")
+            return cached
+    except (OSError, ValueError) as e:
+        logger.warning(f"Caché binaria inválida, se regenera: {e}")
+    
+    # Convertir par a par para no tener todo el JSON en memoria a la vez
+    try:
+        cached = _write_npy_cache(filename, KrakenDataDownloader.iter_data(filename))
+    except (OSError, ValueError) as e:
+        logger.warning(f"No se pudo escribir la caché binaria: {e}")
+        return KrakenDataDownloader.load_data(filename)
+    
+    return cached
+
+
 class RealDataBacktester:
     """
     Backtester con datos reales de Kraken.
     Permite validar la estrategia con histórico real.
     """
     
-    def __init__(self, initial_capital: float = 10000.0):
+    def __init__(self, initial_capital: float = 10000.0, include_curve: bool = False):
         """
         Inicializar backtester.
         
         Args:
             initial_capital: Capital inicial
+            include_curve: Incluir la cola de la curva de equity en cada reporte
         """
         self.initial_capital = initial_capital
+        self.include_curve = include_curve
         self.downloader = KrakenDataDownloader()
         self.results = {}
         
@@ -72,17 +234,29 @@ class RealDataBacktester:
         
         return data
     
-    def load_data(self, filename: str) -> Dict[str, List[List]]:
+    def load_data(self, filename: str) -> Dict[str, np.ndarray]:
         """
         Cargar datos desde archivo.
         
+        La primera carga convierte el JSON a una caché .npy por par;
+        las siguientes la mapean en memoria sin volver a parsear el JSON.
+        Dentro del mismo proceso el resultado se reutiliza mientras el
+        archivo no cambie. Los archivos .npz se leen directamente.
+        
         Args:
             filename: Archivo de datos
             
         Returns:
-            Datos cargados
+            Datos cargados (arrays float64 por par)
         """
-        return self.downloader.load_data(filename)
+        if filename.endswith(".npz"):
+            return self.downloader.load_data_npz(filename)
+        
+        if not os.path.exists(filename):
+            return self.downloader.load_data(filename)
+        
+        # Copia superficial: el llamador puede modificar el dict sin afectar la caché
+        return dict(_load_cached(filename, os.path.getmtime(filename)))
     
     def run_backtest_single_pair(
         self,
@@ -105,57 +279,73 @@ class RealDataBacktester:
         logger.info(f"BACKTESTING: {pair}")
         logger.info(f"{'='*60}")
         
-        # Crear backtester
-        backtester = Backtester(initial_capital=self.initial_capital)
-        
-        # Ejecutar backtest
-        report = backtester.run_backtest(
-            ohlcv_data=ohlcv_data,
-            pair=pair,
-            lookback_period=lookback_period
+        report = _run_one(
+            pair, ohlcv_data, lookback_period, self.initial_capital, self.include_curve
         )
+        self._publish_report(pair, report)
         
-        # Mostrar resultados
+        return report
+    
+    def _publish_report(self, pair: str, report: Dict):
+        """
+        Mostrar y guardar el reporte de un par.
+        
+        Args:
+            pair: Par de trading
+            report: Resultados del backtest
+        """
         if report:
-            backtester.print_report(report)
+            Backtester.print_report(report)
             
             # Guardar reporte
             report_file = f"backtest_report_{pair}.json"
-            backtester.save_report(report, report_file)
-        
-        return report
+            Backtester.save_report(report, report_file)
     
     def run_backtest_multiple_pairs(
         self,
         data: Dict[str, List[List]],
-        lookback_period: int = 200
+        lookback_period: int = 200,
+        max_workers: Optional[int] = None
     ) -> Dict[str, Dict]:
         """
         Ejecutar backtest para múltiples pares.
         
+        Cada par se simula en un proceso independiente; los reportes se
+        muestran y guardan desde el proceso principal en el orden de entrada.
+        
         Args:
             data: Diccionario con datos por par
             lookback_period: Período de lookback
+            max_workers: Número máximo de procesos (None = núcleos disponibles)
             
         Returns:
             Resultados por par
         """
         results = {}
+        futures = {}
         
-        for pair, ohlcv_data in data.items():
-            if not ohlcv_data:
-                logger.warning(f"Sin datos para {pair}")
-                continue
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for pair, ohlcv_data in data.items():
+                if len(ohlcv_data) == 0:
+                    logger.warning(f"Sin datos para {pair}")
+                    continue
+                
+                logger.info(f"\nProcesando {pair}...")
+                futures[pair] = executor.submit(
+                    _run_one, pair, ohlcv_data, lookback_period,
+                    self.initial_capital, self.include_curve
+                )
             
-            logger.info(f"\nProcesando {pair}...")
-            report = self.run_backtest_single_pair(
-                pair=pair,
-                ohlcv_data=ohlcv_data,
-                lookback_period=lookback_period
-            )
-            
-            if report:
-                results[pair] = report
+            for pair, future in futures.items():
+                report = future.result()
+                
+                logger.info(f"\n{'='*60}")
+                logger.info(f"BACKTESTING: {pair}")
+                logger.info(f"{'='*60}")
+                self._publish_report(pair, report)
+                
+                if report:
+                    results[pair] = report
         
         self.results = results
         return results
@@ -174,11 +364,11 @@ class RealDataBacktester:
         summary = {
             "total_pairs": len(self.results),
             "pairs_analyzed": list(self.results.keys()),
-            "summary_by_pair": {},
             "aggregate_metrics": {}
         }
         
-        # Recopilar métricas por par
+        # Agregar las métricas de cada par directamente desde su reporte
+        # (el detalle por par ya está en backtest_report_<par>.json)
         total_trades = 0
         total_wins = 0
         total_pnl = 0.0
@@ -187,36 +377,21 @@ class RealDataBacktester:
         max_drawdowns = []
         sharpe_ratios = []
         
-        for pair, report in self.results.items():
+        for report in self.results.values():
             backtest_summary = report.get("backtest_summary", {})
             trading_stats = report.get("trading_statistics", {})
+            md = backtest_summary.get("max_drawdown", 0)
+            sr = backtest_summary.get("sharpe_ratio", 0)
             
-            pair_summary = {
-                "initial_capital": backtest_summary.get("initial_capital"),
-                "final_capital": backtest_summary.get("final_capital"),
-                "total_return": backtest_summary.get("total_return"),
-                "total_pnl": backtest_summary.get("total_return_pnl"),
-                "max_drawdown": backtest_summary.get("max_drawdown"),
-                "sharpe_ratio": backtest_summary.get("sharpe_ratio"),
-                "total_trades": trading_stats.get("total_trades"),
-                "win_rate": trading_stats.get("win_rate"),
-                "profit_factor": trading_stats.get("profit_factor")
-            }
-            
-            summary["summary_by_pair"][pair] = pair_summary
-            
-            # Agregar a totales
             total_trades += trading_stats.get("total_trades", 0)
             total_wins += trading_stats.get("winning_trades", 0)
             total_pnl += backtest_summary.get("total_return_pnl", 0)
             total_profit += trading_stats.get("total_profit", 0)
             total_loss += trading_stats.get("total_loss", 0)
             
-            md = backtest_summary.get("max_drawdown", 0)
             if md != 0:
                 max_drawdowns.append(md)
             
-            sr = backtest_summary.get("sharpe_ratio", 0)
             if sr != 0:
                 sharpe_ratios.append(sr)
         
@@ -241,6 +416,8 @@ class RealDataBacktester:
         """
         Imprimir reporte resumen.
         
+        El detalle por par se lee de los reportes de self.results.
+        
         Args:
             summary: Reporte resumen
         """
@@ -255,17 +432,20 @@ class RealDataBacktester:
         logger.info(f"Pares: {', '.join(summary.get('pairs_analyzed', []))}")
         
         logger.info("\n--- RESUMEN POR PAR ---")
-        for pair, metrics in summary.get("summary_by_pair", {}).items():
+        for pair in summary.get("pairs_analyzed", []):
+            report = self.results.get(pair, {})
+            metrics = report.get("backtest_summary", {})
+            stats = report.get("trading_statistics", {})
             logger.info(f"\n{pair}:")
             logger.info(f"  Capital inicial:    ${metrics.get('initial_capital', 0):,.2f}")
             logger.info(f"  Capital final:      ${metrics.get('final_capital', 0):,.2f}")
             logger.info(f"  Retorno:            {metrics.get('total_return', 0):.2%}")
-            logger.info(f"  PnL:                ${metrics.get('total_pnl', 0):,.2f}")
+            logger.info(f"  PnL:                ${metrics.get('total_return_pnl', 0):,.2f}")
             logger.info(f"  Max Drawdown:       {metrics.get('max_drawdown', 0):.2%}")
             logger.info(f"  Sharpe Ratio:       {metrics.get('sharpe_ratio', 0):.2f}")
-            logger.info(f"  Total Trades:       {metrics.get('total_trades', 0)}")
-            logger.info(f"  Win Rate:           {metrics.get('win_rate', 0):.2%}")
-            logger.info(f"  Profit Factor:      {metrics.get('profit_factor', 0):.2f}")
+            logger.info(f"  Total Trades:       {stats.get('total_trades', 0)}")
+            logger.info(f"  Win Rate:           {stats.get('win_rate', 0):.2%}")
+            logger.info(f"  Profit Factor:      {stats.get('profit_factor', 0):.2f}")
         
         aggregate = summary.get("aggregate_metrics", {})
         logger.info("\n--- MÉTRICAS AGREGADAS ---")
@@ -290,8 +470,8 @@ class RealDataBacktester:
             filename: Nombre del archivo
         """
         try:
-            with open(filename, 'w') as f:
-                json.dump(summary, f, indent=2)
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
             logger.info(f"Reporte resumen guardado en {filename}")
         except Exception as e:
             logger.error(f"Error guardando reporte: {e}")
@@ -3,12 +3,14 @@ Backtester para validar la estrategia de trading.
 Simula trading histórico para evaluar rendimiento.
 """
 
-import json
 import logging
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union, Optional
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 import numpy as np
+import orjson
 
+from numba_compat import njit
 from technical_analysis import MarketDataProcessor
 from signal_generator import SignalGenerator, SignalType
 from risk_manager import RiskManager, RiskConfig, PositionStatus
@@ -21,6 +23,87 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# Firma explícita: se compila al importar (o se carga de la caché en disco)
+# en lugar de compilarse en la primera llamada dentro del backtest
+@njit("UniTuple(float64, 3)(float64[:])", cache=True, error_model='numpy')
+def _equity_stats(equity: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Calcular en una sola pasada el máximo drawdown y la media y
+    desviación estándar (poblacional) de los log-retornos por vela.
+    
+    Args:
+        equity: Curva de equity
+        
+    Returns:
+        Tupla (max_drawdown, log_retorno_medio, volatilidad)
+    """
+    peak = equity[0]
+    max_drawdown = 0.0
+    mean = 0.0
+    m2 = 0.0
+    
+    for i in range(1, equity.shape[0]):
+        # Retornos con el algoritmo de Welford (estable en una pasada)
+        r = np.log(equity[i] / equity[i-1])
+        delta = r - mean
+        mean += delta / i
+        m2 += delta * (r - mean)
+        
+        # Drawdown respecto al máximo acumulado
+        if equity[i] > peak:
+            peak = equity[i]
+        dd = equity[i] / peak - 1.0
+        if dd < max_drawdown:
+            max_drawdown = dd
+    
+    count = equity.shape[0] - 1
+    volatility = np.sqrt(m2 / count) if count > 0 else 0.0
+    return max_drawdown, mean, volatility
+
+
+@dataclass(frozen=True, slots=True)
+class OHLCVFrame:
+    """Datos OHLCV como columnas contiguas (una por campo) más el bloque de filas"""
+    timestamps: np.ndarray
+    opens: np.ndarray
+    highs: np.ndarray
+    lows: np.ndarray
+    closes: np.ndarray
+    volumes: np.ndarray
+    rows: np.ndarray
+    
+    @classmethod
+    def from_rows(cls, ohlcv_data: Union[List[List], np.ndarray]) -> "OHLCVFrame":
+        """
+        Construir el frame a partir de filas OHLCV.
+        
+        Acepta el formato del backtester [time, open, high, low, close, 0, volume],
+        el de Kraken [time, open, high, low, close, vwap, volume, count] y el
+        de velas en vivo [time, open, high, low, close, volume].
+        
+        Args:
+            ohlcv_data: Filas OHLCV (lista o array 2D)
+            
+        Returns:
+            OHLCVFrame con columnas float64 contiguas
+        """
+        rows = np.ascontiguousarray(ohlcv_data, dtype=np.float64)
+        volume_col = 6 if rows.shape[1] > 6 else 5
+        
+        return cls(
+            timestamps=rows[:, 0].astype(np.int64),
+            opens=rows[:, 1].copy(),
+            highs=rows[:, 2].copy(),
+            lows=rows[:, 3].copy(),
+            closes=rows[:, 4].copy(),
+            volumes=rows[:, volume_col].copy(),
+            rows=rows
+        )
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
 class Backtester:
     """
     Backtester para validar estrategia de trading.
@@ -46,9 +129,12 @@ class Backtester:
         self.commission = commission
         
         # Componentes
+        # Sin persistencia: cada backtest parte de un estado limpio y no
+        # comparte bot_state.json con el bot ni con otros backtests en paralelo
         risk_config = RiskConfig(
             total_capital=initial_capital,
-            risk_per_trade=risk_per_trade
+            risk_per_trade=risk_per_trade,
+            state_file=None
         )
         self.risk_manager = RiskManager(risk_config)
         self.signal_generator = SignalGenerator()
@@ -57,24 +143,26 @@ class Backtester:
         # Estadísticas
         self.trades_executed = 0
         self.total_commission = 0.0
-        self.equity_curve = [initial_capital]
-        self.timestamps = []
+        self.equity_curve = np.array([initial_capital], dtype=np.float64)
+        self.timestamps = np.empty(0, dtype=np.int64)
         
         logger.info(f"Backtester inicializado con capital: {initial_capital}")
     
     def run_backtest(
         self,
-        ohlcv_data: List[List],
+        ohlcv_data: Union[List[List], np.ndarray, OHLCVFrame],
         pair: str = "BTC/USD",
-        lookback_period: int = 200
+        lookback_period: int = 200,
+        include_curve: bool = False
     ) -> Dict:
         """
         Ejecutar backtest.
         
         Args:
-            ohlcv_data: Datos OHLCV históricos
+            ohlcv_data: Datos OHLCV históricos (OHLCVFrame, lista de velas o array 2D)
             pair: Par de trading
             lookback_period: Período de lookback para indicadores
+            include_curve: Incluir en el reporte las últimas 100 velas de equity
             
         Returns:
             Diccionario con resultados del backtest
@@ -86,16 +174,38 @@ class Backtester:
             logger.error(f"Datos insuficientes: {len(ohlcv_data)} < {lookback_period}")
             return {}
         
+        # Convertir una sola vez a columnas contiguas; las ventanas son vistas sin copia
+        if isinstance(ohlcv_data, OHLCVFrame):
+            frame = ohlcv_data
+        else:
+            frame = OHLCVFrame.from_rows(ohlcv_data)
+        
+        # Preasignar curva de equity y timestamps
+        num_steps = len(frame) - lookback_period
+        self.equity_curve = np.empty(num_steps + 1, dtype=np.float64)
+        self.equity_curve[0] = self.initial_capital
+        self.timestamps = frame.timestamps[lookback_period:].copy()
+        
+        # Enlazar columnas y métodos fuera del bucle; tolist() convierte
+        # precios y timestamps a objetos Python una sola vez
+        rows = frame.rows
+        closes = frame.closes.tolist()
+        timestamps = frame.timestamps.tolist()
+        equity_curve = self.equity_curve
+        generate_signal = self.signal_generator.generate_signal
+        get_current_capital = self.risk_manager.get_current_capital
+        execute_signal = self._execute_signal
+        monitor_positions = self._monitor_positions
+        
         # Procesar cada vela
-        for i in range(lookback_period, len(ohlcv_data)):
+        for i in range(lookback_period, len(rows)):
             # Obtener ventana de datos
-            window_data = ohlcv_data[i-lookback_period:i]
-            current_candle = ohlcv_data[i]
-            current_price = float(current_candle[4])  # Close
-            timestamp = current_candle[0]
+            window_data = rows[i-lookback_period:i]
+            current_price = closes[i]
+            timestamp = timestamps[i]
             
             # Generar señal
-            signal = self.signal_generator.generate_signal(
+            signal = generate_signal(
                 window_data,
                 current_price,
                 atr_multiplier=2.0
@@ -103,18 +213,16 @@ class Backtester:
             
             # Ejecutar señal
             if signal:
-                self._execute_signal(pair, signal, current_price, timestamp)
+                execute_signal(pair, signal, current_price, timestamp)
             
             # Monitorear posiciones
-            self._monitor_positions(pair, current_price, timestamp)
+            monitor_positions(pair, current_price, timestamp)
             
             # Registrar equity
-            current_equity = self.risk_manager.get_current_capital()
-            self.equity_curve.append(current_equity)
-            self.timestamps.append(timestamp)
+            equity_curve[i - lookback_period + 1] = get_current_capital()
         
         # Generar reporte
-        return self._generate_backtest_report()
+        return self._generate_backtest_report(include_curve)
     
     def _execute_signal(
         self,
@@ -165,7 +273,7 @@ class Backtester:
         if success:
             self.trades_executed += 1
             logger.debug(
-                f"Señal ejecutada: {side.upper()} {volume:.4f} {pair} @ {current_price:.2f}"
+                "Señal ejecutada: %s %.4f %s @ %.2f", side.upper(), volume, pair, current_price
             )
     
     def _monitor_positions(
@@ -182,46 +290,54 @@ class Backtester:
             current_price: Precio actual
             timestamp: Timestamp
         """
-        for position_id, position in list(self.risk_manager.positions.items()):
-            if position.pair != pair:
-                continue
-            
+        risk_manager = self.risk_manager
+        
+        # Los cierres se difieren hasta terminar de recorrer el índice del par
+        closes = []
+        for position_id in risk_manager.iter_pair_position_ids(pair):
             # Actualizar precio
-            self.risk_manager.update_position_price(position_id, current_price)
+            risk_manager.update_position_price(position_id, current_price)
             
-            # Verificar stop loss
-            if self.risk_manager.check_stop_loss(position_id, current_price):
-                self.risk_manager.close_position_stop_loss(position_id, current_price)
-                logger.debug(f"Stop loss ejecutado: {position_id}")
+            # Verificar stop loss (tiene prioridad sobre el take profit)
+            if risk_manager.check_stop_loss(position_id, current_price):
+                closes.append((position_id, 0))
+                continue
             
             # Verificar take profit
-            tp_level, reached = self.risk_manager.check_take_profit(position_id, current_price)
+            tp_level, reached = risk_manager.check_take_profit(position_id, current_price)
             if reached:
-                self.risk_manager.close_position_partial(position_id, tp_level, current_price)
-                logger.debug(f"Take profit {tp_level} ejecutado: {position_id}")
+                closes.append((position_id, tp_level))
+        
+        for position_id, tp_level in closes:
+            if tp_level == 0:
+                risk_manager.close_position_stop_loss(position_id, current_price)
+                logger.debug("Stop loss ejecutado: %s", position_id)
+            else:
+                risk_manager.close_position_partial(position_id, tp_level, current_price)
+                logger.debug("Take profit %d ejecutado: %s", tp_level, position_id)
     
-    def _generate_backtest_report(self) -> Dict:
+    def _generate_backtest_report(self, include_curve: bool = False) -> Dict:
         """
         Generar reporte de backtest.
         
+        Args:
+            include_curve: Incluir la cola de la curva de equity y sus timestamps
+            
         Returns:
             Diccionario con resultados
         """
         stats = self.risk_manager.get_statistics()
         
         # Calcular métricas adicionales
-        equity_array = np.array(self.equity_curve)
-        returns = np.diff(equity_array) / equity_array[:-1]
+        equity_array = self.equity_curve
         
-        # Sharpe Ratio (asumiendo 252 días de trading)
-        annual_return = (equity_array[-1] / self.initial_capital) ** (252 / len(self.equity_curve)) - 1
-        daily_volatility = np.std(returns)
-        sharpe_ratio = (annual_return / 252) / (daily_volatility + 1e-10) if daily_volatility > 0 else 0
+        # Drawdown y log-retornos en una sola pasada sobre la curva, sin
+        # arrays temporales de retornos (ni np.diff ni división por vela)
+        max_drawdown, mean_log_return, daily_volatility = _equity_stats(equity_array)
         
-        # Máximo drawdown
-        cummax = np.maximum.accumulate(equity_array)
-        drawdown = (equity_array - cummax) / cummax
-        max_drawdown = np.min(drawdown)
+        # Sharpe Ratio anualizado (asumiendo 252 días de trading)
+        annual_return = np.exp(mean_log_return * 252) - 1
+        sharpe_ratio = mean_log_return / daily_volatility * np.sqrt(252) if daily_volatility > 0 else 0.0
         
         # Recovery factor
         recovery_factor = stats["total_pnl"] / abs(max_drawdown * self.initial_capital) if max_drawdown != 0 else 0
@@ -238,14 +354,17 @@ class Backtester:
                 "recovery_factor": recovery_factor,
                 "total_commission": self.total_commission
             },
-            "trading_statistics": stats,
-            "equity_curve": self.equity_curve[-100:],  # Últimas 100 velas
-            "timestamps": self.timestamps[-100:] if self.timestamps else []
+            "trading_statistics": stats
         }
         
+        if include_curve:
+            report["equity_curve"] = self.equity_curve[-100:]  # Últimas 100 velas
+            report["timestamps"] = self.timestamps[-100:]
+        
         return report
     
-    def print_report(self, report: Dict):
+    @staticmethod
+    def print_report(report: Dict):
         """
         Imprimir reporte de backtest.
         
@@ -286,7 +405,8 @@ class Backtester:
         
         logger.info("\n" + "=" * 60)
     
-    def save_report(self, report: Dict, filename: str = "backtest_report.json"):
+    @staticmethod
+    def save_report(report: Dict, filename: str = "backtest_report.json"):
         """
         Guardar reporte en archivo.
         
@@ -294,8 +414,8 @@ class Backtester:
             report: Reporte de backtest
             filename: Nombre del archivo
         """
-        with open(filename, 'w') as f:
-            json.dump(report, f, indent=2)
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
         logger.info(f"Reporte guardado en {filename}")
 
 
@@ -303,8 +423,9 @@ def generate_sample_data(
     initial_price: float = 100.0,
     num_candles: int = 1000,
     volatility: float = 0.02,
-    trend: float = 0.0001
-) -> List[List]:
+    trend: float = 0.0001,
+    seed: Optional[int] = None
+) -> np.ndarray:
     """
     Generar datos OHLCV de ejemplo para backtesting.
     
@@ -313,40 +434,35 @@ def generate_sample_data(
         num_candles: Número de velas
         volatility: Volatilidad diaria
         trend: Tendencia diaria
+        seed: Semilla del generador aleatorio (None = no determinista)
         
     Returns:
-        Lista de datos OHLCV
+        Array (num_candles, 7) con [time, open, high, low, close, 0, volume]
     """
-    ohlcv_data = []
-    current_price = initial_price
+    rng = np.random.default_rng(seed)
+    
+    # Generar todos los movimientos de precio de una vez
+    daily_returns = rng.normal(trend, volatility, num_candles)
+    hi_noise = np.abs(rng.normal(0, volatility / 2, num_candles))
+    lo_noise = np.abs(rng.normal(0, volatility / 2, num_candles))
+    volumes = rng.uniform(900, 1100, num_candles)
+    
+    closes = initial_price * np.cumprod(1 + daily_returns)
+    opens = np.concatenate(([initial_price], closes[:-1]))
     
-    for i in range(num_candles):
-        # Generar movimiento de precio
-        daily_return = np.random.normal(trend, volatility)
-        
-        open_price = current_price
-        high = open_price * (1 + abs(np.random.normal(0, volatility/2)))
-        low = open_price * (1 - abs(np.random.normal(0, volatility/2)))
-        close = open_price * (1 + daily_return)
-        volume = np.random.uniform(900, 1100)
-        
-        # Asegurar que high >= close >= low
-        high = max(high, close)
-        low = min(low, close)
-        
-        ohlcv_data.append([
-            i,  # timestamp
-            open_price,
-            high,
-            low,
-            close,
-            0,  # unused
-            volume
-        ])
-        
-        current_price = close
+    # Asegurar que high >= close >= low
+    highs = np.maximum(opens * (1 + hi_noise), closes)
+    lows = np.minimum(opens * (1 - lo_noise), closes)
     
-    return ohlcv_data
+    return np.column_stack((
+        np.arange(num_candles, dtype=np.float64),  # timestamp
+        opens,
+        highs,
+        lows,
+        closes,
+        np.zeros(num_candles),  # unused
+        volumes
+    ))
 
 
 if __name__ == "__main__":
@@ -362,7 +478,7 @@ if __name__ == "__main__":
     # Ejecutar backtest
     logger.info("Ejecutando backtest...")
     backtester = Backtester(initial_capital=10000.0)
-    report = backtester.run_backtest(sample_data)
+    report = backtester.run_backtest(sample_data, include_curve=True)
     
     # Mostrar resultados
     backtester.print_report(report)
@@ -4,12 +4,23 @@ Obtiene datos OHLCV reales para backtesting.
 """
 
 import os
-import json
 import time
 import logging
-from typing import List, Dict, Optional
+import urllib.parse
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 from datetime import datetime, timedelta
-import requests
+import numpy as np
+import orjson
+
+from http_session import create_session
+from rate_limiter import TokenBucket
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 logging.basicConfig(
     level=logging.INFO,
@@ -43,41 +54,124 @@ class KrakenDataDownloader:
     
     # Límites de Kraken API
     MAX_CANDLES_PER_REQUEST = 720  # Máximo de velas por solicitud
-    RATE_LIMIT_DELAY = 0.5  # Segundos entre solicitudes
+    RATE_LIMIT_PER_SECOND = 1.0  # Solicitudes repuestas por segundo
+    RATE_LIMIT_BURST = 15  # Ráfaga máxima (nivel Starter de Kraken)
+    MAX_CONCURRENT_DOWNLOADS = 4  # Pares descargados en paralelo
+    POOL_MAXSIZE = 32  # Conexiones keep-alive reutilizables
+    PAIRS_CACHE_TTL = 3600  # Segundos de validez de la lista de pares
+    QUOTE_SUFFIXES = ("USD", "USDT", "USDC")  # Monedas de cotización aceptadas
     
-    def __init__(self):
-        """Inicializar descargador"""
-        self.session = requests.Session()
+    def __init__(
+        self,
+        rate_limit: Optional[float] = None,
+        rate_burst: Optional[float] = None
+    ):
+        """
+        Inicializar descargador.
+        
+        Args:
+            rate_limit: Solicitudes por segundo (None = RATE_LIMIT_PER_SECOND)
+            rate_burst: Ráfaga permitida (None = RATE_LIMIT_BURST)
+        """
+        self.session = create_session(pool_maxsize=self.POOL_MAXSIZE)
+        # Bucket compartido por todas las descargas: solo espera si se agota
+        self._bucket = TokenBucket(
+            rate_limit or self.RATE_LIMIT_PER_SECOND,
+            rate_burst or self.RATE_LIMIT_BURST
+        )
+        # (expiración monotónica, pares) de la última consulta a AssetPairs
+        self._pairs_cache: Optional[Tuple[float, List[str]]] = None
+        self._pairs_metadata: Dict[str, Dict] = {}
         logger.info("Descargador de datos Kraken inicializado")
     
+    def _fetch_asset_pairs(self, pairs: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Consultar el endpoint AssetPairs en una sola solicitud.
+        
+        Args:
+            pairs: Pares a consultar (None = todos)
+            
+        Returns:
+            Metadatos por par (clave canónica de Kraken)
+            
+        Raises:
+            Exception: Si la solicitud falla o Kraken devuelve error
+        """
+        url = f"{self.BASE_URL}/0/public/AssetPairs"
+        if pairs:
+            url += "?" + urllib.parse.urlencode({"pair": ",".join(pairs)})
+        
+        self._bucket.acquire()
+        response = self.session.get(url, timeout=10)
+        response.raise_for_status()
+        
+        data = orjson.loads(response.content)
+        if data.get("error"):
+            raise Exception(f"Error de Kraken: {data['error']}")
+        return data.get("result", {})
+    
+    def _pairs_cache_valid(self) -> bool:
+        """Indicar si la caché de AssetPairs sigue vigente"""
+        return self._pairs_cache is not None and time.monotonic() < self._pairs_cache[0]
+    
     def get_available_pairs(self) -> List[str]:
         """
         Obtener lista de pares disponibles en Kraken.
         
+        El resultado y los metadatos de AssetPairs se cachean durante
+        PAIRS_CACHE_TTL segundos.
+        
         Returns:
             Lista de pares (ej: ["XBTUSD", "ETHUSD"])
         """
+        if self._pairs_cache_valid():
+            return list(self._pairs_cache[1])
+        
         try:
-            url = f"{self.BASE_URL}/0/public/AssetPairs"
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            if data.get("error"):
-                logger.error(f"Error de Kraken: {data['error']}")
-                return []
+            metadata = self._fetch_asset_pairs()
+        except Exception as e:
+            logger.error("Error obteniendo pares: %s", e)
+            return []
+        
+        # Filtrar pares principales (cotizados en USD y stablecoins)
+        suffixes = self.QUOTE_SUFFIXES
+        pairs = sorted(
+            pair_name for pair_name in metadata
+            if pair_name.endswith(suffixes)
+        )
+        
+        self._pairs_cache = (time.monotonic() + self.PAIRS_CACHE_TTL, pairs)
+        self._pairs_metadata = metadata
+        return list(pairs)
+    
+    def get_tradable_pairs_batch(self, pairs: List[str]) -> Dict[str, Dict]:
+        """
+        Obtener metadatos de varios pares con una sola solicitud.
+        
+        Si la caché de AssetPairs está vigente y contiene todos los pares
+        (por nombre canónico o altname) no se hace ninguna solicitud.
+        
+        Args:
+            pairs: Lista de pares (ej: ["XBTUSD", "ETHUSD"])
             
-            pairs = []
-            for pair_name, pair_info in data.get("result", {}).items():
-                # Filtrar pares principales (USD)
-                if "USD" in pair_name and not pair_name.endswith(".d"):
-                    pairs.append(pair_name)
+        Returns:
+            Metadatos por par (clave canónica de Kraken)
+        """
+        if self._pairs_cache_valid():
+            by_name = {}
+            for key, info in self._pairs_metadata.items():
+                by_name[key] = (key, info)
+                by_name.setdefault(info.get("altname"), (key, info))
             
-            return sorted(pairs)
+            found = [by_name.get(pair) for pair in pairs]
+            if all(found):
+                return dict(found)
         
+        try:
+            return self._fetch_asset_pairs(pairs)
         except Exception as e:
-            logger.error(f"Error obteniendo pares: {e}")
-            return []
+            logger.error("Error obteniendo metadatos de pares: %s", e)
+            return {}
     
     def download_ohlc(
         self,
@@ -99,89 +193,94 @@ class KrakenDataDownloader:
             Lista de datos OHLCV
         """
         if timeframe not in self.TIMEFRAMES:
-            logger.error(f"Timeframe no válido: {timeframe}")
+            logger.error("Timeframe no válido: %s", timeframe)
             return []
         
         interval = self.TIMEFRAMES[timeframe]
         ohlcv_data = []
         
         try:
-            params = {
-                "pair": pair,
-                "interval": interval
-            }
-            
-            if since:
-                params["since"] = since
+            # La parte fija de la query se codifica una sola vez; solo cambia since
+            base_url = (
+                f"{self.BASE_URL}{self.OHLC_ENDPOINT}?"
+                + urllib.parse.urlencode({"pair": pair, "interval": interval})
+            )
             
-            logger.info(f"Descargando {limit} velas de {pair} ({timeframe})")
+            logger.info("Descargando %d velas de %s (%s)", limit, pair, timeframe)
             
             while len(ohlcv_data) < limit:
-                response = self.session.get(
-                    f"{self.BASE_URL}{self.OHLC_ENDPOINT}",
-                    params=params,
-                    timeout=10
-                )
+                # Respetar límite de rate
+                self._bucket.acquire()
+                url = f"{base_url}&since={since}" if since else base_url
+                response = self.session.get(url, timeout=10)
                 response.raise_for_status()
                 
-                data = response.json()
+                data = orjson.loads(response.content)
                 
                 if data.get("error"):
-                    logger.error(f"Error de Kraken: {data['error']}")
+                    logger.error("Error de Kraken: %s", data['error'])
                     break
                 
                 result = data.get("result", {})
                 
-                if pair not in result:
-                    logger.error(f"Par no encontrado: {pair}")
+                # Kraken responde con el nombre canónico (ej: XXBTZUSD)
+                # aunque se pida el altname (XBTUSD)
+                candles = result.get(pair)
+                if candles is None:
+                    candles = next((v for k, v in result.items() if k != "last"), None)
+                if candles is None:
+                    logger.error("Par no encontrado: %s", pair)
                     break
                 
-                candles = result[pair]
                 if not candles:
                     logger.info("No hay más datos disponibles")
                     break
                 
-                # Agregar velas
-                for candle in candles:
-                    ohlcv_data.append(candle)
-                    if len(ohlcv_data) >= limit:
-                        break
+                # Agregar velas (copia en bloque hasta el límite)
+                ohlcv_data.extend(candles[:limit - len(ohlcv_data)])
                 
                 # Obtener timestamp de la última vela para la siguiente solicitud
                 last_timestamp = candles[-1][0]
                 
-                # Verificar si hay más datos
+                # Verificar si hay más datos: una página incompleta es la última,
+                # así se evita una solicitud extra que volvería vacía
                 last_result = result.get("last")
-                if not last_result or last_result == last_timestamp:
+                if (
+                    not last_result
+                    or last_result == last_timestamp
+                    or len(candles) < self.MAX_CANDLES_PER_REQUEST
+                ):
                     logger.info("Se alcanzó el final de los datos")
                     break
                 
                 # Actualizar since para la siguiente solicitud
-                params["since"] = last_result
-                
-                # Respetar límite de rate
-                time.sleep(self.RATE_LIMIT_DELAY)
+                since = last_result
             
-            logger.info(f"Descargadas {len(ohlcv_data)} velas")
-            return ohlcv_data[:limit]
+            logger.info("Descargadas %d velas", len(ohlcv_data))
+            return ohlcv_data
         
         except Exception as e:
-            logger.error(f"Error descargando datos: {e}")
+            logger.error("Error descargando datos: %s", e)
             return []
     
     def download_multiple_pairs(
         self,
         pairs: List[str],
         timeframe: str = "5m",
-        days: int = 30
+        days: int = 30,
+        max_concurrency: Optional[int] = None
     ) -> Dict[str, List[List]]:
         """
         Descargar datos de múltiples pares.
         
+        Los pares se descargan en paralelo; todas las solicitudes comparten
+        el mismo token bucket, por lo que el total respeta el rate limit.
+        
         Args:
             pairs: Lista de pares
             timeframe: Timeframe
             days: Número de días históricos a descargar
+            max_concurrency: Descargas simultáneas (None = MAX_CONCURRENT_DOWNLOADS)
             
         Returns:
             Diccionario con datos por par
@@ -192,20 +291,24 @@ class KrakenDataDownloader:
         interval_minutes = self.TIMEFRAMES[timeframe]
         num_candles = (days * 24 * 60) // interval_minutes
         
-        logger.info(f"Descargando {num_candles} velas por par para {len(pairs)} pares")
+        logger.info("Descargando %d velas por par para %d pares", num_candles, len(pairs))
         
-        for pair in pairs:
-            logger.info(f"Procesando {pair}...")
-            data = self.download_ohlc(pair, timeframe, limit=num_candles)
-            
+        # requests libera el GIL durante la E/S: los hilos solapan la latencia
+        with ThreadPoolExecutor(
+            max_workers=max_concurrency or self.MAX_CONCURRENT_DOWNLOADS
+        ) as executor:
+            futures = {
+                pair: executor.submit(self.download_ohlc, pair, timeframe, None, num_candles)
+                for pair in pairs
+            }
+        
+        for pair, future in futures.items():
+            data = future.result()
             if data:
                 all_data[pair] = data
-                logger.info(f"✓ {pair}: {len(data)} velas descargadas")
+                logger.info("✓ %s: %d velas descargadas", pair, len(data))
             else:
-                logger.warning(f"✗ {pair}: No se obtuvieron datos")
-            
-            # Respetar rate limit entre pares
-            time.sleep(self.RATE_LIMIT_DELAY)
+                logger.warning("✗ %s: No se obtuvieron datos", pair)
         
         return all_data
     
@@ -218,13 +321,56 @@ class KrakenDataDownloader:
             filename: Nombre del archivo
         """
         try:
-            with open(filename, 'w') as f:
-                json.dump(data, f, indent=2)
-            logger.info(f"Datos guardados en {filename}")
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            logger.info("Datos guardados en %s", filename)
         except Exception as e:
-            logger.error(f"Error guardando datos: {e}")
+            logger.error("Error guardando datos: %s", e)
     
-    def load_data(self, filename: str) -> Dict[str, List[List]]:
+    def save_data_npz(self, data: Dict[str, List[List]], filename: str):
+        """
+        Guardar datos en formato binario comprimido (.npz).
+        
+        Cada par se guarda como un array float64 con las columnas de
+        Kraken; es más compacto y mucho más rápido de leer que el JSON,
+        que queda como formato de intercambio.
+        
+        Args:
+            data: Datos OHLCV
+            filename: Nombre del archivo (.npz)
+        """
+        try:
+            arrays = {
+                pair: np.asarray(ohlcv_data, dtype=np.float64)
+                for pair, ohlcv_data in data.items()
+            }
+            np.savez_compressed(filename, **arrays)
+            logger.info("Datos guardados en %s", filename)
+        except Exception as e:
+            logger.error("Error guardando datos: %s", e)
+    
+    @staticmethod
+    def load_data_npz(filename: str) -> Dict[str, np.ndarray]:
+        """
+        Cargar datos desde archivo binario (.npz).
+        
+        Args:
+            filename: Nombre del archivo
+            
+        Returns:
+            Datos OHLCV (array float64 por par)
+        """
+        try:
+            with np.load(filename) as archive:
+                data = {pair: archive[pair] for pair in archive.files}
+            logger.info("Datos cargados desde %s", filename)
+            return data
+        except Exception as e:
+            logger.error("Error cargando datos: %s", e)
+            return {}
+    
+    @staticmethod
+    def load_data(filename: str) -> Dict[str, List[List]]:
         """
         Cargar datos desde archivo JSON.
         
@@ -235,42 +381,82 @@ class KrakenDataDownloader:
             Datos OHLCV
         """
         try:
-            with open(filename, 'r') as f:
-                data = json.load(f)
-            logger.info(f"Datos cargados desde {filename}")
+            with open(filename, 'rb') as f:
+                data = orjson.loads(f.read())
+            logger.info("Datos cargados desde %s", filename)
             return data
         except Exception as e:
-            logger.error(f"Error cargando datos: {e}")
+            logger.error("Error cargando datos: %s", e)
             return {}
     
+    @staticmethod
+    def iter_data(filename: str) -> Iterator[Tuple[str, List[List]]]:
+        """
+        Recorrer un archivo de datos par a par sin cargarlo entero.
+        
+        Con ijson instalado la memoria máxima es la de un solo par; sin
+        ijson se recurre a load_data y se recorre el resultado.
+        
+        Args:
+            filename: Nombre del archivo
+            
+        Returns:
+            Iterador de tuplas (par, datos OHLCV)
+            
+        Raises:
+            ValueError: Si el JSON está truncado o es inválido; los pares ya
+                entregados no forman un conjunto completo
+        """
+        if ijson is None:
+            yield from KrakenDataDownloader.load_data(filename).items()
+            return
+        
+        with open(filename, 'rb') as f:
+            try:
+                for pair, candles in ijson.kvitems(f, '', use_float=True):
+                    yield pair, candles
+            except ijson.JSONError as e:
+                logger.error("Error leyendo datos de %s: %s", filename, e)
+                raise ValueError(f"Datos inválidos en {filename}: {e}") from e
+    
     def convert_to_backtester_format(
         self,
-        ohlcv_data: List[List]
-    ) -> List[List]:
+        ohlcv_data: List[List],
+        as_numpy: bool = False
+    ) -> Union[List[List], np.ndarray]:
         """
         Convertir datos de Kraken al formato del backtester.
         
         Formato Kraken: [time, open, high, low, close, vwap, volume, count]
         Formato Backtester: [time, open, high, low, close, 0, volume]
         
+        La conversión se hace por columnas con NumPy en lugar de vela a vela.
+        
         Args:
             ohlcv_data: Datos en formato Kraken
+            as_numpy: Devolver un array float64 (N, 7) en lugar de listas
             
         Returns:
             Datos en formato backtester
         """
-        converted = []
-        for candle in ohlcv_data:
-            converted.append([
-                candle[0],      # time
-                float(candle[1]),  # open
-                float(candle[2]),  # high
-                float(candle[3]),  # low
-                float(candle[4]),  # close
-                0,              # unused
-                float(candle[6])   # volume
-            ])
-        return converted
+        n = len(ohlcv_data)
+        converted = np.zeros((n, 7), dtype=np.float64)
+        
+        # Kraken envía precios como strings; cada columna usada se parsea
+        # en un solo bucle C sin tocar vwap ni count
+        for src_col, dst_col in ((0, 0), (1, 1), (2, 2), (3, 3), (4, 4), (6, 6)):
+            converted[:, dst_col] = np.fromiter(
+                map(itemgetter(src_col), ohlcv_data), dtype=np.float64, count=n
+            )
+        
+        if as_numpy:
+            return converted
+        
+        rows = converted.tolist()
+        for row in rows:
+            row[0] = int(row[0])
+            row[5] = 0
+        return rows
 
 
 def main():
@@ -284,8 +470,8 @@ def main():
     pairs = downloader.get_available_pairs()
     
     if pairs:
-        logger.info(f"Pares disponibles: {len(pairs)}")
-        logger.info(f"Ejemplos: {pairs[:5]}")
+        logger.info("Pares disponibles: %d", len(pairs))
+        logger.info("Ejemplos: %s", pairs[:5])
     else:
         logger.error("No se pudieron obtener pares")
         return
@@ -293,7 +479,7 @@ def main():
     # Descargar datos de pares principales
     main_pairs = ["XBTUSD", "ETHUSD", "XRPUSD"]
     
-    logger.info(f"\nDescargando datos históricos de {main_pairs}...")
+    logger.info("\nDescargando datos históricos de %s...", main_pairs)
     
     # Descargar 30 días de datos en timeframe de 5 minutos
     data = downloader.download_multiple_pairs(
@@ -305,6 +491,7 @@ def main():
     if data:
         # Guardar datos
         downloader.save_data(data, "kraken_historical_data.json")
+        downloader.save_data_npz(data, "kraken_historical_data.npz")
         
         # Mostrar resumen
         logger.info("\n=== RESUMEN DE DATOS DESCARGADOS ===")
@@ -312,9 +499,9 @@ def main():
             if ohlcv_list:
                 first_time = datetime.fromtimestamp(ohlcv_list[0][0])
                 last_time = datetime.fromtimestamp(ohlcv_list[-1][0])
-                logger.info(f"{pair}: {len(ohlcv_list)} velas")
-                logger.info(f"  Desde: {first_time}")
-                logger.info(f"  Hasta: {last_time}")
+                logger.info("%s: %d velas", pair, len(ohlcv_list))
+                logger.info("  Desde: %s", first_time)
+                logger.info("  Hasta: %s", last_time)
     else:
         logger.error("No se descargaron datos")
 
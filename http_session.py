@@ -0,0 +1,46 @@
+"""
+Sesiones HTTP compartidas para la API de Kraken.
+Configura pool de conexiones keep-alive y reintentos a nivel de urllib3.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def create_session(
+    pool_maxsize: int = 32,
+    max_retries: int = 3,
+    backoff_factor: float = 0.5
+) -> requests.Session:
+    """
+    Crear una sesión con pool de conexiones dimensionado y reintentos.
+
+    Los reintentos automáticos solo se aplican a GET: repetir un POST
+    privado reutilizaría el nonce firmado y podría duplicar órdenes.
+
+    Args:
+        pool_maxsize: Conexiones reutilizables por host
+        max_retries: Reintentos ante errores de conexión, 429 o 5xx
+        backoff_factor: Factor de espera exponencial entre reintentos
+
+    Returns:
+        Sesión de requests configurada
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_maxsize,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
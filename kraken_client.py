@@ -4,7 +4,6 @@ Implementa comunicación con Kraken API para trading.
 """
 
 import os
-import json
 import time
 import hmac
 import hashlib
@@ -12,11 +11,17 @@ import base64
 import logging
 import urllib.parse
 import requests
-from typing import Dict, Any, Optional, List
+import orjson
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Mapping, Optional, List
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
 
+from http_session import create_session
+from rate_limiter import TokenBucket
+
 
 # Configuración de logging
 logging.basicConfig(
@@ -53,6 +58,27 @@ class KrakenConfig:
     timeout: int = 30
     max_retries: int = 3
     retry_delay: float = 1.0
+    pool_maxsize: int = 32
+    # Token bucket por defecto según los límites del nivel inicial de Kraken;
+    # None desactiva la limitación en cliente
+    public_rate_limit: Optional[float] = 1.0
+    public_rate_burst: float = 5
+    private_rate_limit: Optional[float] = 0.33
+    private_rate_burst: float = 15
+
+
+@lru_cache(maxsize=64)
+def _encode_path(urlpath: str) -> bytes:
+    """
+    Codificar la ruta de un endpoint (memoizado por endpoint).
+    
+    Args:
+        urlpath: Ruta del endpoint
+        
+    Returns:
+        Ruta en bytes
+    """
+    return urlpath.encode()
 
 
 class KrakenClient:
@@ -61,6 +87,13 @@ class KrakenClient:
     Maneja autenticación, reintentos y gestión de errores.
     """
     
+    # Parámetros inmutables reutilizados por los endpoints más consultados;
+    # _post_private añade el nonce sobre una copia
+    _TRADES_PARAMS = (
+        MappingProxyType({"trades": False}),
+        MappingProxyType({"trades": True})
+    )
+    
     def __init__(self, config: KrakenConfig):
         """
         Inicializar cliente de Kraken.
@@ -69,11 +102,26 @@ class KrakenClient:
             config: Configuración de Kraken
         """
         self.config = config
-        self.session = requests.Session()
+        self.session = create_session(
+            pool_maxsize=config.pool_maxsize,
+            max_retries=config.max_retries,
+            backoff_factor=config.retry_delay / 2
+        )
         self.session.headers.update({
             'User-Agent': 'KrakenTradingBot/1.0'
         })
-        self._nonce_counter = int(time.time() * 1000)
+        self._public_bucket = (
+            TokenBucket(config.public_rate_limit, config.public_rate_burst)
+            if config.public_rate_limit else None
+        )
+        self._private_bucket = (
+            TokenBucket(config.private_rate_limit, config.private_rate_burst)
+            if config.private_rate_limit else None
+        )
+        self._nonce_counter = time.time_ns() // 1_000_000
+        # Decodificar el secreto una sola vez; cada firma copia este HMAC
+        self._secret_bytes = base64.b64decode(config.api_secret)
+        self._hmac_base = hmac.new(self._secret_bytes, digestmod=hashlib.sha512)
         logger.info("Cliente Kraken inicializado")
     
     def _get_nonce(self) -> int:
@@ -83,50 +131,73 @@ class KrakenClient:
         Returns:
             Nonce como entero de 64 bits
         """
-        self._nonce_counter = max(self._nonce_counter + 1, int(time.time() * 1000))
-        return self._nonce_counter
-    
-    def _get_kraken_signature(self, urlpath: str, data: Dict[str, Any], secret: str) -> str:
+        nonce = self._nonce_counter + 1
+        now = time.time_ns() // 1_000_000
+        if now > nonce:
+            nonce = now
+        self._nonce_counter = nonce
+        return nonce
+    
+    def _get_kraken_signature(self, urlpath: str, data: Dict[str, Any]) -> bytes:
         """
         Generar firma HMAC-SHA512 para autenticación.
         
         Args:
             urlpath: Ruta del endpoint (ej: /0/private/AddOrder)
             data: Datos de la solicitud
-            secret: Clave privada API
             
         Returns:
-            Firma en base64
+            Firma en base64 (bytes, válidos como cabecera en requests)
         """
-        postdata = urllib.parse.urlencode(data)
-        encoded = (str(data["nonce"]) + postdata).encode()
-        message = urlpath.encode() + hashlib.sha256(encoded).digest()
+        # Alimentar los hashes por partes evita concatenar bytes intermedios
+        digest = hashlib.sha256(str(data["nonce"]).encode())
+        digest.update(urllib.parse.urlencode(data).encode())
         
-        signature = hmac.new(
-            base64.b64decode(secret),
-            message,
-            hashlib.sha512
-        )
-        sigdigest = base64.b64encode(signature.digest())
-        return sigdigest.decode()
+        signature = self._hmac_base.copy()
+        signature.update(_encode_path(urlpath))
+        signature.update(digest.digest())
+        return base64.b64encode(signature.digest())
+    
+    def _handle_api_error(self, errors: List[str], attempt: int):
+        """
+        Procesar errores de aplicación de Kraken.
+        
+        Si el error es de rate limit y quedan reintentos, espera y retorna
+        para que el llamador reintente; en otro caso lanza la excepción.
+        
+        Args:
+            errors: Lista de errores de la respuesta
+            attempt: Intento actual (0 = primera solicitud)
+            
+        Raises:
+            Exception: Si el error no es reintentable
+        """
+        error_msg = ", ".join(errors)
+        logger.error("Error de Kraken: %s", error_msg)
+        
+        # Reintentar si es error temporal
+        if "EAPI:Rate limit exceeded" in error_msg and attempt < self.config.max_retries:
+            wait_time = self.config.retry_delay * (2 ** attempt)
+            logger.warning("Rate limit, reintentando en %ss...", wait_time)
+            time.sleep(wait_time)
+            return
+        
+        raise Exception(f"Error de Kraken API: {error_msg}")
     
-    def _request(
+    def _get_public(
         self,
-        method: str,
         endpoint: str,
-        params: Optional[Dict[str, Any]] = None,
-        private: bool = False,
-        retry_count: int = 0
+        params: Optional[Mapping[str, Any]] = None
     ) -> Dict[str, Any]:
         """
-        Realizar solicitud a Kraken API.
+        Realizar solicitud GET a un endpoint público.
+        
+        Los errores HTTP transitorios se reintentan en el adaptador de
+        urllib3; aquí solo se reintenta el rate limit de Kraken.
         
         Args:
-            method: Método HTTP (GET, POST)
             endpoint: Endpoint de la API
             params: Parámetros de la solicitud
-            private: Si es endpoint privado (requiere autenticación)
-            retry_count: Contador de reintentos
             
         Returns:
             Respuesta JSON de Kraken
@@ -135,142 +206,186 @@ class KrakenClient:
             Exception: Si la solicitud falla después de reintentos
         """
         url = f"{self.config.api_url}{endpoint}"
-        headers = {}
+        bucket = self._public_bucket
         
-        if private:
-            if params is None:
-                params = {}
+        for attempt in range(self.config.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
             
-            params["nonce"] = self._get_nonce()
+            try:
+                response = self.session.get(url, params=params, timeout=self.config.timeout)
+                response.raise_for_status()
+                result = orjson.loads(response.content)
+            except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+                logger.error("Error de solicitud después de %d reintentos: %s", self.config.max_retries, e)
+                raise
             
-            # Generar firma
-            signature = self._get_kraken_signature(
-                endpoint,
-                params,
-                self.config.api_secret
-            )
+            if result.get("error"):
+                self._handle_api_error(result["error"], attempt)
+                continue
             
-            headers["API-Key"] = self.config.api_key
-            headers["API-Sign"] = signature
+            return result.get("result", {})
+    
+    def _post_private(
+        self,
+        endpoint: str,
+        params: Optional[Mapping[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Realizar solicitud POST firmada a un endpoint privado.
         
-        try:
-            if method == "GET":
-                response = self.session.get(
-                    url,
-                    params=params,
-                    headers=headers,
-                    timeout=self.config.timeout
-                )
-            else:  # POST
+        Cada intento usa un nonce nuevo y se firma de nuevo. Solo se reintentan
+        los errores de conexión (la solicitud no llegó a enviarse) y el rate
+        limit de Kraken: un timeout de lectura, un 5xx o una respuesta
+        ilegible pueden llegar después de que Kraken aceptara la orden, y
+        repetirla la duplicaría.
+        
+        Args:
+            endpoint: Endpoint de la API
+            params: Parámetros de la solicitud
+            
+        Returns:
+            Respuesta JSON de Kraken
+            
+        Raises:
+            Exception: Si la solicitud falla después de reintentos
+        """
+        url = f"{self.config.api_url}{endpoint}"
+        bucket = self._private_bucket
+        
+        for attempt in range(self.config.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            
+            # Copia con el nonce: los parámetros del llamador no se mutan
+            payload = dict(params or {}, nonce=self._get_nonce())
+            headers = {
+                "API-Key": self.config.api_key,
+                "API-Sign": self._get_kraken_signature(endpoint, payload)
+            }
+            
+            try:
                 response = self.session.post(
                     url,
-                    data=params,
+                    data=payload,
                     headers=headers,
                     timeout=self.config.timeout
                 )
+            except requests.exceptions.ConnectionError as e:
+                if attempt < self.config.max_retries:
+                    wait_time = self.config.retry_delay * (2 ** attempt)
+                    logger.warning("Error de conexión: %s, reintentando en %ss...", e, wait_time)
+                    time.sleep(wait_time)
+                    continue
+                
+                logger.error("Error de solicitud después de %d reintentos: %s", attempt, e)
+                raise
+            except requests.exceptions.RequestException as e:
+                logger.error("Error en solicitud privada %s (sin reintento): %s", endpoint, e)
+                raise
             
-            response.raise_for_status()
-            result = response.json()
+            try:
+                response.raise_for_status()
+                result = orjson.loads(response.content)
+            except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+                logger.error("Error en solicitud privada %s (sin reintento): %s", endpoint, e)
+                raise
             
-            # Verificar errores en respuesta
             if result.get("error"):
-                error_msg = ", ".join(result["error"])
-                logger.error(f"Error de Kraken: {error_msg}")
-                
-                # Reintentar si es error temporal
-                if "EAPI:Rate limit exceeded" in error_msg and retry_count < self.config.max_retries:
-                    wait_time = self.config.retry_delay * (2 ** retry_count)
-                    logger.warning(f"Rate limit, reintentando en {wait_time}s...")
-                    time.sleep(wait_time)
-                    return self._request(method, endpoint, params, private, retry_count + 1)
-                
-                raise Exception(f"Error de Kraken API: {error_msg}")
+                self._handle_api_error(result["error"], attempt)
+                continue
             
             return result.get("result", {})
-        
-        except requests.exceptions.RequestException as e:
-            if retry_count < self.config.max_retries:
-                wait_time = self.config.retry_delay * (2 ** retry_count)
-                logger.warning(f"Error de conexión: {e}, reintentando en {wait_time}s...")
-                time.sleep(wait_time)
-                return self._request(method, endpoint, params, private, retry_count + 1)
-            
-            logger.error(f"Error de solicitud después de {self.config.max_retries} reintentos: {e}")
-            raise
     
     # ==================== Market Data Endpoints ====================
     
     def get_server_time(self) -> Dict[str, Any]:
         """Obtener tiempo del servidor"""
-        return self._request("GET", "/0/public/Time")
+        return self._get_public("/0/public/Time")
     
     def get_system_status(self) -> Dict[str, Any]:
         """Obtener estado del sistema"""
-        return self._request("GET", "/0/public/SystemStatus")
+        return self._get_public("/0/public/SystemStatus")
     
     def get_asset_info(self, asset: Optional[str] = None) -> Dict[str, Any]:
         """Obtener información de activos"""
         params = {}
         if asset:
             params["asset"] = asset
-        return self._request("GET", "/0/public/Assets", params)
+        return self._get_public("/0/public/Assets", params)
     
     def get_tradable_pairs(self, pair: Optional[str] = None) -> Dict[str, Any]:
         """Obtener pares disponibles para trading"""
         params = {}
         if pair:
             params["pair"] = pair
-        return self._request("GET", "/0/public/AssetPairs", params)
+        return self._get_public("/0/public/AssetPairs", params)
     
     def get_ticker(self, pair: str) -> Dict[str, Any]:
         """Obtener información de ticker"""
         params = {"pair": pair}
-        return self._request("GET", "/0/public/Ticker", params)
+        return self._get_public("/0/public/Ticker", params)
     
-    def get_ohlc(self, pair: str, interval: int = 1) -> Dict[str, Any]:
+    def get_tickers(self, pairs: Iterable[str]) -> Dict[str, Any]:
+        """
+        Obtener el ticker de varios pares en una sola solicitud.
+        
+        Args:
+            pairs: Pares de trading (ej: ["XBTUSD", "ETHUSD"])
+            
+        Returns:
+            Tickers indexados por el nombre de par que devuelve Kraken
+        """
+        params = {"pair": ",".join(pairs)}
+        return self._get_public("/0/public/Ticker", params)
+    
+    def get_ohlc(self, pair: str, interval: int = 1, since: Optional[int] = None) -> Dict[str, Any]:
         """
         Obtener datos OHLC.
         
         Args:
             pair: Par de trading (ej: XBTUSD)
             interval: Intervalo en minutos (1, 5, 15, 30, 60, 240, 1440, 10080, 21600)
+            since: Valor "last" de una respuesta anterior (solo velas nuevas)
         """
         params = {"pair": pair, "interval": interval}
-        return self._request("GET", "/0/public/OHLC", params)
+        if since:
+            params["since"] = since
+        return self._get_public("/0/public/OHLC", params)
     
     def get_order_book(self, pair: str, count: Optional[int] = None) -> Dict[str, Any]:
         """Obtener libro de órdenes"""
         params = {"pair": pair}
         if count:
             params["count"] = count
-        return self._request("GET", "/0/public/Depth", params)
+        return self._get_public("/0/public/Depth", params)
     
     def get_recent_trades(self, pair: str, since: Optional[int] = None) -> Dict[str, Any]:
         """Obtener operaciones recientes"""
         params = {"pair": pair}
         if since:
             params["since"] = since
-        return self._request("GET", "/0/public/Trades", params)
+        return self._get_public("/0/public/Trades", params)
     
     # ==================== Account Data Endpoints ====================
     
     def get_account_balance(self) -> Dict[str, Any]:
         """Obtener saldo de cuenta"""
-        return self._request("POST", "/0/private/Balance", private=True)
+        return self._post_private("/0/private/Balance")
     
     def get_extended_balance(self) -> Dict[str, Any]:
         """Obtener saldo extendido"""
-        return self._request("POST", "/0/private/BalanceEx", private=True)
+        return self._post_private("/0/private/BalanceEx")
     
     def get_trade_balance(self, asset: str = "ZUSD") -> Dict[str, Any]:
         """Obtener saldo disponible para trading"""
         params = {"asset": asset}
-        return self._request("POST", "/0/private/TradeBalance", params, private=True)
+        return self._post_private("/0/private/TradeBalance", params)
     
     def get_open_orders(self, trades: bool = False) -> Dict[str, Any]:
         """Obtener órdenes abiertas"""
-        params = {"trades": trades}
-        return self._request("POST", "/0/private/OpenOrders", params, private=True)
+        params = self._TRADES_PARAMS[bool(trades)]
+        return self._post_private("/0/private/OpenOrders", params)
     
     def get_closed_orders(
         self,
@@ -285,7 +400,7 @@ class KrakenClient:
         }
         if userref:
             params["userref"] = userref
-        return self._request("POST", "/0/private/ClosedOrders", params, private=True)
+        return self._post_private("/0/private/ClosedOrders", params)
     
     def query_orders_info(self, txid: List[str], trades: bool = False) -> Dict[str, Any]:
         """Obtener información de órdenes específicas"""
@@ -293,19 +408,19 @@ class KrakenClient:
             "txid": ",".join(txid),
             "trades": trades
         }
-        return self._request("POST", "/0/private/QueryOrders", params, private=True)
+        return self._post_private("/0/private/QueryOrders", params)
     
     def get_trades_history(self, trades: bool = True) -> Dict[str, Any]:
         """Obtener historial de operaciones"""
-        params = {"trades": trades}
-        return self._request("POST", "/0/private/TradesHistory", params, private=True)
+        params = self._TRADES_PARAMS[bool(trades)]
+        return self._post_private("/0/private/TradesHistory", params)
     
     def get_open_positions(self, txid: Optional[List[str]] = None) -> Dict[str, Any]:
         """Obtener posiciones abiertas"""
         params = {}
         if txid:
             params["txid"] = ",".join(txid)
-        return self._request("POST", "/0/private/OpenPositions", params, private=True)
+        return self._post_private("/0/private/OpenPositions", params)
     
     # ==================== Trading Endpoints ====================
     
@@ -365,19 +480,19 @@ class KrakenClient:
         if validate:
             params["validate"] = True
         
-        logger.info(f"Colocando orden: {side} {volume} {pair} @ {price}")
-        return self._request("POST", "/0/private/AddOrder", params, private=True)
+        logger.info("Colocando orden: %s %s %s @ %s", side, volume, pair, price)
+        return self._post_private("/0/private/AddOrder", params)
     
     def cancel_order(self, txid: str) -> Dict[str, Any]:
         """Cancelar orden"""
         params = {"txid": txid}
-        logger.info(f"Cancelando orden: {txid}")
-        return self._request("POST", "/0/private/CancelOrder", params, private=True)
+        logger.info("Cancelando orden: %s", txid)
+        return self._post_private("/0/private/CancelOrder", params)
     
     def cancel_all_orders(self) -> Dict[str, Any]:
         """Cancelar todas las órdenes abiertas"""
         logger.warning("Cancelando TODAS las órdenes abiertas")
-        return self._request("POST", "/0/private/CancelAll", {}, private=True)
+        return self._post_private("/0/private/CancelAll")
     
     def amend_order(
         self,
@@ -403,12 +518,12 @@ class KrakenClient:
         if oflags:
             params["oflags"] = oflags
         
-        logger.info(f"Modificando orden: {txid}")
-        return self._request("POST", "/0/private/AmendOrder", params, private=True)
+        logger.info("Modificando orden: %s", txid)
+        return self._post_private("/0/private/AmendOrder", params)
     
     def get_websocket_token(self) -> Dict[str, Any]:
         """Obtener token para WebSocket"""
-        return self._request("POST", "/0/private/GetWebSocketsToken", {}, private=True)
+        return self._post_private("/0/private/GetWebSocketsToken")
     
     def close(self):
         """Cerrar sesión"""
@@ -450,17 +565,17 @@ if __name__ == "__main__":
         
         # Prueba de conexión
         server_time = client.get_server_time()
-        logger.info(f"Tiempo del servidor: {server_time}")
+        logger.info("Tiempo del servidor: %s", server_time)
         
         # Obtener pares disponibles
         pairs = client.get_tradable_pairs("XBTUSD")
-        logger.info(f"Pares disponibles: {list(pairs.keys())}")
+        logger.info("Pares disponibles: %s", list(pairs.keys()))
         
         # Obtener saldo
         balance = client.get_account_balance()
-        logger.info(f"Saldo: {balance}")
+        logger.info("Saldo: %s", balance)
         
         client.close()
         
     except Exception as e:
-        logger.error(f"Error: {e}")
+        logger.error("Error: %s", e)
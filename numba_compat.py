@@ -0,0 +1,39 @@
+"""
+Compatibilidad opcional con Numba.
+Expone un decorador njit que compila con Numba si está instalado
+y, en caso contrario, devuelve la función Python sin modificar.
+"""
+
+try:
+    from numba import njit as _numba_njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    _numba_njit = None
+    NUMBA_AVAILABLE = False
+
+
+def njit(*args, **kwargs):
+    """
+    Decorador equivalente a numba.njit con degradación elegante.
+
+    Admite tanto @njit como @njit(firma, cache=True, ...). Sin Numba
+    instalado, el decorador es la identidad y el código se ejecuta
+    como Python puro con los mismos resultados.
+
+    Args:
+        args: Función a decorar o firmas de Numba
+        kwargs: Opciones de compilación de Numba
+
+    Returns:
+        Función compilada o decorador
+    """
+    if NUMBA_AVAILABLE:
+        return _numba_njit(*args, **kwargs)
+
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+
+    def decorator(func):
+        return func
+
+    return decorator
@@ -0,0 +1,68 @@
+"""
+Limitador de tasa tipo token bucket.
+Mantiene las llamadas por debajo de los límites de la API de Kraken
+en lugar de esperar a que el servidor las rechace.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket seguro entre hilos.
+
+    El bucket se rellena a `rate` tokens por segundo hasta `capacity`.
+    Cada llamada consume un token y espera si no queda ninguno.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Inicializar el bucket lleno.
+
+        Args:
+            rate: Tokens repuestos por segundo
+            capacity: Máximo de tokens acumulables (ráfaga)
+        """
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate y capacity deben ser positivos")
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> float:
+        """
+        Descontar tokens y calcular la espera necesaria.
+
+        Args:
+            tokens: Tokens a consumir
+
+        Returns:
+            Segundos a esperar antes de realizar la llamada
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Consumir tokens, bloqueando hasta que estén disponibles.
+
+        Args:
+            tokens: Tokens a consumir
+
+        Returns:
+            Segundos esperados
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
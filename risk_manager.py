@@ -4,26 +4,103 @@ Implementa gestión de capital, stops dinámicos y control de riesgo.
 """
 
 import logging
-import json
+import mmap
 import os
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, field, asdict
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterator, KeysView, List, Optional, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
-from enum import Enum
+from enum import IntEnum
+import numpy as np
+import orjson
+
+from numba_compat import njit
 
 
 logger = logging.getLogger(__name__)
 
 
-class PositionStatus(Enum):
-    """Estados de una posición"""
-    OPEN = "OPEN"
-    PARTIALLY_CLOSED = "PARTIALLY_CLOSED"
-    CLOSED = "CLOSED"
-    STOPPED_OUT = "STOPPED_OUT"
+class PositionStatus(IntEnum):
+    """Estados de una posición (enteros: comparación y serialización directas)"""
+    OPEN = 0
+    PARTIALLY_CLOSED = 1
+    CLOSED = 2
+    STOPPED_OUT = 3
+
+
+def datetime_to_ns(value: datetime) -> int:
+    """
+    Convertir un datetime a nanosegundos desde epoch.
+    
+    Args:
+        value: Fecha (naive = hora local)
+        
+    Returns:
+        Nanosegundos desde epoch
+    """
+    return int(value.timestamp()) * 1_000_000_000 + value.microsecond * 1_000
+
+
+def ns_to_datetime(value: int) -> datetime:
+    """
+    Convertir nanosegundos desde epoch a datetime local.
+    
+    Args:
+        value: Nanosegundos desde epoch
+        
+    Returns:
+        Fecha naive en hora local
+    """
+    seconds, nanos = divmod(value, 1_000_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=nanos // 1_000)
+
 
+# Unidades mínimas de volumen por unidad (Kraken opera con 8 decimales)
+VOLUME_SCALE = 10 ** 8
 
-@dataclass
+
+def volume_to_units(volume: float) -> int:
+    """
+    Convertir un volumen a unidades enteras de 1e-8.
+    
+    Args:
+        volume: Volumen en unidades del activo
+        
+    Returns:
+        Volumen redondeado a la precisión de Kraken
+    """
+    return round(volume * VOLUME_SCALE)
+
+
+# Campo de volumen cerrado por nivel de TP (índice = nivel)
+_TP_CLOSED_FIELDS = (None, "volume_closed_tp1", "volume_closed_tp2", "volume_closed_tp3")
+
+
+@njit("void(int8[:], float64[:], float64[:], float64[:], float64[:])", cache=True)
+def _update_all_pnl(
+    sides: np.ndarray,
+    entries: np.ndarray,
+    prices: np.ndarray,
+    open_volumes: np.ndarray,
+    out_pnl: np.ndarray
+):
+    """
+    Calcular el PnL no realizado de varias posiciones.
+    
+    Args:
+        sides: Signo del lado (+1 compra, -1 venta)
+        entries: Precios de entrada
+        prices: Precios actuales
+        open_volumes: Volúmenes abiertos
+        out_pnl: Array de salida con el PnL de cada posición
+    """
+    for i in range(sides.shape[0]):
+        out_pnl[i] = sides[i] * (prices[i] - entries[i]) * open_volumes[i]
+
+
+@dataclass(slots=True)
 class Position:
     """Representa una posición abierta"""
     position_id: str
@@ -35,7 +112,7 @@ class Position:
     take_profit_1: float
     take_profit_2: float
     take_profit_3: float
-    entry_time: datetime
+    entry_time: int  # Nanosegundos desde epoch (time.time_ns)
     status: PositionStatus = PositionStatus.OPEN
     
     # Tracking de cierre parcial
@@ -48,6 +125,23 @@ class Position:
     unrealized_pnl: float = 0.0
     realized_pnl: float = 0.0
     
+    # Derivados de side y volume (no se pasan al constructor)
+    side_sign: int = field(init=False, default=1)  # +1 compra, -1 venta
+    tp_volumes: Tuple[float, float, float, float] = field(init=False, default=(0.0, 0.0, 0.0, 0.0))
+    
+    def __post_init__(self):
+        """Derivar signo y volúmenes por TP (también al reutilizar desde el pool)"""
+        self.side_sign = 1 if self.side == "buy" else -1
+        # 30% / 40% / resto: los tres cierres suman exactamente el volumen
+        volume_tp1 = self.volume * 0.30
+        volume_tp2 = self.volume * 0.40
+        self.tp_volumes = (0.0, volume_tp1, volume_tp2, self.volume - volume_tp1 - volume_tp2)
+    
+    @property
+    def entry_time_dt(self) -> datetime:
+        """Hora de entrada como datetime local (para logs e informes)"""
+        return ns_to_datetime(self.entry_time)
+    
     def get_open_volume(self) -> float:
         """Obtener volumen abierto"""
         return self.volume - self.volume_closed_tp1 - self.volume_closed_tp2 - self.volume_closed_tp3
@@ -55,14 +149,108 @@ class Position:
     def update_current_price(self, price: float):
         """Actualizar precio actual y calcular PnL no realizado"""
         self.current_price = price
+        self.unrealized_pnl = self.side_sign * (price - self.entry_price) * self.get_open_volume()
+    
+    def reset(self):
+        """Restablecer el seguimiento y las métricas para reutilizar la instancia"""
+        self.status = PositionStatus.OPEN
+        self.volume_closed_tp1 = 0.0
+        self.volume_closed_tp2 = 0.0
+        self.volume_closed_tp3 = 0.0
+        self.current_price = 0.0
+        self.unrealized_pnl = 0.0
+        self.realized_pnl = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class ClosedPosition:
+    """Registro inmutable de una posición cerrada (historial)"""
+    position_id: str
+    pair: str
+    side: str
+    entry_price: float
+    volume: float
+    entry_time: int  # Nanosegundos desde epoch
+    status: PositionStatus
+    realized_pnl: float
+    
+    @property
+    def entry_time_dt(self) -> datetime:
+        """Hora de entrada como datetime local (para logs e informes)"""
+        return ns_to_datetime(self.entry_time)
+    
+    @classmethod
+    def from_position(cls, position: Position) -> "ClosedPosition":
+        """
+        Crear el registro a partir de una posición.
         
-        if self.side == "buy":
-            self.unrealized_pnl = (price - self.entry_price) * self.get_open_volume()
-        else:
-            self.unrealized_pnl = (self.entry_price - price) * self.get_open_volume()
+        Args:
+            position: Posición cerrada
+            
+        Returns:
+            Registro de historial
+        """
+        return cls(
+            position_id=position.position_id,
+            pair=position.pair,
+            side=position.side,
+            entry_price=position.entry_price,
+            volume=position.volume,
+            entry_time=position.entry_time,
+            status=position.status,
+            realized_pnl=position.realized_pnl
+        )
+
+
+class PositionPool:
+    """
+    Pool de instancias Position reutilizables.
+    
+    Las posiciones cerradas vuelven al pool en lugar de quedar en el
+    historial, de modo que abrir posiciones no asigna objetos nuevos una
+    vez que el pool se ha llenado.
+    """
+    
+    def __init__(self, capacity: int):
+        """
+        Inicializar pool.
+        
+        Args:
+            capacity: Máximo de instancias libres retenidas
+        """
+        self._free: deque = deque(maxlen=capacity)
+    
+    def acquire(self, **fields) -> Position:
+        """
+        Obtener una posición con los campos indicados.
+        
+        Args:
+            fields: Campos de Position
+            
+        Returns:
+            Posición reutilizada o nueva
+        """
+        if not self._free:
+            return Position(**fields)
+        
+        position = self._free.pop()
+        for name, value in fields.items():
+            setattr(position, name, value)
+        position.__post_init__()
+        return position
+    
+    def release(self, position: Position):
+        """
+        Devolver una posición al pool.
+        
+        Args:
+            position: Posición que ya no se usa
+        """
+        position.reset()
+        self._free.append(position)
 
 
-@dataclass
+@dataclass(slots=True)
 class RiskConfig:
     """Configuración de riesgo"""
     # Capital
@@ -84,6 +272,16 @@ class RiskConfig:
     # Pausa de trading
     pause_after_max_losses: bool = True
     pause_duration_minutes: int = 60
+    
+    # Historial en memoria (las estadísticas globales no dependen de él)
+    closed_history_size: int = 10_000  # Posiciones cerradas recientes retenidas
+    
+    # Persistencia (None = no guardar ni cargar estado)
+    state_file: Optional[str] = "bot_state.json"
+    save_debounce_seconds: float = 0.5  # Agrupa escrituras; 0 = escritura inmediata
+    journal_file: Optional[str] = None  # Journal de eventos (None = reescribir el estado completo)
+    journal_compact_every: int = 1000  # Eventos antes de compactar en un snapshot
+    sync_on_write: bool = False  # fsync en cada snapshot (siempre en eventos críticos y al compactar)
 
 
 class RiskManager:
@@ -92,6 +290,12 @@ class RiskManager:
     Implementa control de capital, stops dinámicos y límites de riesgo.
     """
     
+    # Arrays paralelos a _positions_list (mismo índice por posición)
+    _LEVEL_ARRAYS = (
+        "_sl", "_tp1", "_tp2", "_tp3", "_entry", "_open_volume",
+        "_side_sign", "_tp_closed_mask", "_slot_pair_code", "_open_seq"
+    )
+    
     def __init__(self, config: RiskConfig):
         """
         Inicializar gestor de riesgos.
@@ -101,67 +305,293 @@ class RiskManager:
         """
         self.config = config
         self.positions: Dict[str, Position] = {}
-        self.closed_positions: List[Position] = []
+        self.closed_positions: Deque[ClosedPosition] = deque(maxlen=config.closed_history_size)
+        
+        # Contadores de posiciones cerradas (estadísticas en O(1))
+        self._n_closed = 0
+        self._n_wins = 0
+        self._total_profit = 0.0
+        self._total_loss = 0.0
+        self._pool = PositionPool(config.max_positions * 4)
+        
+        # Índice de posiciones abiertas por par (dict para conservar el orden de apertura)
+        self._positions_by_pair: Dict[str, Dict[str, None]] = defaultdict(dict)
         self.consecutive_losses = 0
         self.total_realized_pnl = 0.0
         self.peak_capital = config.total_capital
         
+        # Totales incrementales de las posiciones abiertas
+        self._sum_unrealized_pnl = 0.0
+        self._sum_capital_in_use = 0.0
+        
+        # Niveles de las posiciones abiertas en arrays paralelos (check_all)
+        self._init_level_arrays(config.max_positions)
+        
+        # Escritura diferida del estado
+        self._dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        self._save_lock = threading.Lock()
+        
+        # Journal append-only de eventos
+        self._journal_fh = None
+        self._journal_records = 0
+        self._journal_lock = threading.Lock()
+        
         # Cargar estado previo si existe
         self.load_state()
         
         logger.info(f"Gestor de riesgos inicializado con capital: {config.total_capital}")
 
-    def save_state(self):
-        """Guardar estado actual a archivo"""
+    def save_state(self, sync: bool = False):
+        """
+        Guardar estado actual a archivo.
+        
+        Args:
+            sync: Forzar fsync antes del reemplazo (también con sync_on_write)
+        """
+        if self.config.state_file is None:
+            return
+        
         try:
+            # orjson serializa dataclasses y el IntEnum de estado (entero);
+            # JSON compacto: el archivo es solo para la máquina
             state = {
-                "positions": {
-                    pid: {
-                        **asdict(pos),
-                        "entry_time": pos.entry_time.isoformat(),
-                        "status": pos.status.value
-                    }
-                    for pid, pos in self.positions.items()
-                },
+                "positions": dict(self.positions),
                 "consecutive_losses": self.consecutive_losses,
                 "total_realized_pnl": self.total_realized_pnl
             }
             
-            with open("bot_state.json", 'w') as f:
-                json.dump(state, f, indent=2)
+            # Escritura atómica: un proceso interrumpido no deja el archivo a medias
+            tmp_file = f"{self.config.state_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(orjson.dumps(state))
+                f.flush()
+                # os.replace ya es atómico ante caídas del proceso; el fsync
+                # protege además frente a cortes de corriente
+                if sync or self.config.sync_on_write:
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, self.config.state_file)
+            
+            # El snapshot ya incluye todos los eventos del journal
+            self._truncate_journal()
                 
         except Exception as e:
             logger.error(f"Error guardando estado: {e}")
+    
+    def _truncate_journal(self):
+        """Vaciar el journal tras escribir un snapshot"""
+        if self.config.journal_file is None:
+            return
+        
+        with self._journal_lock:
+            if self._journal_fh is not None:
+                self._journal_fh.truncate(0)
+            elif os.path.exists(self.config.journal_file):
+                open(self.config.journal_file, 'wb').close()
+            self._journal_records = 0
+    
+    def _persist_event(self, event: str, position: Position, sync: bool = False):
+        """
+        Persistir un cambio de posición.
+        
+        Sin journal se programa la reescritura del estado completo; con
+        journal se añade una sola línea con el evento y se compacta en un
+        snapshot cada journal_compact_every eventos.
+        
+        Args:
+            event: OPEN, UPDATE o CLOSE
+            position: Posición afectada
+            sync: Forzar fsync del journal (eventos críticos)
+        """
+        if self.config.state_file is None:
+            return
+        
+        if self.config.journal_file is None:
+            self._mark_dirty(sync)
+            return
+        
+        record = {
+            "event": event,
+            "position_id": position.position_id,
+            "consecutive_losses": self.consecutive_losses,
+            "total_realized_pnl": self.total_realized_pnl
+        }
+        if event != "CLOSE":
+            record["position"] = position
+        
+        try:
+            with self._journal_lock:
+                if self._journal_fh is None:
+                    self._journal_fh = open(self.config.journal_file, 'ab')
+                self._journal_fh.write(orjson.dumps(record) + b"\n")
+                self._journal_fh.flush()
+                if sync:
+                    os.fsync(self._journal_fh.fileno())
+                self._journal_records += 1
+                compact = self._journal_records >= self.config.journal_compact_every
+        except Exception as e:
+            logger.error(f"Error escribiendo journal: {e}")
+            return
+        
+        if compact:
+            # El journal se vacía tras el snapshot: este debe ser duradero
+            self.save_state(sync=True)
+    
+    def _mark_dirty(self, sync: bool = False):
+        """
+        Marcar el estado como modificado y programar su escritura.
+        
+        Las modificaciones dentro de la ventana save_debounce_seconds se
+        agrupan en una sola escritura desde un hilo temporizador.
+        
+        Args:
+            sync: Evento crítico: escribir y sincronizar inmediatamente
+        """
+        if self.config.state_file is None:
+            return
+        
+        if sync:
+            with self._save_lock:
+                if self._save_timer is not None:
+                    self._save_timer.cancel()
+                    self._save_timer = None
+                self._dirty = False
+                self.save_state(sync=True)
+            return
+        
+        if self.config.save_debounce_seconds <= 0:
+            self.save_state()
+            return
+        
+        with self._save_lock:
+            self._dirty = True
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(
+                    self.config.save_debounce_seconds,
+                    self._flush_if_dirty
+                )
+                self._save_timer.start()
+    
+    def _flush_if_dirty(self, sync: bool = False):
+        """
+        Escribir el estado si hay cambios pendientes.
+        
+        Args:
+            sync: Forzar fsync del snapshot
+        """
+        with self._save_lock:
+            self._save_timer = None
+            if not self._dirty:
+                return
+            self._dirty = False
+            self.save_state(sync=sync)
+    
+    def flush(self):
+        """
+        Escribir inmediatamente los cambios pendientes.
+        
+        Debe llamarse al detener el bot para no perder la última ventana.
+        """
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+        self._flush_if_dirty(sync=True)
+        
+        with self._journal_lock:
+            if self._journal_fh is not None:
+                os.fsync(self._journal_fh.fileno())
 
     def load_state(self):
-        """Cargar estado desde archivo"""
-        if not os.path.exists("bot_state.json"):
+        """Cargar estado desde archivo (snapshot y, si existe, journal)"""
+        if self.config.state_file is None:
             return
-            
+        
         try:
-            with open("bot_state.json", 'r') as f:
-                state = json.load(f)
-                
+            state = self._read_snapshot()
+            positions_data = dict(state.get("positions", {}))
+            self.consecutive_losses = state.get("consecutive_losses", 0)
+            self.total_realized_pnl = state.get("total_realized_pnl", 0.0)
+            
+            # Reaplicar los eventos posteriores al snapshot (idempotentes)
+            for record in self._read_journal():
+                if record["event"] == "CLOSE":
+                    positions_data.pop(record["position_id"], None)
+                else:
+                    positions_data[record["position_id"]] = record["position"]
+                self.consecutive_losses = record["consecutive_losses"]
+                self.total_realized_pnl = record["total_realized_pnl"]
+            
             # Cargar posiciones
-            for pid, pos_data in state.get("positions", {}).items():
-                # Reconstruir datetime
+            for pid, pos_data in positions_data.items():
+                # Reconstruir hora de entrada (los estados antiguos la guardan en ISO 8601)
                 if "entry_time" in pos_data and isinstance(pos_data["entry_time"], str):
-                    pos_data["entry_time"] = datetime.fromisoformat(pos_data["entry_time"])
+                    pos_data["entry_time"] = datetime_to_ns(datetime.fromisoformat(pos_data["entry_time"]))
                 
-                # Reconstruir Enum
-                if "status" in pos_data and isinstance(pos_data["status"], str):
-                    pos_data["status"] = PositionStatus(pos_data["status"])
+                # Los campos derivados se recalculan al construir la posición
+                pos_data.pop("side_sign", None)
+                pos_data.pop("tp_volumes", None)
                 
-                self.positions[pid] = Position(**pos_data)
+                # Reconstruir Enum (los estados antiguos lo guardan por nombre)
+                if "status" in pos_data:
+                    status = pos_data["status"]
+                    pos_data["status"] = PositionStatus[status] if isinstance(status, str) else PositionStatus(status)
                 
-            self.consecutive_losses = state.get("consecutive_losses", 0)
-            self.total_realized_pnl = state.get("total_realized_pnl", 0.0)
+                position = self._pool.acquire(**pos_data)
+                self.positions[pid] = position
+                self._positions_by_pair[pos_data["pair"]][pid] = None
+                self._add_levels(position)
+                self._sum_unrealized_pnl += position.unrealized_pnl
+                self._sum_capital_in_use += position.entry_price * position.get_open_volume()
             
-            logger.info(f"Estado recuperado: {len(self.positions)} posiciones abiertas")
+            if state or self._journal_records:
+                logger.info(f"Estado recuperado: {len(self.positions)} posiciones abiertas")
             
         except Exception as e:
             logger.error(f"Error cargando estado: {e}")
     
+    def _read_snapshot(self) -> Dict:
+        """
+        Leer el snapshot de estado.
+        
+        Returns:
+            Estado guardado (vacío si no hay archivo)
+        """
+        # Un archivo vacío no se puede mapear y no contiene estado
+        if not os.path.exists(self.config.state_file) or os.path.getsize(self.config.state_file) == 0:
+            return {}
+        
+        # Parsear directamente desde la page cache, sin copiar a un buffer
+        with open(self.config.state_file, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+    
+    def _read_journal(self) -> Iterator[Dict]:
+        """
+        Leer los eventos del journal.
+        
+        Una última línea incompleta (proceso interrumpido a mitad de
+        escritura) se descarta.
+        
+        Returns:
+            Iterador de eventos en orden de escritura
+        """
+        journal_file = self.config.journal_file
+        if journal_file is None or not os.path.exists(journal_file):
+            return
+        
+        with open(journal_file, 'rb') as f:
+            for line in f:
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    logger.warning("Registro incompleto al final del journal descartado")
+                    break
+                self._journal_records += 1
+                yield record
+    
     def can_open_position(self) -> Tuple[bool, str]:
         """
         Verificar si se puede abrir una nueva posición.
@@ -260,7 +690,7 @@ class RiskManager:
             logger.warning(f"No se puede abrir posición: {reason}")
             return False
         
-        position = Position(
+        position = self._pool.acquire(
             position_id=position_id,
             pair=pair,
             side=side,
@@ -270,12 +700,15 @@ class RiskManager:
             take_profit_1=take_profit_1,
             take_profit_2=take_profit_2,
             take_profit_3=take_profit_3,
-            entry_time=datetime.now()
+            entry_time=time.time_ns()
         )
         
         self.positions[position_id] = position
+        self._positions_by_pair[pair][position_id] = None
+        self._add_levels(position)
+        self._sum_capital_in_use += entry_price * volume
         
-        self.save_state()  # Guardar estado
+        self._persist_event("OPEN", position)
         
         logger.info(
             f"Posición abierta: {position_id} {side.upper()} {volume} {pair} @ {entry_price} "
@@ -291,11 +724,56 @@ class RiskManager:
             position_id: ID de la posición
             current_price: Precio actual
         """
-        if position_id not in self.positions:
+        position = self.positions.get(position_id)
+        if position is None:
             return
-        
-        position = self.positions[position_id]
+        previous_pnl = position.unrealized_pnl
         position.update_current_price(current_price)
+        self._sum_unrealized_pnl += position.unrealized_pnl - previous_pnl
+    
+    def update_prices(self, prices: Dict[str, float]):
+        """
+        Actualizar el precio de todas las posiciones de los pares dados.
+        
+        Equivale a llamar a update_position_price para cada posición, con
+        el cálculo del PnL hecho en un único kernel compilado.
+        
+        Args:
+            prices: Precio actual por par
+        """
+        n = len(self._positions_list)
+        if n == 0 or not prices:
+            return
+        
+        prices_arr = self._slot_prices(prices)
+        pnl = np.empty(n)
+        _update_all_pnl(self._side_sign[:n], self._entry[:n], prices_arr, self._open_volume[:n], pnl)
+        
+        delta = 0.0
+        for position, price, position_pnl in zip(self._positions_list, prices_arr.tolist(), pnl.tolist()):
+            if price != price:  # NaN: par sin precio
+                continue
+            delta += position_pnl - position.unrealized_pnl
+            position.current_price = price
+            position.unrealized_pnl = position_pnl
+        self._sum_unrealized_pnl += delta
+    
+    def _slot_prices(self, prices: Dict[str, float]) -> np.ndarray:
+        """
+        Alinear los precios por par con las posiciones abiertas.
+        
+        Args:
+            prices: Precio actual por par
+            
+        Returns:
+            Precio de cada posición (NaN si su par no tiene precio)
+        """
+        pair_prices = np.full(len(self._pair_codes), np.nan)
+        for pair, price in prices.items():
+            code = self._pair_codes.get(pair)
+            if code is not None:
+                pair_prices[code] = price
+        return pair_prices[self._slot_pair_code[:len(self._positions_list)]]
     
     def check_stop_loss(self, position_id: str, current_price: float) -> bool:
         """
@@ -308,11 +786,10 @@ class RiskManager:
         Returns:
             True si se alcanzó el stop loss
         """
-        if position_id not in self.positions:
+        position = self.positions.get(position_id)
+        if position is None:
             return False
         
-        position = self.positions[position_id]
-        
         if position.side == "buy":
             if current_price <= position.stop_loss:
                 return True
@@ -337,11 +814,10 @@ class RiskManager:
         Returns:
             Tupla (nivel_tp, alcanzado)
         """
-        if position_id not in self.positions:
+        position = self.positions.get(position_id)
+        if position is None:
             return 0, False
         
-        position = self.positions[position_id]
-        
         if position.side == "buy":
             if current_price >= position.take_profit_3 and position.volume_closed_tp3 == 0:
                 return 3, True
@@ -359,6 +835,80 @@ class RiskManager:
         
         return 0, False
     
+    def check_all(self, prices: Dict[str, float]) -> List[Tuple[str, int]]:
+        """
+        Verificar stop loss y take profit de todas las posiciones a la vez.
+        
+        Equivale a llamar a check_stop_loss y check_take_profit para cada
+        posición abierta de los pares presentes en prices, pero las
+        comparaciones se hacen en una sola pasada vectorizada.
+        
+        Args:
+            prices: Precio actual por par
+            
+        Returns:
+            Lista de (position_id, nivel) en orden de apertura; nivel 0 es
+            stop loss y 1-3 el take profit alcanzado
+        """
+        return [(position.position_id, level) for position, level in self._triggered(prices)]
+    
+    def close_triggered(self, prices: Dict[str, float]) -> List[Tuple[str, int]]:
+        """
+        Ejecutar los cierres que detecta check_all al precio dado.
+        
+        Opera directamente sobre las posiciones resueltas por índice, sin
+        volver a buscarlas por ID.
+        
+        Args:
+            prices: Precio actual por par
+            
+        Returns:
+            Lista de (position_id, nivel) cerrados, como check_all
+        """
+        events = []
+        for position, level in self._triggered(prices):
+            position_id = position.position_id
+            if level == 0:
+                self._close_stop_loss_impl(position, prices[position.pair])
+            else:
+                self._close_partial_impl(position, level, prices[position.pair])
+            events.append((position_id, level))
+        return events
+    
+    def _triggered(self, prices: Dict[str, float]) -> List[Tuple[Position, int]]:
+        """
+        Evaluar de forma vectorizada stop loss y take profit.
+        
+        Args:
+            prices: Precio actual por par
+            
+        Returns:
+            Lista de (posición, nivel) en orden de apertura
+        """
+        n = len(self._positions_list)
+        if n == 0 or not prices:
+            return []
+        
+        prices_arr = self._slot_prices(prices)
+        side = self._side_sign[:n]
+        valid = ~np.isnan(prices_arr)
+        hit_sl = valid & (side * (prices_arr - self._sl[:n]) <= 0)
+        
+        closed = self._tp_closed_mask[:n]
+        level = np.zeros(n, dtype=np.int8)
+        # Del nivel más bajo al más alto: el más alto alcanzado prevalece
+        for tp_level, tp in ((1, self._tp1), (2, self._tp2), (3, self._tp3)):
+            hit = (side * (prices_arr - tp[:n]) >= 0) & ((closed & (1 << (tp_level - 1))) == 0)
+            level[hit] = tp_level
+        hit_tp = valid & ~hit_sl & (level > 0)
+        level[hit_sl] = 0
+        
+        fired = np.nonzero(hit_sl | hit_tp)[0]
+        fired = fired[np.argsort(self._open_seq[fired], kind="stable")]
+        # Referencias resueltas antes de cerrar: el swap-remove mueve índices
+        positions = self._positions_list
+        return [(positions[slot], int(level[slot])) for slot in fired.tolist()]
+    
     def close_position_partial(
         self,
         position_id: str,
@@ -376,32 +926,42 @@ class RiskManager:
         Returns:
             Volumen cerrado
         """
-        if position_id not in self.positions:
+        position = self.positions.get(position_id)
+        if position is None or tp_level not in (1, 2, 3):
             return 0.0
+        return self._close_partial_impl(position, tp_level, close_price)
+    
+    def _close_partial_impl(self, position: Position, tp_level: int, close_price: float) -> float:
+        """
+        Cierre parcial sobre una posición abierta ya resuelta.
         
-        position = self.positions[position_id]
-        
-        # Determinar volumen a cerrar según nivel
-        if tp_level == 1:
-            volume_to_close = position.volume * 0.30
-            position.volume_closed_tp1 = volume_to_close
-        elif tp_level == 2:
-            volume_to_close = position.volume * 0.40
-            position.volume_closed_tp2 = volume_to_close
-        elif tp_level == 3:
-            volume_to_close = position.volume * 0.30
-            position.volume_closed_tp3 = volume_to_close
-        else:
-            return 0.0
+        Args:
+            position: Posición abierta
+            tp_level: Nivel de TP (1, 2, 3)
+            close_price: Precio de cierre
+            
+        Returns:
+            Volumen cerrado
+        """
+        position_id = position.position_id
+        open_volume_before = position.get_open_volume()
+        
+        # Volumen a cerrar precalculado al abrir la posición
+        volume_to_close = position.tp_volumes[tp_level]
+        setattr(position, _TP_CLOSED_FIELDS[tp_level], volume_to_close)
+        slot = self._pos_index[position_id]
+        if volume_to_close != 0:
+            self._tp_closed_mask[slot] |= 1 << (tp_level - 1)
+        self._open_volume[slot] = position.get_open_volume()
         
         # Calcular PnL realizado
-        if position.side == "buy":
-            pnl = (close_price - position.entry_price) * volume_to_close
-        else:
-            pnl = (position.entry_price - close_price) * volume_to_close
+        pnl = position.side_sign * (close_price - position.entry_price) * volume_to_close
         
         position.realized_pnl += pnl
         self.total_realized_pnl += pnl
+        self._sum_capital_in_use -= position.entry_price * (
+            open_volume_before - position.get_open_volume()
+        )
         
         logger.info(
             f"Cierre parcial TP{tp_level}: {position_id} {volume_to_close} @ {close_price} "
@@ -409,13 +969,16 @@ class RiskManager:
         )
         
         # Actualizar estado si está completamente cerrada
-        if position.get_open_volume() == 0:
+        # Comparación exacta en unidades enteras: un residuo de coma flotante
+        # por debajo de 1e-8 no se puede negociar y no deja la posición abierta
+        if volume_to_units(position.get_open_volume()) == 0:
             position.status = PositionStatus.CLOSED
             self._move_to_closed(position_id)
+            self._persist_event("CLOSE", position)
         else:
             position.status = PositionStatus.PARTIALLY_CLOSED
+            self._persist_event("UPDATE", position)
         
-        self.save_state()  # Guardar estado
         return volume_to_close
     
     def close_position_stop_loss(
@@ -433,17 +996,27 @@ class RiskManager:
         Returns:
             Volumen cerrado
         """
-        if position_id not in self.positions:
+        position = self.positions.get(position_id)
+        if position is None:
             return 0.0
+        return self._close_stop_loss_impl(position, close_price)
+    
+    def _close_stop_loss_impl(self, position: Position, close_price: float) -> float:
+        """
+        Cierre por stop loss sobre una posición abierta ya resuelta.
         
-        position = self.positions[position_id]
+        Args:
+            position: Posición abierta
+            close_price: Precio de cierre
+            
+        Returns:
+            Volumen cerrado
+        """
+        position_id = position.position_id
         volume_to_close = position.get_open_volume()
         
         # Calcular PnL
-        if position.side == "buy":
-            pnl = (close_price - position.entry_price) * volume_to_close
-        else:
-            pnl = (position.entry_price - close_price) * volume_to_close
+        pnl = position.side_sign * (close_price - position.entry_price) * volume_to_close
         
         position.realized_pnl += pnl
         self.total_realized_pnl += pnl
@@ -463,7 +1036,7 @@ class RiskManager:
             f"PnL: {pnl:.2f}"
         )
         
-        self.save_state()  # Guardar estado
+        self._persist_event("CLOSE", position, sync=True)
         return volume_to_close
     
     def _move_to_closed(self, position_id: str):
@@ -473,9 +1046,166 @@ class RiskManager:
         Args:
             position_id: ID de la posición
         """
-        if position_id in self.positions:
-            position = self.positions.pop(position_id)
-            self.closed_positions.append(position)
+        position = self.positions.pop(position_id, None)
+        if position is None:
+            return
+        if self.positions:
+            self._sum_unrealized_pnl -= position.unrealized_pnl
+            self._sum_capital_in_use -= position.entry_price * position.get_open_volume()
+        else:
+            # Sin posiciones abiertas los totales son exactamente cero (sin deriva)
+            self._sum_unrealized_pnl = 0.0
+            self._sum_capital_in_use = 0.0
+        pair_ids = self._positions_by_pair.get(position.pair)
+        if pair_ids is not None:
+            pair_ids.pop(position_id, None)
+            if not pair_ids:
+                del self._positions_by_pair[position.pair]
+        self._remove_levels(position_id)
+        self.closed_positions.append(ClosedPosition.from_position(position))
+        self._record_closed_pnl(position.realized_pnl)
+        self._pool.release(position)
+    
+    def _record_closed_pnl(self, pnl: float):
+        """
+        Acumular el PnL de una posición cerrada en los contadores.
+        
+        Args:
+            pnl: PnL realizado de la posición
+        """
+        self._n_closed += 1
+        if pnl > 0:
+            self._n_wins += 1
+            self._total_profit += pnl
+        elif pnl < 0:
+            self._total_loss -= pnl
+    
+    def _init_level_arrays(self, capacity: int):
+        """
+        Crear la lista compacta de posiciones abiertas y sus arrays
+        paralelos de niveles (SoA) usados por check_all y update_prices.
+        
+        Args:
+            capacity: Posiciones iniciales (los arrays se duplican al llenarse)
+        """
+        capacity = max(capacity, 1)
+        self._positions_list: List[Position] = []
+        self._pos_index: Dict[str, int] = {}
+        self._pair_codes: Dict[str, int] = {}
+        self._next_open_seq = 0
+        self._sl = np.zeros(capacity)
+        self._tp1 = np.zeros(capacity)
+        self._tp2 = np.zeros(capacity)
+        self._tp3 = np.zeros(capacity)
+        self._entry = np.zeros(capacity)
+        self._open_volume = np.zeros(capacity)
+        self._side_sign = np.zeros(capacity, dtype=np.int8)
+        self._tp_closed_mask = np.zeros(capacity, dtype=np.uint8)
+        self._slot_pair_code = np.zeros(capacity, dtype=np.int64)
+        self._open_seq = np.zeros(capacity, dtype=np.int64)
+    
+    def _add_levels(self, position: Position):
+        """
+        Añadir una posición abierta al final de la lista y de los arrays.
+        
+        Args:
+            position: Posición abierta
+        """
+        slot = len(self._positions_list)
+        if slot == len(self._sl):
+            for name in self._LEVEL_ARRAYS:
+                old = getattr(self, name)
+                grown = np.zeros(len(old) * 2, dtype=old.dtype)
+                grown[:slot] = old
+                setattr(self, name, grown)
+        self._positions_list.append(position)
+        self._pos_index[position.position_id] = slot
+        
+        self._sl[slot] = position.stop_loss
+        self._tp1[slot] = position.take_profit_1
+        self._tp2[slot] = position.take_profit_2
+        self._tp3[slot] = position.take_profit_3
+        self._entry[slot] = position.entry_price
+        self._open_volume[slot] = position.get_open_volume()
+        self._side_sign[slot] = position.side_sign
+        self._tp_closed_mask[slot] = (
+            (position.volume_closed_tp1 != 0)
+            | (position.volume_closed_tp2 != 0) << 1
+            | (position.volume_closed_tp3 != 0) << 2
+        )
+        self._slot_pair_code[slot] = self._pair_codes.setdefault(position.pair, len(self._pair_codes))
+        self._open_seq[slot] = self._next_open_seq
+        self._next_open_seq += 1
+    
+    def _remove_levels(self, position_id: str):
+        """
+        Quitar una posición cerrada moviendo la última a su hueco (O(1)).
+        
+        Args:
+            position_id: ID de la posición
+        """
+        slot = self._pos_index.pop(position_id, None)
+        if slot is None:
+            return
+        last = len(self._positions_list) - 1
+        if slot != last:
+            moved = self._positions_list[last]
+            self._positions_list[slot] = moved
+            self._pos_index[moved.position_id] = slot
+            for name in self._LEVEL_ARRAYS:
+                array = getattr(self, name)
+                array[slot] = array[last]
+        self._positions_list.pop()
+    
+    def get_recent_closed(self, n: int) -> List[ClosedPosition]:
+        """
+        Obtener las últimas posiciones cerradas.
+        
+        Args:
+            n: Número máximo de posiciones
+            
+        Returns:
+            Posiciones cerradas más recientes, de la más antigua a la más nueva
+        """
+        history = self.closed_positions
+        start = max(len(history) - n, 0)
+        return [history[i] for i in range(start, len(history))]
+    
+    def get_pair_position_ids(self, pair: str) -> List[str]:
+        """
+        Obtener IDs de posiciones abiertas de un par.
+        
+        Args:
+            pair: Par de trading
+            
+        Returns:
+            Lista de IDs en orden de apertura
+        """
+        pair_ids = self._positions_by_pair.get(pair)
+        return list(pair_ids) if pair_ids else []
+    
+    def iter_pair_position_ids(self, pair: str) -> Iterator[str]:
+        """
+        Iterar los IDs de posiciones abiertas de un par sin copiar el índice.
+        
+        El llamador no debe abrir ni cerrar posiciones durante la iteración.
+        
+        Args:
+            pair: Par de trading
+            
+        Returns:
+            Iterador de IDs en orden de apertura
+        """
+        return iter(self._positions_by_pair.get(pair, ()))
+    
+    def open_pairs(self) -> KeysView[str]:
+        """
+        Obtener los pares con alguna posición abierta sin recorrer las posiciones.
+        
+        Returns:
+            Vista de los pares (refleja aperturas y cierres posteriores)
+        """
+        return self._positions_by_pair.keys()
     
     def get_current_capital(self) -> float:
         """
@@ -484,8 +1214,7 @@ class RiskManager:
         Returns:
             Capital actual
         """
-        unrealized_pnl = sum(p.unrealized_pnl for p in self.positions.values())
-        return self.config.total_capital + self.total_realized_pnl + unrealized_pnl
+        return self.config.total_capital + self.total_realized_pnl + self._sum_unrealized_pnl
     
     def get_available_capital(self) -> float:
         """
@@ -494,10 +1223,7 @@ class RiskManager:
         Returns:
             Capital disponible
         """
-        capital_in_use = sum(
-            p.entry_price * p.get_open_volume() for p in self.positions.values()
-        )
-        return self.get_current_capital() - capital_in_use
+        return self.get_current_capital() - self._sum_capital_in_use
     
     def get_drawdown(self) -> float:
         """
@@ -516,14 +1242,14 @@ class RiskManager:
         Returns:
             Diccionario con estadísticas
         """
-        total_trades = len(self.closed_positions)
-        winning_trades = sum(1 for p in self.closed_positions if p.realized_pnl > 0)
+        total_trades = self._n_closed
+        winning_trades = self._n_wins
         losing_trades = total_trades - winning_trades
         
         win_rate = winning_trades / total_trades if total_trades > 0 else 0
         
-        total_profit = sum(p.realized_pnl for p in self.closed_positions if p.realized_pnl > 0)
-        total_loss = abs(sum(p.realized_pnl for p in self.closed_positions if p.realized_pnl < 0))
+        total_profit = self._total_profit
+        total_loss = self._total_loss
         
         profit_factor = total_profit / total_loss if total_loss > 0 else 0
         
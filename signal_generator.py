@@ -4,9 +4,11 @@ Implementa lógica de generación de señales basada en indicadores técnicos.
 """
 
 import logging
-from typing import Dict, Optional, Tuple
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
 from enum import Enum
 from dataclasses import dataclass
+from itertools import compress
 from technical_analysis import TechnicalIndicators, MarketDataProcessor
 
 
@@ -39,7 +41,12 @@ class TradingSignal:
     take_profit_3: float
     position_size_percent: float
     reasoning: str
-    indicators_snapshot: Dict
+    indicators: TechnicalIndicators  # Inmutable: puede compartirse con la caché
+    
+    @property
+    def indicators_snapshot(self) -> Dict:
+        """Indicadores principales, materializados solo cuando se consultan"""
+        return self.indicators.snapshot()
 
 
 class SignalGenerator:
@@ -48,6 +55,33 @@ class SignalGenerator:
     Implementa estrategia híbrida Momentum-Reversion.
     """
     
+    # Pesos de la confianza: tendencia + momentum (0.30 + 0.30) son obligatorios
+    BASE_CONFIDENCE = 0.30 + 0.30
+    BB_WEIGHT = 0.20
+    VOLUME_WEIGHT = 0.20
+    
+    # Umbrales RSI (oversold, overbought) adaptados a la tendencia
+    _ADAPTIVE_RSI_THRESHOLDS = {"UPTREND": (40.0, 80.0), "DOWNTREND": (20.0, 60.0)}
+    
+    # Dirección de la operación según tendencia (1 compra, -1 venta)
+    _TREND_DIRECTION = {"UPTREND": 1, "DOWNTREND": -1}
+    
+    # Por dirección: tipo de señal y textos de razonamiento
+    _DIRECTION_PARAMS = {
+        1: (SignalType.BUY, (
+            "Tendencia alcista confirmada",
+            "Señal de momentum alcista",
+            "Precio en banda inferior de Bollinger",
+            "Volumen confirmado"
+        )),
+        -1: (SignalType.SELL, (
+            "Tendencia bajista confirmada",
+            "Señal de momentum bajista",
+            "Precio en banda superior de Bollinger",
+            "Volumen confirmado"
+        ))
+    }
+    
     def __init__(
         self,
         rsi_oversold: float = 30.0,
@@ -72,6 +106,12 @@ class SignalGenerator:
         self.volume_threshold = volume_threshold
         self.min_confidence = min_confidence
         self.processor = MarketDataProcessor()
+        
+        # Umbrales derivados, precalculados para no recalcularlos en cada tick
+        self._rsi_buy_below = rsi_oversold + 10.0  # Margen de +10 para ser más agresivo
+        self._rsi_sell_above = rsi_overbought - 10.0  # Margen de -10
+        self._adx_trend_min = adx_threshold - 5.0  # Umbral reducido
+        self._default_rsi_thresholds = (rsi_oversold, rsi_overbought)
     
     def _get_adaptive_rsi_thresholds(self, trend: str) -> Tuple[float, float]:
         """
@@ -83,40 +123,35 @@ class SignalGenerator:
         Returns:
             Tupla (oversold, overbought)
         """
-        if trend == "UPTREND":
-            return 40.0, 80.0
-        elif trend == "DOWNTREND":
-            return 20.0, 60.0
-        else:
-            return self.rsi_oversold, self.rsi_overbought
+        return self._ADAPTIVE_RSI_THRESHOLDS.get(trend, self._default_rsi_thresholds)
     
     def _check_trend_confirmation(
         self,
         indicators: TechnicalIndicators,
-        trend: str
+        direction: int
     ) -> bool:
         """
         Verificar confirmación de tendencia.
         
         Args:
             indicators: Indicadores técnicos
-            trend: Tipo de tendencia esperada
+            direction: 1 para tendencia alcista, -1 para bajista
             
         Returns:
             True si la tendencia está confirmada
         """
-        if trend == "UPTREND":
+        if direction > 0:
             # Verificar alineación de EMAs o precio sobre EMA 200 (más flexible)
             ema_aligned = (indicators.ema_12 > indicators.ema_50) or (indicators.close > indicators.ema_200)
             # Verificar fuerza de tendencia (umbral reducido)
-            trend_strong = indicators.adx_14 > (self.adx_threshold - 5.0)
+            trend_strong = indicators.adx_14 > self._adx_trend_min
             return ema_aligned and trend_strong
         
-        elif trend == "DOWNTREND":
+        elif direction < 0:
             # Verificar alineación de EMAs o precio bajo EMA 200
             ema_aligned = (indicators.ema_12 < indicators.ema_50) or (indicators.close < indicators.ema_200)
             # Verificar fuerza de tendencia
-            trend_strong = indicators.adx_14 > (self.adx_threshold - 5.0)
+            trend_strong = indicators.adx_14 > self._adx_trend_min
             return ema_aligned and trend_strong
         
         return False
@@ -124,28 +159,28 @@ class SignalGenerator:
     def _check_momentum_signal(
         self,
         indicators: TechnicalIndicators,
-        signal_type: SignalType
+        direction: int
     ) -> bool:
         """
         Verificar señal de momentum.
         
         Args:
             indicators: Indicadores técnicos
-            signal_type: Tipo de señal esperada
+            direction: 1 para compra, -1 para venta
             
         Returns:
             True si hay señal de momentum
         """
-        if signal_type == SignalType.BUY:
+        if direction > 0:
             # RSI en zona de compra (usando configuración)
-            rsi_signal = indicators.rsi_14 < (self.rsi_oversold + 10.0) # Margen de +10 para ser más agresivo
+            rsi_signal = indicators.rsi_14 < self._rsi_buy_below
             # MACD con histograma positivo o subiendo
             macd_signal = indicators.macd_histogram > 0 or (indicators.macd_histogram > indicators.macd_histogram_prev)
             return rsi_signal and macd_signal
         
-        elif signal_type == SignalType.SELL:
+        elif direction < 0:
             # RSI en zona de venta (usando configuración)
-            rsi_signal = indicators.rsi_14 > (self.rsi_overbought - 10.0) # Margen de -10
+            rsi_signal = indicators.rsi_14 > self._rsi_sell_above
             # MACD con histograma negativo o bajando
             macd_signal = indicators.macd_histogram < 0 or (indicators.macd_histogram < indicators.macd_histogram_prev)
             return rsi_signal and macd_signal
@@ -156,7 +191,7 @@ class SignalGenerator:
         self,
         indicators: TechnicalIndicators,
         current_price: float,
-        signal_type: SignalType
+        direction: int
     ) -> bool:
         """
         Verificar señal de Bandas de Bollinger.
@@ -164,22 +199,18 @@ class SignalGenerator:
         Args:
             indicators: Indicadores técnicos
             current_price: Precio actual
-            signal_type: Tipo de señal esperada
+            direction: 1 para compra, -1 para venta
             
         Returns:
             True si hay señal de BB
         """
-        if signal_type == SignalType.BUY:
+        if direction > 0:
             # Precio cerca de banda inferior
-            bb_range = indicators.bb_upper - indicators.bb_lower
-            distance_to_lower = current_price - indicators.bb_lower
-            return distance_to_lower < bb_range * 0.2
+            return current_price < indicators.bb_buy_threshold
         
-        elif signal_type == SignalType.SELL:
+        elif direction < 0:
             # Precio cerca de banda superior
-            bb_range = indicators.bb_upper - indicators.bb_lower
-            distance_to_upper = indicators.bb_upper - current_price
-            return distance_to_upper < bb_range * 0.2
+            return current_price > indicators.bb_sell_threshold
         
         return False
     
@@ -217,7 +248,7 @@ class SignalGenerator:
     
     def generate_signal(
         self,
-        ohlcv_data: list,
+        ohlcv_data: Union[list, np.ndarray],
         current_price: float,
         atr_multiplier: float = 2.0
     ) -> Optional[TradingSignal]:
@@ -225,7 +256,7 @@ class SignalGenerator:
         Generar señal de trading.
         
         Args:
-            ohlcv_data: Datos OHLCV
+            ohlcv_data: Datos OHLCV (lista de velas o vista de un array 2D)
             current_price: Precio actual
             atr_multiplier: Multiplicador para stops dinámicos
             
@@ -238,164 +269,136 @@ class SignalGenerator:
             logger.warning("No se pudieron calcular indicadores")
             return None
         
-        # Determinar tendencia
-        trend = self.processor.get_trend(indicators)
+        return self._signal_from_indicators(indicators, current_price, atr_multiplier)
+    
+    def generate_signals_bulk(
+        self,
+        ohlcv_data: Union[list, np.ndarray],
+        current_prices: Optional[np.ndarray] = None,
+        atr_multiplier: float = 2.0
+    ) -> List[Optional[TradingSignal]]:
+        """
+        Generar la señal de cada vela de una serie histórica en una pasada.
         
-        # Intentar generar señal de compra
-        if trend == "UPTREND":
-            buy_signal = self._generate_buy_signal(
-                indicators, current_price, atr_multiplier
-            )
-            if buy_signal and buy_signal.confidence >= self.min_confidence:
-                return buy_signal
-        
-        # Intentar generar señal de venta
-        elif trend == "DOWNTREND":
-            sell_signal = self._generate_sell_signal(
-                indicators, current_price, atr_multiplier
-            )
-            if sell_signal and sell_signal.confidence >= self.min_confidence:
-                return sell_signal
+        El resultado i equivale a generate_signal(ohlcv_data[:i+1], current_prices[i]),
+        pero los indicadores se calculan una sola vez sobre toda la serie.
         
-        return None
+        Args:
+            ohlcv_data: Datos OHLCV (lista de velas o array 2D)
+            current_prices: Precio de evaluación por vela (por defecto el cierre)
+            atr_multiplier: Multiplicador para stops dinámicos
+            
+        Returns:
+            Lista con una TradingSignal o None por vela
+        """
+        data = np.asarray(ohlcv_data, dtype=np.float64)
+        if current_prices is None:
+            current_prices = data[:, MarketDataProcessor.CLOSE_COL]
+        prices = np.asarray(current_prices, dtype=np.float64).tolist()
+        
+        signal_from_indicators = self._signal_from_indicators
+        return [
+            None if indicators is None
+            else signal_from_indicators(indicators, price, atr_multiplier)
+            for indicators, price in zip(self.processor.process_ohlcv_bulk(data), prices)
+        ]
     
-    def _generate_buy_signal(
+    def _signal_from_indicators(
         self,
         indicators: TechnicalIndicators,
         current_price: float,
         atr_multiplier: float
     ) -> Optional[TradingSignal]:
         """
-        Generar señal de compra.
+        Evaluar la señal a partir de indicadores ya calculados.
         
         Args:
             indicators: Indicadores técnicos
             current_price: Precio actual
-            atr_multiplier: Multiplicador para stops
+            atr_multiplier: Multiplicador para stops dinámicos
             
         Returns:
-            TradingSignal o None
+            TradingSignal si se genera señal, None si no hay señal
         """
-        confidence_score = 0.0
-        reasoning_parts = []
-        
-        # Verificar confirmación de tendencia (peso: 30%)
-        if self._check_trend_confirmation(indicators, "UPTREND"):
-            confidence_score += 0.30
-            reasoning_parts.append("Tendencia alcista confirmada")
-        else:
-            return None
-        
-        # Verificar señal de momentum (peso: 30%)
-        if self._check_momentum_signal(indicators, SignalType.BUY):
-            confidence_score += 0.30
-            reasoning_parts.append("Señal de momentum alcista")
-        else:
-            return None
-        
-        # Verificar Bandas de Bollinger (peso: 20%)
-        if self._check_bollinger_bands_signal(indicators, current_price, SignalType.BUY):
-            confidence_score += 0.20
-            reasoning_parts.append("Precio en banda inferior de Bollinger")
-        
-        # Verificar volumen (peso: 20%)
-        if self._check_volume_confirmation(indicators):
-            confidence_score += 0.20
-            reasoning_parts.append("Volumen confirmado")
+        # Determinar tendencia
+        trend = self.processor.get_trend(indicators)
         
-        if confidence_score < self.min_confidence:
+        # Compra en tendencia alcista, venta en bajista
+        direction = self._TREND_DIRECTION.get(trend)
+        if direction is None:
             return None
         
-        # Calcular stops y targets
-        stop_loss = current_price - (indicators.atr_14 * atr_multiplier)
-        
-        # Take profits escalonados
-        tp1 = current_price + (indicators.atr_14 * 1.5)
-        tp2 = current_price + (indicators.atr_14 * 2.5)
-        tp3 = current_price + (indicators.atr_14 * 4.0)
-        
-        position_size = self._calculate_position_size(confidence_score)
-        
-        return TradingSignal(
-            signal_type=SignalType.BUY,
-            confidence=confidence_score,
-            entry_price=current_price,
-            stop_loss=stop_loss,
-            take_profit_1=tp1,
-            take_profit_2=tp2,
-            take_profit_3=tp3,
-            position_size_percent=position_size,
-            reasoning="; ".join(reasoning_parts),
-            indicators_snapshot={
-                "ema_12": indicators.ema_12,
-                "ema_50": indicators.ema_50,
-                "ema_200": indicators.ema_200,
-                "rsi_14": indicators.rsi_14,
-                "macd": indicators.macd,
-                "atr_14": indicators.atr_14,
-                "adx_14": indicators.adx_14
-            }
+        signal = self._generate_directional_signal(
+            indicators, current_price, atr_multiplier, direction
         )
+        if signal and signal.confidence >= self.min_confidence:
+            return signal
+        
+        return None
     
-    def _generate_sell_signal(
+    def _generate_directional_signal(
         self,
         indicators: TechnicalIndicators,
         current_price: float,
-        atr_multiplier: float
+        atr_multiplier: float,
+        direction: int
     ) -> Optional[TradingSignal]:
         """
-        Generar señal de venta.
+        Generar señal de compra (direction=1) o de venta (direction=-1).
+        
+        Stops y take profits se reflejan respecto al precio según la dirección.
         
         Args:
             indicators: Indicadores técnicos
             current_price: Precio actual
             atr_multiplier: Multiplicador para stops
+            direction: 1 para compra, -1 para venta
             
         Returns:
             TradingSignal o None
         """
-        confidence_score = 0.0
-        reasoning_parts = []
-        
-        # Verificar confirmación de tendencia (peso: 30%)
-        if self._check_trend_confirmation(indicators, "DOWNTREND"):
-            confidence_score += 0.30
-            reasoning_parts.append("Tendencia bajista confirmada")
-        else:
-            return None
+        signal_type, reasons = self._DIRECTION_PARAMS[direction]
         
-        # Verificar señal de momentum (peso: 30%)
-        if self._check_momentum_signal(indicators, SignalType.SELL):
-            confidence_score += 0.30
-            reasoning_parts.append("Señal de momentum bajista")
-        else:
+        # Tendencia y momentum (30% cada uno) son condiciones obligatorias
+        if not self._check_trend_confirmation(indicators, direction):
+            return None
+        if not self._check_momentum_signal(indicators, direction):
             return None
         
-        # Verificar Bandas de Bollinger (peso: 20%)
-        if self._check_bollinger_bands_signal(indicators, current_price, SignalType.SELL):
-            confidence_score += 0.20
-            reasoning_parts.append("Precio en banda superior de Bollinger")
+        # Volumen primero (una comparación): si ni con la banda de Bollinger
+        # se alcanza la confianza mínima, no hace falta evaluarla
+        volume_ok = self._check_volume_confirmation(indicators)
+        volume_score = self.VOLUME_WEIGHT * volume_ok
+        if self.BASE_CONFIDENCE + self.BB_WEIGHT + volume_score < self.min_confidence:
+            return None
         
-        # Verificar volumen (peso: 20%)
-        if self._check_volume_confirmation(indicators):
-            confidence_score += 0.20
-            reasoning_parts.append("Volumen confirmado")
+        # Bandas de Bollinger y volumen (20% cada uno) suman sin ramificar
+        bb_ok = self._check_bollinger_bands_signal(indicators, current_price, direction)
+        confidence_score = self.BASE_CONFIDENCE + self.BB_WEIGHT * bb_ok
+        confidence_score += volume_score
         
         if confidence_score < self.min_confidence:
             return None
         
+        reasoning_parts = [
+            reasons[0],
+            reasons[1],
+            *compress(reasons[2:], (bb_ok, volume_ok))
+        ]
+        
         # Calcular stops y targets
-        stop_loss = current_price + (indicators.atr_14 * atr_multiplier)
+        atr = indicators.atr_14
+        stop_loss = current_price - direction * (atr * atr_multiplier)
         
         # Take profits escalonados
-        tp1 = current_price - (indicators.atr_14 * 1.5)
-        tp2 = current_price - (indicators.atr_14 * 2.5)
-        tp3 = current_price - (indicators.atr_14 * 4.0)
+        tp1 = current_price + direction * (atr * 1.5)
+        tp2 = current_price + direction * (atr * 2.5)
+        tp3 = current_price + direction * (atr * 4.0)
         
         position_size = self._calculate_position_size(confidence_score)
         
         return TradingSignal(
-            signal_type=SignalType.SELL,
+            signal_type=signal_type,
             confidence=confidence_score,
             entry_price=current_price,
             stop_loss=stop_loss,
@@ -404,15 +407,7 @@ class SignalGenerator:
             take_profit_3=tp3,
             position_size_percent=position_size,
             reasoning="; ".join(reasoning_parts),
-            indicators_snapshot={
-                "ema_12": indicators.ema_12,
-                "ema_50": indicators.ema_50,
-                "ema_200": indicators.ema_200,
-                "rsi_14": indicators.rsi_14,
-                "macd": indicators.macd,
-                "atr_14": indicators.atr_14,
-                "adx_14": indicators.adx_14
-            }
+            indicators=indicators
         )
 
 
@@ -423,10 +418,10 @@ if __name__ == "__main__":
     generator = SignalGenerator()
     
     # Datos de ejemplo
-    example_data = [
-        [1000 + i, 100 + i*0.05, 101 + i*0.05, 99 + i*0.05, 100.5 + i*0.05, 1000 + i*10]
-        for i in range(200)
-    ]
+    i = np.arange(200, dtype=np.float64)
+    example_data = np.column_stack([
+        1000 + i, 100 + i*0.05, 101 + i*0.05, 99 + i*0.05, 100.5 + i*0.05, 1000 + i*10
+    ])
     
     signal = generator.generate_signal(example_data, 110.0)
     
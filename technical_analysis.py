@@ -4,18 +4,396 @@ Calcula indicadores técnicos para generación de señales.
 """
 
 import numpy as np
-import pandas as pd
 import logging
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Tuple, Optional, Sequence, Union
+from dataclasses import dataclass, field
+
+from numba_compat import njit
 
 
 logger = logging.getLogger(__name__)
 
+# Tipos de entrada de los kernels: de solo lectura para aceptar también
+# arrays no modificables (fixtures, np.frombuffer, memmap) sin copiarlos
+_IN_F64 = "Array(float64, 1, 'A', readonly=True)"
+_IN_F32 = "Array(float32, 1, 'A', readonly=True)"
+
+
+@njit(f"float64[:]({_IN_F64}, int64)", cache=True)
+def _ema_loop(data: np.ndarray, period: int) -> np.ndarray:
+    """
+    Recurrencia de la EMA compilada con Numba.
+    
+    Args:
+        data: Array de precios (float64)
+        period: Período de la EMA
+        
+    Returns:
+        Array con valores de EMA sembrada con la SMA inicial
+    """
+    n = data.shape[0]
+    ema = np.empty(n, dtype=np.float64)
+    multiplier = 2.0 / (period + 1)
+    
+    # SMA inicial
+    seed = 0.0
+    for i in range(period):
+        seed += data[i]
+    seed /= period
+    for i in range(period):
+        ema[i] = seed
+    
+    # EMA
+    for i in range(period, n):
+        ema[i] = (data[i] * multiplier) + (ema[i-1] * (1 - multiplier))
+    
+    return ema
+
+
+@njit([f"float64({_IN_F64}, int64)", f"float64({_IN_F32}, int64)"], cache=True)
+def _ema_last(data: np.ndarray, period: int) -> float:
+    """
+    Último valor de la EMA sin materializar la serie completa.
+    
+    Args:
+        data: Array de precios (float64)
+        period: Período de la EMA
+        
+    Returns:
+        EMA de la última vela (NaN si no hay datos suficientes)
+    """
+    n = data.shape[0]
+    if n < period:
+        return np.nan
+    multiplier = 2.0 / (period + 1)
+    
+    # float(): acumular en float64 también con entrada float32 sin Numba
+    # (en NumPy 2, 0.0 + float32 sigue siendo float32)
+    ema = 0.0
+    for i in range(period):
+        ema += float(data[i])
+    ema /= period
+    
+    for i in range(period, n):
+        ema = (float(data[i]) * multiplier) + (ema * (1 - multiplier))
+    
+    return ema
+
+
+@njit(f"UniTuple(float64, 2)({_IN_F64}, int64, float64, float64, float64[:])", cache=True)
+def _rsi_wilder(
+    deltas: np.ndarray,
+    period: int,
+    up: float,
+    down: float,
+    rsi: np.ndarray
+) -> Tuple[float, float]:
+    """
+    Suavizado de Wilder del RSI compilado con Numba.
+    
+    Args:
+        deltas: Diferencias entre cierres consecutivos
+        period: Período del RSI
+        up: Media inicial de subidas
+        down: Media inicial de bajadas
+        rsi: Array de salida; se rellenan las posiciones desde period
+            (longitud 0 para obtener solo el estado final)
+        
+    Returns:
+        Medias finales (subidas, bajadas) para continuar en streaming
+    """
+    write = rsi.shape[0] > 0
+    for i in range(period, deltas.shape[0] + 1):
+        delta = deltas[i-1]
+        upval = delta if delta > 0 else 0.0
+        downval = 0.0 if delta > 0 else -delta
+        
+        up = (up * (period - 1) + upval) / period
+        down = (down * (period - 1) + downval) / period
+        
+        if not write:
+            continue
+        if down == 0:
+            rsi[i] = 100.0
+        else:
+            rsi[i] = 100.0 - 100.0 / (1.0 + up / down)
+    
+    return up, down
 
-@dataclass
+
+@njit([
+    f"UniTuple(float64, 4)({_IN_F64}, int64, int64, int64, float64[:], float64[:], float64[:])",
+    f"UniTuple(float64, 4)({_IN_F32}, int64, int64, int64, float64[:], float64[:], float64[:])"
+], cache=True)
+def _macd_fused(
+    data: np.ndarray,
+    fast: int,
+    slow: int,
+    signal: int,
+    macd: np.ndarray,
+    signal_line: np.ndarray,
+    histogram: np.ndarray
+) -> Tuple[float, float, float, float]:
+    """
+    MACD en una sola pasada: EMA rápida, lenta y de señal a la vez.
+    
+    Reproduce exactamente tres llamadas a _ema_loop (incluida la siembra
+    con la SMA inicial de cada serie). Requiere len(data) >= max(fast, slow, signal).
+    
+    Args:
+        data: Array de precios (float64)
+        fast: Período EMA rápida
+        slow: Período EMA lenta
+        signal: Período línea de señal
+        macd: Salida MACD (longitud 0 para calcular solo el último valor)
+        signal_line: Salida línea de señal (longitud 0 igual)
+        histogram: Salida histograma (longitud 0 igual)
+        
+    Returns:
+        Tupla (MACD, señal, histograma, histograma anterior) de la última vela
+    """
+    n = data.shape[0]
+    write = macd.shape[0] > 0
+    m_fast = 2.0 / (fast + 1)
+    m_slow = 2.0 / (slow + 1)
+    m_signal = 2.0 / (signal + 1)
+    
+    # Semillas SMA de las dos EMA de precio
+    # float(): acumuladores en float64 también con entrada float32 sin Numba
+    e_fast = 0.0
+    for i in range(fast):
+        e_fast += float(data[i])
+    e_fast /= fast
+    e_slow = 0.0
+    for i in range(slow):
+        e_slow += float(data[i])
+    e_slow /= slow
+    seed_fast = e_fast
+    seed_slow = e_slow
+    
+    # Primeros valores del MACD: semilla de la señal
+    seed_macd = np.empty(signal, dtype=np.float64)
+    e_signal = 0.0
+    value = 0.0
+    hist = np.nan
+    hist_prev = np.nan
+    for i in range(n):
+        if i >= fast:
+            e_fast = (float(data[i]) * m_fast) + (e_fast * (1 - m_fast))
+        else:
+            e_fast = seed_fast
+        if i >= slow:
+            e_slow = (float(data[i]) * m_slow) + (e_slow * (1 - m_slow))
+        else:
+            e_slow = seed_slow
+        value = e_fast - e_slow
+        if write:
+            macd[i] = value
+        
+        if i < signal:
+            seed_macd[i] = value
+        if i < signal - 1:
+            continue
+        if i == signal - 1:
+            # Semilla de la señal: SMA de los primeros valores del MACD
+            e_signal = 0.0
+            for j in range(signal):
+                e_signal += float(seed_macd[j])
+            e_signal /= signal
+            for j in range(signal):
+                hist_prev = hist
+                hist = float(seed_macd[j]) - e_signal
+                if write:
+                    signal_line[j] = e_signal
+                    histogram[j] = hist
+        else:
+            e_signal = (value * m_signal) + (e_signal * (1 - m_signal))
+            hist_prev = hist
+            hist = value - e_signal
+            if write:
+                signal_line[i] = e_signal
+                histogram[i] = hist
+    
+    return value, e_signal, hist, hist_prev
+
+
+@njit(f"float64[:]({_IN_F64}, {_IN_F64}, {_IN_F64})", cache=True)
+def _true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    True Range por vela en un solo bucle, sin arrays temporales.
+    
+    Args:
+        high: Array de máximos (float64)
+        low: Array de mínimos (float64)
+        close: Array de cierres (float64)
+        
+    Returns:
+        Array de TR; la primera vela (sin cierre previo) usa máximo - mínimo
+    """
+    n = high.shape[0]
+    tr = np.empty(n, dtype=np.float64)
+    if n == 0:
+        return tr
+    tr[0] = high[0] - low[0]
+    for k in range(1, n):
+        tr1 = high[k] - low[k]
+        tr2 = abs(high[k] - close[k - 1])
+        tr3 = abs(low[k] - close[k - 1])
+        # NaN se propaga, como np.maximum
+        if np.isnan(tr1) or np.isnan(tr2) or np.isnan(tr3):
+            tr[k] = np.nan
+        else:
+            tr[k] = max(tr1, tr2, tr3)
+    return tr
+
+
+@njit(f"float64[:]({_IN_F64}, {_IN_F64}, {_IN_F64}, int64)", cache=True)
+def _adx_fused(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int) -> np.ndarray:
+    """
+    ADX en un solo bucle: movimientos direccionales, True Range, DI y DX.
+    
+    Las medias son simples sobre ventanas de period velas, sumadas
+    directamente en cada paso: un NaN solo afecta a las ventanas que lo
+    contienen y no se acumula deriva de redondeo.
+    
+    Args:
+        high: Array de máximos (float64)
+        low: Array de mínimos (float64)
+        close: Array de cierres (float64)
+        period: Período del ADX
+        
+    Returns:
+        Array con valores de ADX, NaN hasta completar las dos ventanas
+    """
+    n = high.shape[0]
+    adx = np.full(n, np.nan)
+    pos_dm = np.empty(n - 1, dtype=np.float64)
+    neg_dm = np.empty(n - 1, dtype=np.float64)
+    tr = np.empty(n - 1, dtype=np.float64)
+    dx = np.empty(n - 1, dtype=np.float64)
+    
+    for k in range(n - 1):
+        up_move = high[k + 1] - high[k]
+        down_move = low[k] - low[k + 1]
+        pos_dm[k] = up_move if up_move > down_move and up_move > 0 else 0.0
+        neg_dm[k] = down_move if down_move > up_move and down_move > 0 else 0.0
+        
+        tr1 = high[k + 1] - low[k + 1]
+        tr2 = abs(high[k + 1] - close[k])
+        tr3 = abs(low[k + 1] - close[k])
+        if np.isnan(tr1) or np.isnan(tr2) or np.isnan(tr3):
+            tr[k] = np.nan
+        else:
+            tr[k] = max(tr1, tr2, tr3)
+        
+        if k < period - 1:
+            dx[k] = np.nan
+            continue
+        
+        tr_sum = 0.0
+        pos_sum = 0.0
+        neg_sum = 0.0
+        for j in range(k - period + 1, k + 1):
+            tr_sum += tr[j]
+            pos_sum += pos_dm[j]
+            neg_sum += neg_dm[j]
+        tr_mean = tr_sum / period
+        di_plus = 100 * (pos_sum / period) / tr_mean
+        di_minus = 100 * (neg_sum / period) / tr_mean
+        dx[k] = 100 * abs(di_plus - di_minus) / (di_plus + di_minus + 1e-10)
+        
+        if k >= 2 * (period - 1):
+            dx_sum = 0.0
+            for j in range(k - period + 1, k + 1):
+                dx_sum += dx[j]
+            adx[k + 1] = dx_sum / period
+    
+    return adx
+
+
+def _window_sums(
+    data: np.ndarray,
+    period: int,
+    squares: bool = False
+) -> Tuple[float, np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """
+    Sumas por ventana deslizante a partir de sumas prefijas (O(n)).
+    
+    Los datos se centran en el primer valor válido para limitar la
+    cancelación al restar sumas acumuladas grandes. Los NaN cuentan como
+    cero y se señalan por ventana.
+    
+    Args:
+        data: Array float64 con al menos period elementos
+        period: Tamaño de la ventana
+        squares: Calcular también la suma de cuadrados
+        
+    Returns:
+        Tupla (referencia, suma, suma de cuadrados o None, ventana con NaN)
+        con una entrada por ventana completa
+    """
+    missing = np.isnan(data)
+    ref = data[~missing][0] if not missing.all() else 0.0
+    centered = np.where(missing, 0.0, data - ref)
+    
+    c = np.concatenate(([0.0], np.cumsum(centered)))
+    window_sum = c[period:] - c[:-period]
+    window_sqsum = None
+    if squares:
+        c2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+        window_sqsum = c2[period:] - c2[:-period]
+    
+    nan_count = np.concatenate(([0], np.cumsum(missing)))
+    has_nan = (nan_count[period:] - nan_count[:-period]) > 0
+    return ref, window_sum, window_sqsum, has_nan
+
+
+def _trailing_window_sums(
+    data: np.ndarray,
+    period: int,
+    ref: np.ndarray,
+    squares: bool = False
+) -> Tuple[np.ndarray, Optional[np.ndarray], np.ndarray]:
+    """
+    Sumas de cada ventana completa, como _window_sums sobre la ventana aislada.
+    
+    Cada ventana se centra en su propia referencia y se suma en orden, de
+    modo que el resultado coincide bit a bit con procesar solo la cola de
+    la serie. Coste O(n * period) con O(n) de memoria.
+    
+    Args:
+        data: Array float64 con al menos period elementos
+        period: Tamaño de la ventana
+        ref: Referencia de cada ventana (len(data) - period + 1 valores)
+        squares: Calcular también la suma de cuadrados
+        
+    Returns:
+        Tupla (suma, suma de cuadrados o None, ventana con NaN)
+    """
+    m = len(data) - period + 1
+    window_sum = np.zeros(m)
+    window_sqsum = np.zeros(m) if squares else None
+    has_nan = np.zeros(m, dtype=bool)
+    for k in range(period):
+        values = data[k:k + m]
+        missing = np.isnan(values)
+        centered = np.where(missing, 0.0, values - ref)
+        window_sum += centered
+        if squares:
+            window_sqsum += centered * centered
+        has_nan |= missing
+    return window_sum, window_sqsum, has_nan
+
+
+@dataclass(frozen=True, slots=True)
 class TechnicalIndicators:
-    """Contenedor para indicadores técnicos calculados"""
+    """
+    Contenedor inmutable para indicadores técnicos calculados.
+    
+    La caché de MarketDataProcessor devuelve la misma instancia para la
+    misma serie, así que no debe poder modificarse.
+    """
     ema_12: float
     ema_50: float
     ema_200: float
@@ -32,6 +410,32 @@ class TechnicalIndicators:
     volume_ma: float
     current_volume: float
     close: float
+    # Precio límite para la señal de Bollinger: 20% del ancho desde cada banda
+    bb_buy_threshold: float = field(init=False)
+    bb_sell_threshold: float = field(init=False)
+    
+    def __post_init__(self):
+        """Precalcular los umbrales de Bollinger a partir de las bandas"""
+        bb_margin = (self.bb_upper - self.bb_lower) * 0.2
+        object.__setattr__(self, "bb_buy_threshold", self.bb_lower + bb_margin)
+        object.__setattr__(self, "bb_sell_threshold", self.bb_upper - bb_margin)
+    
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Indicadores principales como diccionario (para registro o serialización).
+        
+        Returns:
+            Diccionario con EMAs, RSI, MACD, ATR y ADX
+        """
+        return {
+            "ema_12": self.ema_12,
+            "ema_50": self.ema_50,
+            "ema_200": self.ema_200,
+            "rsi_14": self.rsi_14,
+            "macd": self.macd,
+            "atr_14": self.atr_14,
+            "adx_14": self.adx_14
+        }
 
 
 class TechnicalAnalysis:
@@ -55,17 +459,7 @@ class TechnicalAnalysis:
         if len(data) < period:
             return np.full_like(data, np.nan)
         
-        ema = np.zeros_like(data)
-        multiplier = 2.0 / (period + 1)
-        
-        # SMA inicial
-        ema[:period] = np.mean(data[:period])
-        
-        # EMA
-        for i in range(period, len(data)):
-            ema[i] = (data[i] * multiplier) + (ema[i-1] * (1 - multiplier))
-        
-        return ema
+        return _ema_loop(np.asarray(data, dtype=np.float64), period)
     
     @staticmethod
     def calculate_sma(data: np.ndarray, period: int) -> np.ndarray:
@@ -79,10 +473,15 @@ class TechnicalAnalysis:
         Returns:
             Array con valores de SMA
         """
+        data = np.asarray(data, dtype=np.float64)
+        sma = np.full(len(data), np.nan)
         if len(data) < period:
-            return np.full_like(data, np.nan)
+            return sma
         
-        return pd.Series(data).rolling(window=period).mean().values
+        # Una ventana con algún NaN no tiene valor (igual que rolling)
+        ref, window_sum, _, has_nan = _window_sums(data, period)
+        sma[period - 1:] = np.where(has_nan, np.nan, window_sum / period + ref)
+        return sma
     
     @staticmethod
     def calculate_rsi(data: np.ndarray, period: int = 14) -> np.ndarray:
@@ -96,43 +495,65 @@ class TechnicalAnalysis:
         Returns:
             Array con valores de RSI (0-100)
         """
+        return TechnicalAnalysis._rsi_with_state(data, period)[0]
+    
+    @staticmethod
+    def _rsi_with_state(
+        data: np.ndarray,
+        period: int,
+        full: bool = True
+    ) -> Tuple[Optional[np.ndarray], float, float]:
+        """
+        Calcular el RSI devolviendo también el estado final del suavizado.
+        
+        Args:
+            data: Array de precios
+            period: Período del RSI
+            full: Materializar la serie completa (False: solo el estado)
+            
+        Returns:
+            Tupla (RSI o None, media de subidas, media de bajadas); el
+            estado es NaN si no hay datos suficientes
+        """
         if len(data) < period + 1:
-            return np.full_like(data, np.nan)
+            return (np.full_like(data, np.nan) if full else None), np.nan, np.nan
         
-        deltas = np.diff(data)
+        deltas = np.diff(np.asarray(data, dtype=np.float64))
         seed = deltas[:period+1]
         
         up = seed[seed >= 0].sum() / period
         down = -seed[seed < 0].sum() / period
         
+        if not full:
+            up, down = _rsi_wilder(deltas, period, float(up), float(down), np.empty(0))
+            return None, up, down
+        
         rs = up / down if down != 0 else float('inf')
-        rsi = np.zeros_like(data)
+        rsi = np.zeros(len(deltas) + 1)
         
         if down == 0:
             rsi[:period] = 100.0
         else:
             rsi[:period] = 100.0 - 100.0 / (1.0 + rs)
         
-        for i in range(period, len(data)):
-            delta = deltas[i-1]
-            
-            if delta > 0:
-                upval = delta
-                downval = 0.0
-            else:
-                upval = 0.0
-                downval = -delta
-            
-            up = (up * (period - 1) + upval) / period
-            down = (down * (period - 1) + downval) / period
-            
-            if down == 0:
-                rsi[i] = 100.0
-            else:
-                rs = up / down
-                rsi[i] = 100.0 - 100.0 / (1.0 + rs)
+        up, down = _rsi_wilder(deltas, period, float(up), float(down), rsi)
+        return rsi, up, down
+    
+    @staticmethod
+    def _rsi_from_state(up: float, down: float) -> float:
+        """
+        RSI a partir de las medias de subidas y bajadas.
         
-        return rsi
+        Args:
+            up: Media de subidas
+            down: Media de bajadas
+            
+        Returns:
+            RSI (0-100); NaN si el estado es NaN
+        """
+        if down == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + up / down)
     
     @staticmethod
     def calculate_macd(
@@ -153,6 +574,15 @@ class TechnicalAnalysis:
         Returns:
             Tupla (MACD, Signal Line, Histogram)
         """
+        if len(data) >= max(fast, slow, signal):
+            n = len(data)
+            macd = np.empty(n, dtype=np.float64)
+            signal_line = np.empty(n, dtype=np.float64)
+            histogram = np.empty(n, dtype=np.float64)
+            _macd_fused(np.asarray(data, dtype=np.float64), fast, slow, signal, macd, signal_line, histogram)
+            return macd, signal_line, histogram
+        
+        # Serie corta: alguna EMA es NaN por completo
         ema_fast = TechnicalAnalysis.calculate_ema(data, fast)
         ema_slow = TechnicalAnalysis.calculate_ema(data, slow)
         
@@ -179,9 +609,23 @@ class TechnicalAnalysis:
         Returns:
             Tupla (Upper Band, Middle Band, Lower Band)
         """
-        middle = TechnicalAnalysis.calculate_sma(data, period)
+        data = np.asarray(data, dtype=np.float64)
+        n = len(data)
+        middle = np.full(n, np.nan)
+        std = np.full(n, np.nan)
+        if n < period:
+            return middle.copy(), middle, middle.copy()
+        
+        # Media y varianza de cada ventana en O(1) desde sumas prefijas
+        ref, window_sum, window_sqsum, has_nan = _window_sums(data, period, squares=True)
+        window_mean = window_sum / period
+        # Varianza muestral (ddof=1), como la desviación rolling de pandas
+        var = (window_sqsum - window_sum * window_mean) / (period - 1)
+        
+        # Una ventana con algún NaN no tiene valor (igual que rolling)
+        middle[period - 1:] = np.where(has_nan, np.nan, window_mean + ref)
+        std[period - 1:] = np.where(has_nan, np.nan, np.sqrt(np.maximum(var, 0.0)))
         
-        std = pd.Series(data).rolling(window=period).std().values
         upper = middle + (std * std_dev)
         lower = middle - (std * std_dev)
         
@@ -209,13 +653,12 @@ class TechnicalAnalysis:
         if len(high) < period:
             return np.full_like(high, np.nan)
         
-        # Calcular True Range
-        tr1 = high - low
-        tr2 = np.abs(high - np.roll(close, 1))
-        tr3 = np.abs(low - np.roll(close, 1))
-        
-        tr = np.maximum(tr1, np.maximum(tr2, tr3))
-        tr[0] = tr1[0]
+        # Calcular True Range (la primera vela no tiene cierre previo)
+        tr = _true_range(
+            np.asarray(high, dtype=np.float64),
+            np.asarray(low, dtype=np.float64),
+            np.asarray(close, dtype=np.float64)
+        )
         
         # ATR es SMA del TR
         atr = TechnicalAnalysis.calculate_sma(tr, period)
@@ -244,31 +687,12 @@ class TechnicalAnalysis:
         if len(high) < period * 2:
             return np.full_like(high, np.nan)
         
-        # Calcular movimientos direccionales
-        up_move = high[1:] - high[:-1]
-        down_move = low[:-1] - low[1:]
-        
-        pos_dm = np.where((up_move > down_move) & (up_move > 0), up_move, 0)
-        neg_dm = np.where((down_move > up_move) & (down_move > 0), down_move, 0)
-        
-        # Calcular ATR
-        tr1 = high[1:] - low[1:]
-        tr2 = np.abs(high[1:] - close[:-1])
-        tr3 = np.abs(low[1:] - close[:-1])
-        tr = np.maximum(tr1, np.maximum(tr2, tr3))
-        
-        # Calcular DI+, DI-
-        di_plus = 100 * TechnicalAnalysis.calculate_sma(pos_dm, period) / TechnicalAnalysis.calculate_sma(tr, period)
-        di_minus = 100 * TechnicalAnalysis.calculate_sma(neg_dm, period) / TechnicalAnalysis.calculate_sma(tr, period)
-        
-        # Calcular DX
-        dx = 100 * np.abs(di_plus - di_minus) / (di_plus + di_minus + 1e-10)
-        
-        # ADX es SMA del DX
-        adx = TechnicalAnalysis.calculate_sma(dx, period)
-        
-        # Pad with NaN at the beginning to match input length (lost 1 due to diff)
-        return np.concatenate(([np.nan], adx))
+        return _adx_fused(
+            np.asarray(high, dtype=np.float64),
+            np.asarray(low, dtype=np.float64),
+            np.asarray(close, dtype=np.float64),
+            period
+        )
     
     @staticmethod
     def analyze_candle(
@@ -317,22 +741,62 @@ class MarketDataProcessor:
     Convierte datos OHLCV en indicadores técnicos.
     """
     
-    def __init__(self, min_candles: int = 200):
+    # Columnas de [time, open, high, low, close, volume] usadas por los indicadores
+    CLOSE_COL = 4
+    HIGH_COL = 2
+    LOW_COL = 3
+    VOLUME_COL = 5
+    
+    def __init__(
+        self,
+        min_candles: int = 200,
+        cache_size: int = 8,
+        dtype: np.dtype = np.float64
+    ):
         """
         Inicializar procesador.
         
         Args:
             min_candles: Mínimo de velas requeridas para análisis
+            cache_size: Series recordadas (p. ej. una por par) para no
+                recalcular si se consulta de nuevo sin vela nueva
+            dtype: Tipo de almacenamiento de las velas (np.float32 reduce a
+                la mitad la memoria; los acumuladores siguen en float64)
         """
         self.min_candles = min_candles
+        self.dtype = np.dtype(dtype)
         self.ta = TechnicalAnalysis()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, TechnicalIndicators]" = OrderedDict()
     
-    def process_ohlcv(self, ohlcv_data: List[List[float]]) -> Optional[TechnicalIndicators]:
+    @staticmethod
+    def _cache_key(ohlcv_data: Union[List[List[float]], np.ndarray]) -> tuple:
+        """
+        Identificar una serie por su longitud, su inicio y la última vela completa.
+        
+        La última vela de Kraken sigue abierta y cambia sin cambiar su
+        timestamp, por eso se comparan todos sus valores y no solo el tiempo.
+        
+        Args:
+            ohlcv_data: Lista o array 2D de velas
+            
+        Returns:
+            Clave hashable de la serie
+        """
+        # Array 2D: indexado directo sin crear vistas de fila intermedias
+        if isinstance(ohlcv_data, np.ndarray):
+            return len(ohlcv_data), float(ohlcv_data[0, 0]), tuple(ohlcv_data[-1].tolist())
+        return len(ohlcv_data), float(ohlcv_data[0][0]), tuple(ohlcv_data[-1])
+    
+    def process_ohlcv(
+        self,
+        ohlcv_data: Union[List[List[float]], np.ndarray]
+    ) -> Optional[TechnicalIndicators]:
         """
         Procesar datos OHLCV y calcular indicadores.
         
         Args:
-            ohlcv_data: Lista de [time, open, high, low, close, volume]
+            ohlcv_data: Lista o array 2D de [time, open, high, low, close, volume]
             
         Returns:
             TechnicalIndicators con todos los indicadores calculados
@@ -341,50 +805,175 @@ class MarketDataProcessor:
             logger.warning(f"Datos insuficientes: {len(ohlcv_data)} < {self.min_candles}")
             return None
         
-        # Convertir a arrays numpy
-        data = np.array(ohlcv_data)
-        close = data[:, 4].astype(float)
-        high = data[:, 3].astype(float)
-        low = data[:, 2].astype(float)
-        volume = data[:, 5].astype(float)
+        # Misma serie que en una consulta reciente: reutilizar el resultado
+        cache = self._cache
+        key = self._cache_key(ohlcv_data) if self.cache_size > 0 else None
+        cached = cache.get(key)
+        if cached is not None:
+            cache.move_to_end(key)
+            return cached
         
-        # Calcular indicadores
-        ema_12 = self.ta.calculate_ema(close, 12)[-1]
-        ema_50 = self.ta.calculate_ema(close, 50)[-1]
-        ema_200 = self.ta.calculate_ema(close, 200)[-1]
+        indicators = self._compute_indicators(ohlcv_data)
+        if key is not None:
+            cache[key] = indicators
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return indicators
+    
+    def _compute_indicators(
+        self,
+        ohlcv_data: Union[List[List[float]], np.ndarray]
+    ) -> TechnicalIndicators:
+        """
+        Calcular los indicadores de la última vela (sin caché).
         
-        rsi_14 = self.ta.calculate_rsi(close, 14)[-1]
+        Args:
+            ohlcv_data: Lista o array 2D con al menos min_candles velas
+            
+        Returns:
+            TechnicalIndicators con todos los indicadores calculados
+        """
+        # Una sola conversión al dtype configurado (ninguna si ya lo es);
+        # columnas como vistas. Los kernels acumulan en float64
+        data = np.asarray(ohlcv_data, dtype=self.dtype)
+        close = data[:, self.CLOSE_COL]
+        high = data[:, self.HIGH_COL]
+        low = data[:, self.LOW_COL]
+        volume = data[:, self.VOLUME_COL]
         
-        macd, macd_signal, macd_histogram = self.ta.calculate_macd(close)
+        # Solo se usa la última vela: las recurrencias se calculan con
+        # acumuladores escalares y las ventanas sobre la cola necesaria
+        ema_12 = _ema_last(close, 12)
+        ema_50 = _ema_last(close, 50)
+        ema_200 = _ema_last(close, 200)
+        
+        _, rsi_up, rsi_down = self.ta._rsi_with_state(close, 14, full=False)
+        rsi_14 = self.ta._rsi_from_state(rsi_up, rsi_down)
         
-        bb_upper, bb_middle, bb_lower = self.ta.calculate_bollinger_bands(close)
+        if len(close) >= 26:
+            empty = np.empty(0)
+            macd, macd_signal, macd_histogram, macd_histogram_prev = _macd_fused(
+                close, 12, 26, 9, empty, empty, empty
+            )
+        else:
+            macd = macd_signal = macd_histogram = macd_histogram_prev = np.nan
         
-        atr_14 = self.ta.calculate_atr(high, low, close, 14)[-1]
+        bb_upper, bb_middle, bb_lower = (
+            band[-1] for band in self.ta.calculate_bollinger_bands(close[-20:])
+        )
         
-        adx_14 = self.ta.calculate_adx(high, low, close, 14)[-1]
+        atr_14 = self.ta.calculate_atr(high[-15:], low[-15:], close[-15:], 14)[-1]
         
-        volume_ma = self.ta.calculate_sma(volume, 50)[-1]
-        current_volume = volume[-1]
+        # El ADX de la última vela depende de las últimas 2 * 14 velas
+        adx_14 = self.ta.calculate_adx(high[-28:], low[-28:], close[-28:], 14)[-1]
+        
+        volume_ma = self.ta.calculate_sma(volume[-50:], 50)[-1]
+        current_volume = float(volume[-1])
         
         return TechnicalIndicators(
             ema_12=ema_12,
             ema_50=ema_50,
             ema_200=ema_200,
             rsi_14=rsi_14,
-            macd=macd[-1],
-            macd_signal=macd_signal[-1],
-            macd_histogram=macd_histogram[-1],
-            macd_histogram_prev=macd_histogram[-2],
-            bb_upper=bb_upper[-1],
-            bb_middle=bb_middle[-1],
-            bb_lower=bb_lower[-1],
+            macd=macd,
+            macd_signal=macd_signal,
+            macd_histogram=macd_histogram,
+            macd_histogram_prev=macd_histogram_prev,
+            bb_upper=bb_upper,
+            bb_middle=bb_middle,
+            bb_lower=bb_lower,
             atr_14=atr_14,
             adx_14=adx_14,
             volume_ma=volume_ma,
             current_volume=current_volume,
-            close=close[-1]
+            close=float(close[-1])
         )
     
+    def process_ohlcv_bulk(
+        self,
+        ohlcv_data: Union[List[List[float]], np.ndarray]
+    ) -> List[Optional[TechnicalIndicators]]:
+        """
+        Calcular los indicadores de cada vela de una serie histórica.
+        
+        El resultado i coincide exactamente con process_ohlcv(ohlcv_data[:i+1]),
+        pero las recurrencias (EMA, RSI, MACD) se recorren una sola vez sobre
+        la serie completa y las ventanas se evalúan vectorizadas.
+        
+        Args:
+            ohlcv_data: Lista o array 2D de [time, open, high, low, close, volume]
+            
+        Returns:
+            Lista con un TechnicalIndicators por vela (None mientras no haya
+            min_candles velas)
+        """
+        data = np.asarray(ohlcv_data, dtype=self.dtype)
+        n = len(data)
+        results: List[Optional[TechnicalIndicators]] = [None] * n
+        
+        # Antes de 200 velas la EMA 200 no existe en el prefijo: cálculo directo
+        start = max(self.min_candles, 200)
+        for i in range(self.min_candles - 1, min(start - 1, n)):
+            results[i] = self._compute_indicators(data[:i + 1])
+        if n < start:
+            return results
+        
+        # Cálculo vectorizado en float64 (sin copia si ya lo es)
+        close = np.asarray(data[:, self.CLOSE_COL], dtype=np.float64)
+        high = np.asarray(data[:, self.HIGH_COL], dtype=np.float64)
+        low = np.asarray(data[:, self.LOW_COL], dtype=np.float64)
+        volume = np.asarray(data[:, self.VOLUME_COL], dtype=np.float64)
+        
+        ema_12 = _ema_loop(close, 12)
+        ema_50 = _ema_loop(close, 50)
+        ema_200 = _ema_loop(close, 200)
+        rsi_14 = self.ta.calculate_rsi(close, 14)
+        macd, macd_signal, macd_histogram = self.ta.calculate_macd(close)
+        adx_14 = self.ta.calculate_adx(high, low, close, 14)
+        
+        # Bollinger (20): cada ventana centrada en su primer cierre
+        bb_ref = close[:n - 19]
+        bb_sum, bb_sqsum, bb_nan = _trailing_window_sums(close, 20, bb_ref, squares=True)
+        bb_mean = bb_sum / 20
+        bb_var = (bb_sqsum - bb_sum * bb_mean) / 19
+        bb_middle = np.where(bb_nan, np.nan, bb_mean + bb_ref)
+        bb_std = np.where(bb_nan, np.nan, np.sqrt(np.maximum(bb_var, 0.0)))
+        bb_upper = bb_middle + (bb_std * 2.0)
+        bb_lower = bb_middle - (bb_std * 2.0)
+        
+        # ATR (14) sobre las últimas 15 velas: la referencia es el rango
+        # máximo-mínimo de la vela que precede a la ventana de TR
+        tr = _true_range(high, low, close)
+        atr_ref = high[:n - 14] - low[:n - 14]
+        atr_ref = np.where(np.isnan(atr_ref), tr[1:n - 13], atr_ref)
+        atr_sum, _, atr_nan = _trailing_window_sums(tr[1:], 14, atr_ref)
+        atr_14 = np.where(atr_nan, np.nan, atr_sum / 14 + atr_ref)
+        
+        vol_ref = volume[:n - 49]
+        vol_sum, _, vol_nan = _trailing_window_sums(volume, 50, vol_ref)
+        volume_ma = np.where(vol_nan, np.nan, vol_sum / 50 + vol_ref)
+        
+        for i in range(start - 1, n):
+            results[i] = TechnicalIndicators(
+                ema_12=ema_12[i],
+                ema_50=ema_50[i],
+                ema_200=ema_200[i],
+                rsi_14=rsi_14[i],
+                macd=macd[i],
+                macd_signal=macd_signal[i],
+                macd_histogram=macd_histogram[i],
+                macd_histogram_prev=macd_histogram[i - 1],
+                bb_upper=bb_upper[i - 19],
+                bb_middle=bb_middle[i - 19],
+                bb_lower=bb_lower[i - 19],
+                atr_14=atr_14[i - 14],
+                adx_14=adx_14[i],
+                volume_ma=volume_ma[i - 49],
+                current_volume=volume[i],
+                close=close[i]
+            )
+        return results
+    
     def get_trend(self, indicators: TechnicalIndicators) -> str:
         """
         Determinar tendencia actual.
@@ -420,6 +1009,186 @@ class MarketDataProcessor:
             return "WEAK"
 
 
+class StreamingProcessor:
+    """
+    Procesador incremental de indicadores.
+    
+    Tras una carga inicial del histórico, cada vela nueva actualiza los
+    indicadores en O(1): las EMA, el RSI y el MACD avanzan un paso de su
+    recurrencia y las medias móviles trabajan sobre ventanas acotadas.
+    Los resultados equivalen a process_ohlcv sobre todo el histórico
+    recibido (no sobre una ventana deslizante).
+    """
+    
+    # Velas finales que se reproducen para llenar las ventanas (volumen 50 + margen)
+    WARMUP_CANDLES = 64
+    
+    def __init__(self, min_candles: int = 200):
+        """
+        Inicializar procesador.
+        
+        Args:
+            min_candles: Mínimo de velas requeridas para la carga inicial
+        """
+        self.min_candles = min_candles
+        self.ta = TechnicalAnalysis()
+        self.ready = False
+    
+    def ingest(
+        self,
+        ohlcv_data: Union[List[List[float]], np.ndarray]
+    ) -> Optional[TechnicalIndicators]:
+        """
+        Cargar el histórico inicial y preparar el estado incremental.
+        
+        Args:
+            ohlcv_data: Lista o array 2D de [time, open, high, low, close, volume]
+            
+        Returns:
+            Indicadores de la última vela (None si no hay datos suficientes)
+        """
+        if len(ohlcv_data) < max(self.min_candles, self.WARMUP_CANDLES):
+            logger.warning(f"Datos insuficientes: {len(ohlcv_data)} < {self.min_candles}")
+            return None
+        
+        data = np.asarray(ohlcv_data, dtype=np.float64)
+        close = data[:, MarketDataProcessor.CLOSE_COL]
+        
+        # Recurrencias: dependen de todo el histórico, se toman del cálculo completo
+        self.ema_12 = self.ta.calculate_ema(close, 12)[-1]
+        self.ema_26 = self.ta.calculate_ema(close, 26)[-1]
+        self.ema_50 = self.ta.calculate_ema(close, 50)[-1]
+        self.ema_200 = self.ta.calculate_ema(close, 200)[-1]
+        _, macd_signal, macd_histogram = self.ta.calculate_macd(close)
+        self.macd_signal = macd_signal[-1]
+        self.macd_histogram = macd_histogram[-1]
+        _, self.rsi_up, self.rsi_down = self.ta._rsi_with_state(close, 14, full=False)
+        
+        # Ventanas: se llenan reproduciendo las últimas velas
+        self._closes: Deque[float] = deque(maxlen=20)
+        self._tr: Deque[float] = deque(maxlen=14)
+        self._pos_dm: Deque[float] = deque(maxlen=14)
+        self._neg_dm: Deque[float] = deque(maxlen=14)
+        self._dx: Deque[float] = deque(maxlen=14)
+        self._volumes: Deque[float] = deque(maxlen=50)
+        
+        tail = data[-self.WARMUP_CANDLES:]
+        self._set_last(tail[0])
+        for candle in tail[1:]:
+            self._push_windows(candle)
+        
+        self.ready = True
+        return self._snapshot(macd_histogram[-2])
+    
+    def update(self, candle: Sequence[float]) -> TechnicalIndicators:
+        """
+        Incorporar una vela nueva.
+        
+        Args:
+            candle: Vela [time, open, high, low, close, volume]
+            
+        Returns:
+            Indicadores actualizados
+        """
+        if not self.ready:
+            raise RuntimeError("StreamingProcessor requiere ingest() antes de update()")
+        
+        close = float(candle[MarketDataProcessor.CLOSE_COL])
+        
+        # EMA: un paso de la recurrencia (misma expresión que _ema_loop)
+        for attr, period in (("ema_12", 12), ("ema_26", 26), ("ema_50", 50), ("ema_200", 200)):
+            multiplier = 2.0 / (period + 1)
+            setattr(self, attr, (close * multiplier) + (getattr(self, attr) * (1 - multiplier)))
+        
+        # MACD y su señal
+        macd = self.ema_12 - self.ema_26
+        multiplier = 2.0 / (9 + 1)
+        self.macd_signal = (macd * multiplier) + (self.macd_signal * (1 - multiplier))
+        histogram_prev = self.macd_histogram
+        self.macd_histogram = macd - self.macd_signal
+        
+        # RSI: un paso del suavizado de Wilder
+        delta = close - self._last_close
+        upval = delta if delta > 0 else 0.0
+        downval = 0.0 if delta > 0 else -delta
+        self.rsi_up = (self.rsi_up * 13 + upval) / 14
+        self.rsi_down = (self.rsi_down * 13 + downval) / 14
+        
+        self._push_windows(candle)
+        return self._snapshot(histogram_prev)
+    
+    def _set_last(self, candle: Sequence[float]):
+        """Recordar la vela anterior para diferencias y True Range"""
+        self._last_close = float(candle[MarketDataProcessor.CLOSE_COL])
+        self._last_high = float(candle[MarketDataProcessor.HIGH_COL])
+        self._last_low = float(candle[MarketDataProcessor.LOW_COL])
+    
+    def _push_windows(self, candle: Sequence[float]):
+        """
+        Añadir una vela a las ventanas de BB, ATR, ADX y volumen.
+        
+        Args:
+            candle: Vela [time, open, high, low, close, volume]
+        """
+        close = float(candle[MarketDataProcessor.CLOSE_COL])
+        high = float(candle[MarketDataProcessor.HIGH_COL])
+        low = float(candle[MarketDataProcessor.LOW_COL])
+        
+        self._closes.append(close)
+        self._volumes.append(float(candle[MarketDataProcessor.VOLUME_COL]))
+        
+        # True Range (compartido por ATR y ADX)
+        self._tr.append(max(high - low, abs(high - self._last_close), abs(low - self._last_close)))
+        
+        # Movimientos direccionales
+        up_move = high - self._last_high
+        down_move = self._last_low - low
+        self._pos_dm.append(up_move if up_move > down_move and up_move > 0 else 0.0)
+        self._neg_dm.append(down_move if down_move > up_move and down_move > 0 else 0.0)
+        
+        if len(self._tr) == 14:
+            tr_sum = sum(self._tr)
+            di_plus = 100 * sum(self._pos_dm) / tr_sum
+            di_minus = 100 * sum(self._neg_dm) / tr_sum
+            self._dx.append(100 * abs(di_plus - di_minus) / (di_plus + di_minus + 1e-10))
+        
+        self._set_last(candle)
+    
+    def _snapshot(self, macd_histogram_prev: float) -> TechnicalIndicators:
+        """
+        Construir los indicadores a partir del estado actual.
+        
+        Args:
+            macd_histogram_prev: Histograma MACD de la vela anterior
+            
+        Returns:
+            TechnicalIndicators de la última vela
+        """
+        rsi = self.ta._rsi_from_state(self.rsi_up, self.rsi_down)
+        closes = np.fromiter(self._closes, dtype=np.float64, count=len(self._closes))
+        bb_middle = closes.mean()
+        bb_std = closes.std(ddof=1)
+        
+        return TechnicalIndicators(
+            ema_12=self.ema_12,
+            ema_50=self.ema_50,
+            ema_200=self.ema_200,
+            rsi_14=rsi,
+            macd=self.ema_12 - self.ema_26,
+            macd_signal=self.macd_signal,
+            macd_histogram=self.macd_histogram,
+            macd_histogram_prev=macd_histogram_prev,
+            bb_upper=bb_middle + bb_std * 2.0,
+            bb_middle=bb_middle,
+            bb_lower=bb_middle - bb_std * 2.0,
+            atr_14=sum(self._tr) / 14,
+            adx_14=sum(self._dx) / 14,
+            volume_ma=sum(self._volumes) / 50,
+            current_volume=self._volumes[-1],
+            close=self._last_close
+        )
+
+
 if __name__ == "__main__":
     # Ejemplo de uso
     logging.basicConfig(level=logging.INFO)
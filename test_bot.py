@@ -5,17 +5,99 @@ Valida todas las capas del sistema.
 
 import unittest
 import logging
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import FrozenInstanceError, asdict, replace
 from datetime import datetime
+from functools import lru_cache
+from typing import Tuple
 import numpy as np
 
-from technical_analysis import TechnicalAnalysis, MarketDataProcessor, TechnicalIndicators
+from technical_analysis import TechnicalAnalysis, MarketDataProcessor, TechnicalIndicators, StreamingProcessor
+from technical_analysis import _ema_loop, _ema_last, _macd_fused, _rsi_wilder, _true_range, _adx_fused
 from signal_generator import SignalGenerator, SignalType
 from risk_manager import RiskManager, RiskConfig, PositionStatus
+from numba_compat import njit
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Kernels de indicadores y si ya estaban compilados al importar (antes de
+# cualquier llamada): las firmas explícitas evitan la pausa de JIT inicial
+INDICATOR_KERNELS = (_ema_loop, _ema_last, _macd_fused, _rsi_wilder, _true_range, _adx_fused)
+COMPILED_AT_IMPORT = {
+    kernel.__name__: bool(kernel.signatures)
+    for kernel in INDICATOR_KERNELS if hasattr(kernel, "signatures")
+}
+
+# Valores admitidos por las clasificaciones (búsqueda por hash, sin listas por llamada)
+TRENDS = frozenset({"UPTREND", "DOWNTREND", "SIDEWAYS"})
+TREND_STRENGTHS = frozenset({"STRONG", "MODERATE", "WEAK"})
+SIGNAL_TYPES = frozenset(SignalType)
+
+# Generador con la configuración por defecto compartido por las pruebas: sus
+# umbrales no cambian y la caché de indicadores solo evita recálculos
+SIGNAL_GENERATOR = SignalGenerator()
+
+
+@njit("boolean(Array(float64, 1, 'A', readonly=True), float64, float64)")
+def _all_in_range(values: np.ndarray, lo: float, hi: float) -> bool:
+    """
+    Comprobar en una sola pasada que todos los valores están en [lo, hi].
+    
+    Args:
+        values: Serie de un indicador sin la región de calentamiento
+        lo: Límite inferior
+        hi: Límite superior
+        
+    Returns:
+        False en cuanto aparece un valor fuera de rango o NaN
+    """
+    for v in values:
+        if not (lo <= v <= hi):
+            return False
+    return True
+
+
+@lru_cache(maxsize=None)
+def build_ohlcv(step: float, high_offset: float, low_offset: float, close_offset: float) -> np.ndarray:
+    """
+    Generar 200 velas sintéticas con tendencia lineal (array de solo lectura).
+    
+    Se construye una vez por combinación de parámetros; al ser de solo
+    lectura, las pruebas pueden compartir el mismo array.
+    
+    Args:
+        step: Incremento del precio de apertura por vela
+        high_offset: Distancia del máximo sobre la apertura
+        low_offset: Distancia del mínimo bajo la apertura
+        close_offset: Distancia del cierre sobre la apertura
+        
+    Returns:
+        Array (200, 6) de [time, open, high, low, close, volume]
+    """
+    # Bloque contiguo de 48 bytes por vela rellenado por columnas, sin
+    # arrays temporales por columna
+    i = np.arange(200, dtype=np.float64)
+    ohlcv = np.empty((200, 6), dtype=np.float64)
+    np.add(i, 1000, out=ohlcv[:, 0])
+    np.multiply(i, step, out=ohlcv[:, 1])
+    ohlcv[:, 1] += 100.0
+    open_price = ohlcv[:, 1]
+    np.add(open_price, high_offset, out=ohlcv[:, 2])
+    np.subtract(open_price, low_offset, out=ohlcv[:, 3])
+    np.add(open_price, close_offset, out=ohlcv[:, 4])
+    np.multiply(i, 10, out=ohlcv[:, 5])
+    ohlcv[:, 5] += 1000
+    ohlcv.flags.writeable = False
+    return ohlcv
+
 
 class TestTechnicalAnalysis(unittest.TestCase):
     """Pruebas para análisis técnico"""
@@ -23,7 +105,7 @@ class TestTechnicalAnalysis(unittest.TestCase):
     def setUp(self):
         """Configurar datos de prueba"""
         # Generar datos de ejemplo
-        self.prices = np.array([100.0 + i*0.5 for i in range(200)])
+        self.prices = 100.0 + np.arange(200, dtype=np.float64) * 0.5
         self.ta = TechnicalAnalysis()
     
     def test_ema_calculation(self):
@@ -31,16 +113,61 @@ class TestTechnicalAnalysis(unittest.TestCase):
         ema = self.ta.calculate_ema(self.prices, 12)
         self.assertEqual(len(ema), len(self.prices))
         self.assertFalse(np.isnan(ema[-1]))
-        logger.info(f"EMA 12: {ema[-1]:.2f}")
+        logger.info("EMA 12: %.2f", ema[-1])
     
+    def test_ema_matches_reference(self):
+        """Probar que la EMA compilada coincide con la recurrencia en Python"""
+        period = 12
+        multiplier = 2.0 / (period + 1)
+        expected = [sum(self.prices[:period]) / period] * period
+        for price in self.prices[period:]:
+            expected.append(price * multiplier + expected[-1] * (1 - multiplier))
+        np.testing.assert_array_equal(self.ta.calculate_ema(self.prices, period), expected)
+    
+    def test_kernels_compiled_at_import(self):
+        """Probar que los kernels se compilan al importar y no en la primera llamada"""
+        if not COMPILED_AT_IMPORT:
+            self.skipTest("Numba no instalado: los kernels son Python puro")
+        for name, compiled in COMPILED_AT_IMPORT.items():
+            self.assertTrue(compiled, f"{name} sin firma explícita")
+    
+    def test_kernels_match_python_fallback(self):
+        """Probar que los kernels compilados coinciden con su versión Python (sin Numba)"""
+        if not hasattr(_ema_loop, "py_func"):
+            self.skipTest("Numba no instalado: los kernels ya son Python puro")
+        
+        prices = self.prices + np.sin(np.arange(len(self.prices)))
+        np.testing.assert_array_equal(_ema_loop(prices, 26), _ema_loop.py_func(prices, 26))
+        self.assertEqual(_ema_last(prices, 50), _ema_last.py_func(prices, 50))
+        
+        compiled = [np.empty(len(prices)) for _ in range(3)]
+        python = [np.empty(len(prices)) for _ in range(3)]
+        self.assertEqual(
+            _macd_fused(prices, 12, 26, 9, *compiled),
+            _macd_fused.py_func(prices, 12, 26, 9, *python)
+        )
+        np.testing.assert_array_equal(compiled, python)
+        
+        # Suavizado de Wilder del RSI, True Range y ADX
+        deltas = np.diff(prices)
+        rsi_compiled, rsi_python = np.zeros(len(prices)), np.zeros(len(prices))
+        self.assertEqual(
+            _rsi_wilder(deltas, 14, 0.5, 0.4, rsi_compiled),
+            _rsi_wilder.py_func(deltas, 14, 0.5, 0.4, rsi_python)
+        )
+        np.testing.assert_array_equal(rsi_compiled, rsi_python)
+        
+        high, low = prices + 1.0, prices - 1.0
+        np.testing.assert_array_equal(_true_range(high, low, prices), _true_range.py_func(high, low, prices))
+        np.testing.assert_array_equal(_adx_fused(high, low, prices, 14), _adx_fused.py_func(high, low, prices, 14))
+
     def test_rsi_calculation(self):
         """Probar cálculo de RSI"""
         rsi = self.ta.calculate_rsi(self.prices, 14)
         self.assertEqual(len(rsi), len(self.prices))
-        # RSI debe estar entre 0 y 100
-        valid_rsi = rsi[~np.isnan(rsi)]
-        self.assertTrue(np.all(valid_rsi >= 0) and np.all(valid_rsi <= 100))
-        logger.info(f"RSI 14: {rsi[-1]:.2f}")
+        # RSI debe estar entre 0 y 100 (sin NaN: la serie se rellena desde el inicio)
+        self.assertTrue(_all_in_range(rsi, 0.0, 100.0))
+        logger.info("RSI 14: %.2f", rsi[-1])
     
     def test_macd_calculation(self):
         """Probar cálculo de MACD"""
@@ -48,17 +175,23 @@ class TestTechnicalAnalysis(unittest.TestCase):
         self.assertEqual(len(macd), len(self.prices))
         self.assertEqual(len(signal), len(self.prices))
         self.assertEqual(len(histogram), len(self.prices))
-        logger.info(f"MACD: {macd[-1]:.4f}, Signal: {signal[-1]:.4f}, Histogram: {histogram[-1]:.4f}")
+        logger.info("MACD: %.4f, Signal: %.4f, Histogram: %.4f", macd[-1], signal[-1], histogram[-1])
     
     def test_bollinger_bands_calculation(self):
         """Probar cálculo de Bandas de Bollinger"""
         upper, middle, lower = self.ta.calculate_bollinger_bands(self.prices, 20, 2.0)
         self.assertEqual(len(upper), len(self.prices))
-        # Upper debe ser > middle > lower
-        valid_idx = ~(np.isnan(upper) | np.isnan(middle) | np.isnan(lower))
-        self.assertTrue(np.all(upper[valid_idx] > middle[valid_idx]))
-        self.assertTrue(np.all(middle[valid_idx] > lower[valid_idx]))
-        logger.info(f"BB Upper: {upper[-1]:.2f}, Middle: {middle[-1]:.2f}, Lower: {lower[-1]:.2f}")
+        # Las primeras period-1 posiciones no tienen ventana completa
+        self.assertTrue(np.isnan(middle[:19]).all())
+        # Upper > middle > lower en una sola reducción sobre la región válida
+        half_width = upper[19:] - middle[19:]
+        self.assertTrue(np.all((half_width > 0) & (middle[19:] > lower[19:])))
+        logger.info("BB Upper: %.2f, Middle: %.2f, Lower: %.2f", upper[-1], middle[-1], lower[-1])
+
+        # Coincide con la media y desviación muestral de cada ventana
+        windows = np.lib.stride_tricks.sliding_window_view(self.prices, 20)
+        np.testing.assert_allclose(middle[19:], windows.mean(axis=1), rtol=1e-12)
+        np.testing.assert_allclose(half_width, 2.0 * windows.std(axis=1, ddof=1), rtol=1e-9)
     
     def test_atr_calculation(self):
         """Probar cálculo de ATR"""
@@ -67,7 +200,7 @@ class TestTechnicalAnalysis(unittest.TestCase):
         atr = self.ta.calculate_atr(high, low, self.prices, 14)
         self.assertEqual(len(atr), len(self.prices))
         self.assertFalse(np.isnan(atr[-1]))
-        logger.info(f"ATR 14: {atr[-1]:.2f}")
+        logger.info("ATR 14: %.2f", atr[-1])
     
     def test_adx_calculation(self):
         """Probar cálculo de ADX"""
@@ -75,69 +208,106 @@ class TestTechnicalAnalysis(unittest.TestCase):
         low = self.prices - 1.0
         adx = self.ta.calculate_adx(high, low, self.prices, 14)
         self.assertEqual(len(adx), len(self.prices))
-        valid_adx = adx[~np.isnan(adx)]
-        # ADX debe estar entre 0 y 100
-        self.assertTrue(np.all(valid_adx >= 0) and np.all(valid_adx <= 100))
-        logger.info(f"ADX 14: {adx[-1]:.2f}")
+        # Solo el calentamiento (2·period - 1 velas) queda sin valor;
+        # después el ADX debe estar entre 0 y 100
+        warmup = 2*14 - 1
+        self.assertTrue(np.isnan(adx[:warmup]).all())
+        self.assertTrue(_all_in_range(adx[warmup:], 0.0, 100.0))
+        logger.info("ADX 14: %.2f", adx[-1])
 
 
 class TestMarketDataProcessor(unittest.TestCase):
     """Pruebas para procesador de datos de mercado"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Generar una sola vez los datos OHLCV de ejemplo y sus indicadores"""
+        cls.ohlcv_data = build_ohlcv(step=0.1, high_offset=1.0, low_offset=1.0, close_offset=0.5)
+        cls.indicators = MarketDataProcessor(min_candles=200, cache_size=0).process_ohlcv(cls.ohlcv_data)
+    
     def setUp(self):
         """Configurar datos de prueba"""
         self.processor = MarketDataProcessor(min_candles=200)
-        # Generar datos OHLCV de ejemplo
-        self.ohlcv_data = []
-        for i in range(200):
-            time = 1000 + i
-            open_price = 100.0 + i*0.1
-            high = open_price + 1.0
-            low = open_price - 1.0
-            close = open_price + 0.5
-            volume = 1000 + i*10
-            self.ohlcv_data.append([time, open_price, high, low, close, volume])
     
     def test_process_ohlcv(self):
         """Probar procesamiento de datos OHLCV"""
-        indicators = self.processor.process_ohlcv(self.ohlcv_data)
+        indicators = self.indicators
         self.assertIsNotNone(indicators)
         self.assertGreater(indicators.ema_12, 0)
         self.assertGreater(indicators.ema_50, 0)
         self.assertGreater(indicators.rsi_14, 0)
-        logger.info(f"Indicadores procesados: EMA12={indicators.ema_12:.2f}, RSI={indicators.rsi_14:.2f}")
+        logger.info("Indicadores procesados: EMA12=%.2f, RSI=%.2f", indicators.ema_12, indicators.rsi_14)
     
+    def test_process_ohlcv_cache(self):
+        """Probar que se reutiliza el resultado si la serie no cambia"""
+        first = self.processor.process_ohlcv(self.ohlcv_data)
+        self.assertIs(self.processor.process_ohlcv(np.array(self.ohlcv_data)), first)
+        # La instancia compartida no puede modificarse desde fuera
+        with self.assertRaises(FrozenInstanceError):
+            first.close = 0.0
+        
+        # La vela abierta cambia el cierre sin cambiar el timestamp
+        updated = [list(candle) for candle in self.ohlcv_data]
+        updated[-1][4] += 5.0
+        second = self.processor.process_ohlcv(updated)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.close, updated[-1][4])
+    
+    def test_process_ohlcv_list_matches_array(self):
+        """Probar que la lista de velas y el array 2D dan los mismos indicadores"""
+        from_list = MarketDataProcessor(cache_size=0).process_ohlcv(self.ohlcv_data.tolist())
+        self.assertEqual(asdict(from_list), asdict(self.indicators))
+    
+    def test_process_ohlcv_float32(self):
+        """Probar que el almacenamiento en float32 conserva los indicadores"""
+        expected = self.indicators
+        indicators = MarketDataProcessor(dtype=np.float32).process_ohlcv(self.ohlcv_data)
+        for name, value in asdict(expected).items():
+            self.assertAlmostEqual(getattr(indicators, name), value, delta=1e-5 * max(abs(value), 1.0))
+    
+    def test_streaming_matches_batch(self):
+        """Probar que el procesador incremental coincide con el cálculo completo"""
+        rng = np.random.default_rng(3)
+        close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.02, 260)))
+        candles = np.column_stack([
+            np.arange(260.0), close, close * 1.01, close * 0.99, close, rng.uniform(1e3, 1e4, 260)
+        ])
+
+        streaming = StreamingProcessor(min_candles=200)
+        results = [(streaming.ingest(candles[:200]), 200)]
+        results += [(streaming.update(candles[k]), k + 1) for k in range(200, 260)]
+
+        for indicators, n in results:
+            expected = self.processor.process_ohlcv(candles[:n])
+            for name, value in asdict(expected).items():
+                self.assertAlmostEqual(getattr(indicators, name), value, delta=1e-9 * max(abs(value), 1.0))
+        logger.info("Indicadores incrementales equivalentes al cálculo completo")
+
     def test_get_trend(self):
         """Probar detección de tendencia"""
-        indicators = self.processor.process_ohlcv(self.ohlcv_data)
-        trend = self.processor.get_trend(indicators)
-        self.assertIn(trend, ["UPTREND", "DOWNTREND", "SIDEWAYS"])
-        logger.info(f"Tendencia detectada: {trend}")
+        trend = self.processor.get_trend(self.indicators)
+        self.assertIn(trend, TRENDS)
+        logger.info("Tendencia detectada: %s", trend)
     
     def test_get_trend_strength(self):
         """Probar detección de fuerza de tendencia"""
-        indicators = self.processor.process_ohlcv(self.ohlcv_data)
-        strength = self.processor.get_trend_strength(indicators)
-        self.assertIn(strength, ["STRONG", "MODERATE", "WEAK"])
-        logger.info(f"Fuerza de tendencia: {strength}")
+        strength = self.processor.get_trend_strength(self.indicators)
+        self.assertIn(strength, TREND_STRENGTHS)
+        logger.info("Fuerza de tendencia: %s", strength)
 
 
 class TestSignalGenerator(unittest.TestCase):
     """Pruebas para generador de señales"""
     
+    @classmethod
+    def setUpClass(cls):
+        """Generar una sola vez los datos OHLCV de ejemplo (solo lectura)"""
+        # Datos con tendencia alcista
+        cls.ohlcv_data = build_ohlcv(step=0.5, high_offset=1.0, low_offset=0.5, close_offset=0.3)
+    
     def setUp(self):
         """Configurar datos de prueba"""
-        self.generator = SignalGenerator()
-        # Generar datos OHLCV de ejemplo con tendencia alcista
-        self.ohlcv_data = []
-        for i in range(200):
-            time = 1000 + i
-            open_price = 100.0 + i*0.5  # Tendencia alcista
-            high = open_price + 1.0
-            low = open_price - 0.5
-            close = open_price + 0.3
-            volume = 1000 + i*10
-            self.ohlcv_data.append([time, open_price, high, low, close, volume])
+        self.generator = SIGNAL_GENERATOR
     
     def test_generate_signal(self):
         """Probar generación de señal"""
@@ -145,34 +315,107 @@ class TestSignalGenerator(unittest.TestCase):
         signal = self.generator.generate_signal(self.ohlcv_data, current_price)
         
         if signal:
-            self.assertIn(signal.signal_type, [SignalType.BUY, SignalType.SELL, SignalType.NEUTRAL])
+            self.assertIn(signal.signal_type, SIGNAL_TYPES)
             self.assertGreaterEqual(signal.confidence, 0.0)
             self.assertLessEqual(signal.confidence, 1.0)
             self.assertGreater(signal.position_size_percent, 0.0)
-            logger.info(f"Señal generada: {signal.signal_type.value}, Confianza: {signal.confidence:.2%}")
+            logger.info("Señal generada: %s, Confianza: %.2f%%", signal.signal_type.value, signal.confidence * 100)
         else:
             logger.info("No se generó señal (normal en datos de prueba)")
+    
+    def test_signal_confidence_weights(self):
+        """Probar pesos de confianza y razonamiento de señales"""
+        indicators = TechnicalIndicators(
+            ema_12=110.0, ema_50=100.0, ema_200=90.0, rsi_14=35.0,
+            macd=1.0, macd_signal=0.5, macd_histogram=0.5, macd_histogram_prev=0.2,
+            bb_upper=120.0, bb_middle=110.0, bb_lower=100.0, atr_14=2.0,
+            adx_14=30.0, volume_ma=1000.0, current_volume=1200.0, close=101.0
+        )
+        signal = self.generator._generate_directional_signal(indicators, 101.0, 2.0, 1)
+        self.assertEqual(signal.confidence, 1.0)
+        self.assertEqual(signal.stop_loss, 97.0)
+        self.assertEqual(signal.reasoning.count(";"), 3)
+        self.assertEqual(signal.indicators_snapshot["atr_14"], 2.0)
+        
+        # Sin volumen ni banda: 0.60 < confianza mínima
+        indicators = replace(indicators, current_volume=500.0)
+        self.assertIsNone(self.generator._generate_directional_signal(indicators, 115.0, 2.0, 1))
+        signal = self.generator._generate_directional_signal(indicators, 101.0, 2.0, 1)
+        self.assertAlmostEqual(signal.confidence, 0.8)
+        self.assertNotIn("Volumen", signal.reasoning)
+        
+        # Umbrales RSI adaptativos por tendencia
+        self.assertEqual(self.generator._get_adaptive_rsi_thresholds("UPTREND"), (40.0, 80.0))
+        self.assertEqual(self.generator._get_adaptive_rsi_thresholds("SIDEWAYS"), (30.0, 70.0))
+    
+    def test_generate_signals_bulk(self):
+        """Probar que la generación en bloque coincide con la señal por vela"""
+        rng = np.random.default_rng(6)
+        close = 100.0 * np.exp(np.cumsum(rng.normal(0.001, 0.02, 320)))
+        candles = np.column_stack([
+            np.arange(320.0), close, close * 1.01, close * 0.99, close, rng.uniform(1e3, 1e4, 320)
+        ])
+        generator = SignalGenerator(min_confidence=0.6)
+        
+        bulk = generator.generate_signals_bulk(candles)
+        self.assertEqual(len(bulk), 320)
+        self.assertTrue(any(bulk))
+        for i, signal in enumerate(bulk):
+            if i < 199:
+                self.assertIsNone(signal)
+                continue
+            expected = generator.generate_signal(candles[:i + 1], close[i])
+            self.assertEqual(signal is None, expected is None)
+            if signal:
+                self.assertEqual(signal.confidence, expected.confidence)
+                self.assertEqual(signal.stop_loss, expected.stop_loss)
+                self.assertEqual(asdict(signal.indicators), asdict(expected.indicators))
 
 
 class TestRiskManager(unittest.TestCase):
     """Pruebas para gestor de riesgos"""
     
-    def setUp(self):
-        """Configurar gestor de riesgos"""
-        config = RiskConfig(
+    # Posición larga de BTC usada por las pruebas de ciclo de vida
+    BTC_POSITION = dict(
+        pair="BTC/USD",
+        side="buy",
+        entry_price=45000.0,
+        volume=0.1,
+        stop_loss=44000.0,
+        take_profit_1=46500.0,
+        take_profit_2=48000.0,
+        take_profit_3=50000.0
+    )
+    # Variante pequeña para las pruebas de historial, índice y persistencia
+    SMALL_BTC_POSITION = {**BTC_POSITION, "volume": 0.01}
+    
+    @classmethod
+    def setUpClass(cls):
+        """Crear la configuración compartida (sin persistencia en disco)"""
+        cls.config = RiskConfig(
             total_capital=10000.0,
             risk_per_trade=0.02,
             max_positions=5,
             max_position_size=0.10,
-            max_drawdown=0.15
+            max_drawdown=0.15,
+            state_file=None
         )
-        self.manager = RiskManager(config)
+    
+    def setUp(self):
+        """Configurar gestor de riesgos"""
+        # Construir uno nuevo cuesta unos µs sin state_file, y el gestor
+        # guarda locks (no admite deepcopy de un gestor de referencia)
+        self.manager = RiskManager(self.config)
+    
+    def _open_btc_position(self, position_id: str, **overrides) -> bool:
+        """Abrir la posición de referencia con el identificador indicado"""
+        return self.manager.open_position(position_id=position_id, **{**self.BTC_POSITION, **overrides})
     
     def test_can_open_position(self):
         """Probar verificación de apertura de posición"""
         can_open, reason = self.manager.can_open_position()
         self.assertTrue(can_open)
-        logger.info(f"Puede abrir posición: {can_open}")
+        logger.info("Puede abrir posición: %s", can_open)
     
     def test_calculate_position_size(self):
         """Probar cálculo de tamaño de posición"""
@@ -182,126 +425,281 @@ class TestRiskManager(unittest.TestCase):
         
         volume = self.manager.calculate_position_size(entry_price, stop_loss, confidence)
         self.assertGreater(volume, 0)
-        logger.info(f"Tamaño de posición calculado: {volume:.4f}")
+        logger.info("Tamaño de posición calculado: %.4f", volume)
     
     def test_open_position(self):
         """Probar apertura de posición"""
-        success = self.manager.open_position(
-            position_id="test_001",
-            pair="BTC/USD",
-            side="buy",
-            entry_price=45000.0,
-            volume=0.1,
-            stop_loss=44000.0,
-            take_profit_1=46500.0,
-            take_profit_2=48000.0,
-            take_profit_3=50000.0
-        )
+        success = self._open_btc_position("test_001")
         self.assertTrue(success)
         self.assertIn("test_001", self.manager.positions)
         logger.info("Posición abierta exitosamente")
     
-    def test_update_position_price(self):
-        """Probar actualización de precio de posición"""
-        self.manager.open_position(
-            position_id="test_002",
-            pair="BTC/USD",
-            side="buy",
-            entry_price=45000.0,
-            volume=0.1,
-            stop_loss=44000.0,
-            take_profit_1=46500.0,
-            take_profit_2=48000.0,
-            take_profit_3=50000.0
-        )
+    def test_position_lifecycle(self):
+        """Probar actualización de precio, stop loss, take profit y cierre parcial"""
         
-        self.manager.update_position_price("test_002", 46000.0)
-        position = self.manager.positions["test_002"]
-        self.assertEqual(position.current_price, 46000.0)
-        self.assertGreater(position.unrealized_pnl, 0)
-        logger.info(f"Precio actualizado. PnL no realizado: {position.unrealized_pnl:.2f}")
-    
-    def test_check_stop_loss(self):
-        """Probar verificación de stop loss"""
-        self.manager.open_position(
-            position_id="test_003",
-            pair="BTC/USD",
-            side="buy",
-            entry_price=45000.0,
-            volume=0.1,
-            stop_loss=44000.0,
-            take_profit_1=46500.0,
-            take_profit_2=48000.0,
-            take_profit_3=50000.0
-        )
+        def update_price(position_id):
+            self.manager.update_position_price(position_id, 46000.0)
+            position = self.manager.positions[position_id]
+            self.assertEqual(position.current_price, 46000.0)
+            self.assertGreater(position.unrealized_pnl, 0)
+            logger.info("Precio actualizado. PnL no realizado: %.2f", position.unrealized_pnl)
         
-        # Precio por debajo del stop loss
-        hit_sl = self.manager.check_stop_loss("test_003", 43900.0)
-        self.assertTrue(hit_sl)
-        logger.info("Stop loss detectado correctamente")
-    
-    def test_check_take_profit(self):
-        """Probar verificación de take profit"""
-        self.manager.open_position(
-            position_id="test_004",
-            pair="BTC/USD",
-            side="buy",
-            entry_price=45000.0,
-            volume=0.1,
-            stop_loss=44000.0,
-            take_profit_1=46500.0,
-            take_profit_2=48000.0,
-            take_profit_3=50000.0
-        )
+        def stop_loss(position_id):
+            # Precio por debajo del stop loss
+            self.assertTrue(self.manager.check_stop_loss(position_id, 43900.0))
+            logger.info("Stop loss detectado correctamente")
         
-        # Precio en TP1
-        tp_level, reached = self.manager.check_take_profit("test_004", 46500.0)
-        self.assertTrue(reached)
-        self.assertEqual(tp_level, 1)
-        logger.info("Take profit 1 detectado correctamente")
-    
-    def test_close_position_partial(self):
-        """Probar cierre parcial de posición"""
-        self.manager.open_position(
-            position_id="test_005",
-            pair="BTC/USD",
-            side="buy",
-            entry_price=45000.0,
-            volume=0.1,
-            stop_loss=44000.0,
-            take_profit_1=46500.0,
-            take_profit_2=48000.0,
-            take_profit_3=50000.0
-        )
+        def take_profit(position_id):
+            # Precio en TP1
+            tp_level, reached = self.manager.check_take_profit(position_id, 46500.0)
+            self.assertTrue(reached)
+            self.assertEqual(tp_level, 1)
+            logger.info("Take profit 1 detectado correctamente")
+        
+        def partial_close(position_id):
+            volume_closed = self.manager.close_position_partial(position_id, 1, 46500.0)
+            self.assertGreater(volume_closed, 0)
+            position = self.manager.positions[position_id]
+            self.assertGreater(position.realized_pnl, 0)
+            logger.info("Cierre parcial: %.4f, PnL: %.2f", volume_closed, position.realized_pnl)
         
-        volume_closed = self.manager.close_position_partial("test_005", 1, 46500.0)
-        self.assertGreater(volume_closed, 0)
-        position = self.manager.positions["test_005"]
-        self.assertGreater(position.realized_pnl, 0)
-        logger.info(f"Cierre parcial: {volume_closed:.4f}, PnL: {position.realized_pnl:.2f}")
+        # Un solo gestor: cada escenario abre su propia posición de referencia
+        scenarios = (
+            ("test_002", update_price),
+            ("test_003", stop_loss),
+            ("test_004", take_profit),
+            ("test_005", partial_close),
+        )
+        for position_id, check in scenarios:
+            with self.subTest(scenario=check.__name__):
+                self.assertTrue(self._open_btc_position(position_id))
+                check(position_id)
     
+    def test_check_all_matches_per_position(self):
+        """Probar que check_all coincide con las comprobaciones individuales"""
+        manager = RiskManager(RiskConfig(total_capital=1e9, max_positions=40, state_file=None))
+        rng = np.random.default_rng(7)
+        for i in range(30):
+            side = "buy" if i % 2 == 0 else "sell"
+            sign = 1 if side == "buy" else -1
+            manager.open_position(
+                position_id=f"test_all_{i}",
+                pair="BTC/USD" if i % 3 else "ETH/USD",
+                side=side,
+                entry_price=100.0,
+                volume=1.0,
+                stop_loss=100.0 - sign * 5,
+                take_profit_1=100.0 + sign * 5,
+                take_profit_2=100.0 + sign * 10,
+                take_profit_3=100.0 + sign * 15
+            )
+        manager.close_position_partial("test_all_0", 1, 106.0)
+        manager.close_position_stop_loss("test_all_4", 94.0)
+
+        for _ in range(20):
+            prices = {"BTC/USD": float(rng.uniform(80, 120)), "ETH/USD": float(rng.uniform(80, 120))}
+            expected = []
+            for position_id, position in manager.positions.items():
+                price = prices[position.pair]
+                if manager.check_stop_loss(position_id, price):
+                    expected.append((position_id, 0))
+                    continue
+                tp_level, reached = manager.check_take_profit(position_id, price)
+                if reached:
+                    expected.append((position_id, tp_level))
+            self.assertEqual(manager.check_all(prices), expected)
+
+        # close_triggered ejecuta exactamente los eventos detectados
+        prices = {"BTC/USD": 120.0, "ETH/USD": 80.0}
+        expected = manager.check_all(prices)
+        self.assertEqual(manager.close_triggered(prices), expected)
+        self.assertTrue(expected)
+        for position_id, level in expected:
+            if level == 0:
+                self.assertNotIn(position_id, manager.positions)
+            else:
+                position = manager.positions[position_id]
+                self.assertGreater(getattr(position, f"volume_closed_tp{level}"), 0)
+        logger.info("check_all equivalente a las comprobaciones por posición")
+
+    def test_update_prices_batch(self):
+        """Probar que update_prices coincide con la actualización por posición"""
+        managers = [RiskManager(RiskConfig(total_capital=1e9, max_positions=20, state_file=None))
+                    for _ in range(2)]
+        for manager in managers:
+            for i in range(12):
+                sign = 1 if i % 2 == 0 else -1
+                manager.open_position(
+                    position_id=f"test_upd_{i}",
+                    pair="BTC/USD" if i % 3 else "ETH/USD",
+                    side="buy" if sign > 0 else "sell",
+                    entry_price=100.0 + i,
+                    volume=0.5 + i * 0.1,
+                    stop_loss=100.0 - sign * 50,
+                    take_profit_1=100.0 + sign * 50,
+                    take_profit_2=100.0 + sign * 60,
+                    take_profit_3=100.0 + sign * 70
+                )
+            manager.close_position_partial("test_upd_3", 1, 120.0)
+
+        prices = {"BTC/USD": 107.3, "ETH/USD": 93.1}
+        batch, single = managers
+        batch.update_prices(prices)
+        for position_id, position in single.positions.items():
+            single.update_position_price(position_id, prices[position.pair])
+
+        for position_id, position in single.positions.items():
+            self.assertEqual(batch.positions[position_id].current_price, position.current_price)
+            self.assertEqual(batch.positions[position_id].unrealized_pnl, position.unrealized_pnl)
+        self.assertAlmostEqual(batch.get_current_capital(), single.get_current_capital(), places=9)
+        logger.info("update_prices equivalente a update_position_price")
+
+    def test_all_take_profits_close_position(self):
+        """Probar que los tres TP cierran exactamente todo el volumen"""
+        self._open_btc_position("test_tp_all", volume=0.7)
+        for tp_level, price in ((1, 46500.0), (2, 48000.0), (3, 50000.0)):
+            self.manager.close_position_partial("test_tp_all", tp_level, price)
+
+        self.assertNotIn("test_tp_all", self.manager.positions)
+        self.assertEqual(self.manager.closed_positions[-1].status, PositionStatus.CLOSED)
+        logger.info("Posición cerrada por completo tras TP3")
+
+    def test_close_updates_pair_index(self):
+        """Probar índice de posiciones por par"""
+        for position_id, pair in (("test_idx_btc", "BTC/USD"), ("test_idx_eth", "ETH/USD")):
+            self._open_btc_position(position_id, pair=pair, volume=0.01)
+
+        self.assertIn("test_idx_eth", self.manager.get_pair_position_ids("ETH/USD"))
+        self.assertNotIn("test_idx_eth", self.manager.get_pair_position_ids("BTC/USD"))
+        self.assertEqual(list(self.manager.open_pairs()), ["BTC/USD", "ETH/USD"])
+
+        self.manager.close_position_stop_loss("test_idx_btc", 46500.0)
+        self.manager.close_position_stop_loss("test_idx_eth", 46500.0)
+        self.assertNotIn("test_idx_btc", self.manager.get_pair_position_ids("BTC/USD"))
+        self.assertEqual(self.manager.get_pair_position_ids("ETH/USD"), [])
+        self.assertEqual(len(self.manager.open_pairs()), 0)
+        logger.info("Índice por par actualizado correctamente")
+
+    def test_closed_position_recycled(self):
+        """Probar reutilización de posiciones cerradas y registro del historial"""
+        manager = RiskManager(RiskConfig(total_capital=10000.0, state_file=None))
+        params = self.SMALL_BTC_POSITION
+        manager.open_position(position_id="test_pool_1", **params)
+        first = manager.positions["test_pool_1"]
+        manager.close_position_stop_loss("test_pool_1", 43000.0)
+
+        manager.open_position(position_id="test_pool_2", **params)
+        second = manager.positions["test_pool_2"]
+        self.assertIs(first, second)
+        self.assertEqual(second.realized_pnl, 0.0)
+        self.assertEqual(second.status, PositionStatus.OPEN)
+
+        closed = manager.closed_positions[-1]
+        self.assertEqual(closed.position_id, "test_pool_1")
+        self.assertEqual(closed.status, PositionStatus.STOPPED_OUT)
+        self.assertAlmostEqual(closed.realized_pnl, -20.0)
+        logger.info("Posición reutilizada desde el pool")
+
+    def test_closed_history_bounded(self):
+        """Probar que el historial de cerradas está acotado sin afectar a las estadísticas"""
+        manager = RiskManager(RiskConfig(total_capital=10000.0, closed_history_size=2, state_file=None))
+        for i in range(3):
+            manager.open_position(position_id=f"test_hist_{i}", **self.SMALL_BTC_POSITION)
+            manager.close_position_stop_loss(f"test_hist_{i}", 46000.0)
+
+        recent = manager.get_recent_closed(10)
+        self.assertEqual([p.position_id for p in recent], ["test_hist_1", "test_hist_2"])
+        self.assertEqual(manager.get_recent_closed(1)[0].position_id, "test_hist_2")
+        self.assertEqual(manager.get_statistics()["total_trades"], 3)
+        logger.info("Historial de cerradas acotado")
+
+    def test_state_round_trip(self):
+        """Probar que el estado guardado conserva todos los campos de la posición"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = RiskConfig(
+                total_capital=10000.0,
+                state_file=os.path.join(tmp_dir, "state.json"),
+                save_debounce_seconds=0
+            )
+            manager = RiskManager(config)
+            manager.open_position(position_id="test_round_trip", **self.SMALL_BTC_POSITION)
+            manager.close_position_partial("test_round_trip", 1, 46500.0)
+
+            with open(config.state_file) as f:
+                saved = json.load(f)["positions"]["test_round_trip"]
+            self.assertEqual(saved["status"], PositionStatus.PARTIALLY_CLOSED.value)
+            self.assertIsInstance(saved["entry_time"], int)
+
+            restored = RiskManager(config).positions["test_round_trip"]
+            self.assertEqual(restored, manager.positions["test_round_trip"])
+
+            # Los estados antiguos guardan el estado por nombre
+            saved["status"] = "PARTIALLY_CLOSED"
+            with open(config.state_file, "w") as f:
+                json.dump({"positions": {"test_round_trip": saved}}, f)
+            restored = RiskManager(config).positions["test_round_trip"]
+            self.assertIs(restored.status, PositionStatus.PARTIALLY_CLOSED)
+        logger.info("Estado restaurado sin pérdida de campos")
+
+    def test_journal_replay(self):
+        """Probar recuperación de estado desde snapshot más journal"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config = RiskConfig(
+                total_capital=10000.0,
+                state_file=os.path.join(tmp_dir, "state.json"),
+                journal_file=os.path.join(tmp_dir, "state.journal"),
+                journal_compact_every=3
+            )
+            manager = RiskManager(config)
+            for position_id in ("test_journal_1", "test_journal_2"):
+                manager.open_position(position_id=position_id, **self.SMALL_BTC_POSITION)
+            # El tercer evento compacta; los siguientes quedan solo en el journal
+            manager.close_position_partial("test_journal_1", 1, 46500.0)
+            manager.close_position_stop_loss("test_journal_2", 43000.0)
+            manager.close_position_partial("test_journal_1", 2, 48000.0)
+            manager.flush()
+
+            restored = RiskManager(config)
+            self.assertEqual(list(restored.positions), ["test_journal_1"])
+            self.assertEqual(restored.positions["test_journal_1"], manager.positions["test_journal_1"])
+            self.assertAlmostEqual(restored.total_realized_pnl, manager.total_realized_pnl)
+            self.assertEqual(restored.consecutive_losses, 1)
+        logger.info("Estado reconstruido desde el journal")
+
+    def test_debounced_save_state(self):
+        """Probar escritura diferida del estado y flush explícito"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            state_file = os.path.join(tmp_dir, "state.json")
+            manager = RiskManager(RiskConfig(
+                total_capital=10000.0,
+                state_file=state_file,
+                save_debounce_seconds=60.0
+            ))
+            manager.open_position(position_id="test_debounce", **self.SMALL_BTC_POSITION)
+            self.assertFalse(os.path.exists(state_file))
+
+            manager.flush()
+            with open(state_file) as f:
+                self.assertIn("test_debounce", json.load(f)["positions"])
+
+            # El stop loss es crítico: se escribe sin esperar a la ventana
+            manager.close_position_stop_loss("test_debounce", 43000.0)
+            with open(state_file) as f:
+                self.assertNotIn("test_debounce", json.load(f)["positions"])
+        logger.info("Estado guardado tras flush y stop loss")
+
     def test_get_statistics(self):
         """Probar obtención de estadísticas"""
         # Abrir y cerrar algunas posiciones
         for i in range(3):
-            self.manager.open_position(
-                position_id=f"test_stat_{i}",
-                pair="BTC/USD",
-                side="buy",
-                entry_price=45000.0,
-                volume=0.1,
-                stop_loss=44000.0,
-                take_profit_1=46500.0,
-                take_profit_2=48000.0,
-                take_profit_3=50000.0
-            )
+            self._open_btc_position(f"test_stat_{i}")
             # Fully close the position to register it in statistics
             self.manager.close_position_stop_loss(f"test_stat_{i}", 46500.0)
         
         stats = self.manager.get_statistics()
         self.assertGreater(stats["total_trades"], 0)
         self.assertGreater(stats["win_rate"], 0)
-        logger.info(f"Estadísticas: {stats}")
+        logger.info("Estadísticas: %s", stats)
 
 
 class TestIntegration(unittest.TestCase):
@@ -310,18 +708,10 @@ class TestIntegration(unittest.TestCase):
     def test_full_trading_cycle(self):
         """Probar ciclo completo de trading"""
         # Crear datos OHLCV
-        ohlcv_data = []
-        for i in range(200):
-            time = 1000 + i
-            open_price = 100.0 + i*0.5
-            high = open_price + 1.0
-            low = open_price - 0.5
-            close = open_price + 0.3
-            volume = 1000 + i*10
-            ohlcv_data.append([time, open_price, high, low, close, volume])
+        ohlcv_data = build_ohlcv(step=0.5, high_offset=1.0, low_offset=0.5, close_offset=0.3)
         
         # Generar señal
-        generator = SignalGenerator()
+        generator = SIGNAL_GENERATOR
         current_price = 200.0
         signal = generator.generate_signal(ohlcv_data, current_price)
         
@@ -354,18 +744,65 @@ class TestIntegration(unittest.TestCase):
                 logger.info("Ciclo de trading completado exitosamente")
 
 
-def run_tests():
-    """Ejecutar todas las pruebas"""
+# Clases de prueba independientes entre sí (se pueden ejecutar en paralelo)
+TEST_CASES = (
+    TestTechnicalAnalysis,
+    TestMarketDataProcessor,
+    TestSignalGenerator,
+    TestRiskManager,
+    TestIntegration
+)
+
+
+def _run_case(case_name: str) -> Tuple[bool, str]:
+    """
+    Ejecutar una clase de prueba capturando su salida (proceso hijo).
+    
+    Args:
+        case_name: Nombre de la clase de prueba
+        
+    Returns:
+        Tupla (éxito, salida del runner)
+    """
+    stream = io.StringIO()
+    suite = unittest.TestLoader().loadTestsFromTestCase(globals()[case_name])
+    result = unittest.TextTestRunner(stream=stream, verbosity=2).run(suite)
+    return result.wasSuccessful(), stream.getvalue()
+
+
+def _has_xdist() -> bool:
+    """Indicar si pytest y pytest-xdist están instalados"""
+    return all(importlib.util.find_spec(name) is not None for name in ("pytest", "xdist"))
+
+
+def run_tests(parallel: bool = False):
+    """
+    Ejecutar todas las pruebas.
+    
+    Args:
+        parallel: Ejecutar cada clase de prueba en un proceso distinto
+    """
+    if parallel and _has_xdist():
+        # pytest-xdist reparte las clases entre núcleos (loadscope mantiene
+        # cada clase y sus fixtures de setUpClass en el mismo worker)
+        import pytest
+        return pytest.main([__file__, "-n", "auto", "--dist=loadscope", "-q"]) == 0
+    
+    if parallel:
+        workers = min(len(TEST_CASES), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_run_case, [case.__name__ for case in TEST_CASES]))
+        for _, output in results:
+            sys.stderr.write(output)
+        return all(success for success, _ in results)
+    
     # Crear suite de pruebas
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
     
     # Agregar pruebas
-    suite.addTests(loader.loadTestsFromTestCase(TestTechnicalAnalysis))
-    suite.addTests(loader.loadTestsFromTestCase(TestMarketDataProcessor))
-    suite.addTests(loader.loadTestsFromTestCase(TestSignalGenerator))
-    suite.addTests(loader.loadTestsFromTestCase(TestRiskManager))
-    suite.addTests(loader.loadTestsFromTestCase(TestIntegration))
+    for case in TEST_CASES:
+        suite.addTests(loader.loadTestsFromTestCase(case))
     
     # Ejecutar pruebas
     runner = unittest.TextTestRunner(verbosity=2)
@@ -376,5 +813,5 @@ def run_tests():
 
 
 if __name__ == "__main__":
-    success = run_tests()
+    success = run_tests(parallel="--parallel" in sys.argv)
     exit(0 if success else 1)
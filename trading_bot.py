@@ -5,13 +5,19 @@ Orquesta todas las capas del sistema.
 
 import os
 import sys
-import json
 import time
+import queue
+import atexit
 import logging
-from typing import Dict, Optional, List
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, List, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import numpy as np
+import orjson
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
@@ -20,18 +26,43 @@ load_dotenv()
 from kraken_client import KrakenClient, KrakenConfig
 from technical_analysis import MarketDataProcessor, TechnicalIndicators
 from signal_generator import SignalGenerator, SignalType
-from risk_manager import RiskManager, RiskConfig, PositionStatus
+from risk_manager import RiskManager, RiskConfig, PositionStatus, datetime_to_ns
+
+
+def _configure_logging():
+    """
+    Configurar logging asíncrono: el ciclo de trading solo encola los
+    registros y un hilo de QueueListener los escribe en archivo y consola.
+    
+    Los handlers que ya tenga el logger raíz (kraken_client lo configura al
+    importarse) pasan al listener; si no hay ninguno se usan los por defecto.
+    """
+    root = logging.getLogger()
+    if any(isinstance(handler, QueueHandler) for handler in root.handlers):
+        return
+    
+    handlers = list(root.handlers)
+    if not handlers:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = [logging.FileHandler('trading_bot.log'), logging.StreamHandler()]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        root.setLevel(logging.INFO)
+    
+    log_queue = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Detener al salir del proceso para vaciar la cola, incluidos los
+    # registros que main() emite después de TradingBot.stop()
+    atexit.register(listener.stop)
 
 
 # Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('trading_bot.log'),
-        logging.StreamHandler()
-    ]
-)
+_configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -41,6 +72,24 @@ class TradingBot:
     Orquesta todas las capas: cliente API, análisis técnico, generación de señales, gestión de riesgos.
     """
     
+    # Atributos fijos: acceso por offset en lugar de búsqueda en __dict__
+    __slots__ = (
+        "config", "kraken_client", "signal_generator", "risk_manager",
+        "is_running", "last_signal_time", "min_signal_interval",
+        "_paper_trading", "_atr_multiplier", "_trading_pairs",
+        "_timeframe_seconds", "_monitor_interval", "_stop_event",
+        "_ohlcv_cache", "_ohlcv_buffers", "_fetch_pool"
+    )
+    
+    # Segundos tras el cierre de vela antes de analizar (la vela ya está publicada)
+    CANDLE_CLOSE_DELAY = 2.0
+    # Velas conservadas por par (máximo que devuelve el endpoint OHLC)
+    OHLCV_HISTORY = 720
+    # Intervalos en minutos que acepta el endpoint OHLC de Kraken
+    OHLC_INTERVALS = (1, 5, 15, 30, 60, 240, 1440, 10080, 21600)
+    # Etiqueta de cada lado de orden para los mensajes de log
+    _SIDE_LABELS = {"buy": "COMPRA", "sell": "VENTA"}
+    
     def __init__(self, config_file: str = "bot_config.json"):
         """
         Inicializar bot de trading.
@@ -50,6 +99,19 @@ class TradingBot:
         """
         self.config = self._load_config(config_file)
         
+        # Parámetros consultados en cada ciclo, resueltos una sola vez
+        self._paper_trading = bool(self.config.get("paper_trading", True))
+        self._atr_multiplier = float(self.config.get("atr_multiplier", 2.0))
+        self._trading_pairs = tuple(self.config.get("trading_pairs", []))
+        timeframe_minutes = self.config.get("timeframe_minutes", 5)
+        if timeframe_minutes not in self.OHLC_INTERVALS:
+            raise ValueError(
+                f"timeframe_minutes={timeframe_minutes} no es un intervalo OHLC de Kraken "
+                f"{self.OHLC_INTERVALS}"
+            )
+        self._timeframe_seconds = timeframe_minutes * 60
+        self._monitor_interval = self.config.get("monitor_interval_seconds", 60)
+        
         # Configurar nivel de log dinámicamente según config
         log_level_name = self.config.get("logging_level", "INFO").upper()
         logging.getLogger().setLevel(getattr(logging, log_level_name, logging.INFO))
@@ -62,10 +124,10 @@ class TradingBot:
             balance = self.kraken_client.get_account_balance()
             real_balance = float(balance.get('ZUSD', balance.get('USD', 0.0)))
             if real_balance > 0:
-                logger.info(f"Usando saldo real de cuenta: ${real_balance:.2f}")
+                logger.info("Usando saldo real de cuenta: $%.2f", real_balance)
                 self.config['total_capital'] = real_balance
         except Exception as e:
-            logger.warning(f"No se pudo obtener saldo inicial: {e}")
+            logger.warning("No se pudo obtener saldo inicial: %s", e)
 
         self.signal_generator = SignalGenerator(
             rsi_oversold=self.config.get("rsi_oversold", 30.0),
@@ -85,14 +147,27 @@ class TradingBot:
         self.risk_manager = RiskManager(risk_config)
 
         # Sincronizar posiciones si es trading real
-        if not self.config.get("paper_trading", True):
+        if not self._paper_trading:
             self._sync_positions_with_exchange()
         
         # Estado del bot
         self.is_running = False
+        self._stop_event = threading.Event()
         self.last_signal_time = {}
         self.min_signal_interval = self.config.get("min_signal_interval_minutes", 5) * 60
         
+        # Valor "last" de Kraken y velas válidas por par, para pedir solo las
+        # nuevas en el siguiente ciclo. Las velas viven en un buffer fijo por
+        # par que se reescribe en cada descarga
+        self._ohlcv_cache: Dict[str, Tuple[int, int]] = {}
+        self._ohlcv_buffers: Dict[str, np.ndarray] = {}
+        
+        # Hilos para descargar el OHLCV de los pares en paralelo (E/S de red)
+        self._fetch_pool = ThreadPoolExecutor(
+            max_workers=self.config.get("max_workers", 8),
+            thread_name_prefix="ohlcv"
+        )
+        
         logger.info("Bot de trading inicializado")
     
     def _load_config(self, config_file: str) -> Dict:
@@ -106,13 +181,13 @@ class TradingBot:
             Diccionario con configuración
         """
         if not os.path.exists(config_file):
-            logger.warning(f"Archivo de configuración no encontrado: {config_file}")
+            logger.warning("Archivo de configuración no encontrado: %s", config_file)
             return self._get_default_config()
         
-        with open(config_file, 'r') as f:
-            config = json.load(f)
+        with open(config_file, 'rb') as f:
+            config = orjson.loads(f.read())
         
-        logger.info(f"Configuración cargada desde {config_file}")
+        logger.info("Configuración cargada desde %s", config_file)
         return config
     
     def _get_default_config(self) -> Dict:
@@ -137,6 +212,8 @@ class TradingBot:
             "min_confidence": 0.75,
             "min_signal_interval_minutes": 5,
             "atr_multiplier": 2.0,
+            "max_workers": 8,
+            "monitor_interval_seconds": 60,
             "paper_trading": True
         }
     
@@ -156,9 +233,13 @@ class TradingBot:
                 "Configure KRAKEN_API_KEY y KRAKEN_API_SECRET como variables de entorno"
             )
         
+        # Una conexión keep-alive por hilo de descarga: si el pool se queda
+        # corto, urllib3 descarta conexiones y cada solicitud repite TCP+TLS
+        pool_maxsize = max(KrakenConfig.pool_maxsize, self.config.get("max_workers", 8) + 1)
         config = KrakenConfig(
             api_key=api_key,
-            api_secret=api_secret
+            api_secret=api_secret,
+            pool_maxsize=pool_maxsize
         )
         
         return KrakenClient(config)
@@ -173,25 +254,24 @@ class TradingBot:
         try:
             # Verificar conexión
             server_time = self.kraken_client.get_server_time()
-            logger.info(f"Conexión establecida. Tiempo del servidor: {server_time}")
+            logger.info("Conexión establecida. Tiempo del servidor: %s", server_time)
             
             # Obtener saldo inicial
             balance = self.kraken_client.get_account_balance()
-            logger.info(f"Saldo inicial: {balance}")
+            logger.info("Saldo inicial: %s", balance)
             
-            # Loop principal
+            # Loop principal: un ciclo completo por cada cierre de vela
             while self.is_running:
                 try:
                     self._trading_cycle()
-                    time.sleep(60)  # Esperar 1 minuto antes del siguiente ciclo
                 except Exception as e:
-                    logger.error(f"Error en ciclo de trading: {e}", exc_info=True)
-                    time.sleep(60)
+                    logger.error("Error en ciclo de trading: %s", e, exc_info=True)
+                self._wait_for_next_candle()
         
         except KeyboardInterrupt:
             logger.info("Bot interrumpido por usuario")
         except Exception as e:
-            logger.error(f"Error fatal: {e}", exc_info=True)
+            logger.error("Error fatal: %s", e, exc_info=True)
         finally:
             self.stop()
     
@@ -200,6 +280,7 @@ class TradingBot:
         Detener el bot de trading.
         """
         self.is_running = False
+        self._stop_event.set()
         logger.info("Deteniendo bot...")
         
         # Cancelar todas las órdenes
@@ -207,7 +288,11 @@ class TradingBot:
             self.kraken_client.cancel_all_orders()
             logger.info("Todas las órdenes canceladas")
         except Exception as e:
-            logger.error(f"Error al cancelar órdenes: {e}")
+            logger.error("Error al cancelar órdenes: %s", e)
+        
+        # Persistir cambios de estado pendientes
+        self.risk_manager.flush()
+        self._fetch_pool.shutdown(wait=True)
         
         # Generar reporte final
         self._generate_report()
@@ -216,6 +301,37 @@ class TradingBot:
         self.kraken_client.close()
         logger.info("Bot detenido")
     
+    def _wait_for_next_candle(self):
+        """
+        Esperar al cierre de la próxima vela vigilando las posiciones abiertas.
+        
+        Entre cierres solo se comprueban stop loss y take profit cada
+        monitor_interval_seconds; la espera termina en cuanto se llama a stop().
+        """
+        timeframe = self._timeframe_seconds
+        monitor_interval = self._monitor_interval
+        delay = self.CANDLE_CLOSE_DELAY
+        next_cycle = ((time.time() - delay) // timeframe + 1) * timeframe + delay
+        
+        while True:
+            remaining = next_cycle - time.time()
+            if remaining <= 0 or self._stop_event.wait(min(monitor_interval, remaining)):
+                return
+            # Despertar antes del cierre: solo toca vigilar posiciones
+            if monitor_interval < remaining:
+                try:
+                    self._monitor_cycle()
+                except Exception as e:
+                    logger.error("Error monitoreando posiciones: %s", e, exc_info=True)
+    
+    def _monitor_cycle(self):
+        """
+        Actualizar precios y comprobar salidas de las posiciones abiertas.
+        """
+        if not self.risk_manager.positions:
+            return
+        self._monitor_positions(self._fetch_prices(self.risk_manager.open_pairs()))
+    
     def _sync_positions_with_exchange(self):
         """
         Sincronizar posiciones internas con los saldos reales en Kraken.
@@ -225,22 +341,22 @@ class TradingBot:
         try:
             # 1. Obtener saldo de todos los activos
             balance = self.kraken_client.get_account_balance()
-            logger.info(f"Saldos encontrados: {balance}")
+            logger.info("Saldos encontrados: %s", balance)
             
             # 2. Obtener historial de trades reciente para encontrar precios de entrada
             trades_history = self.kraken_client.get_trades_history()
             trades = trades_history.get('trades', {})
-            logger.info(f"Historial de trades recuperado: {len(trades)} operaciones")
+            logger.info("Historial de trades recuperado: %d operaciones", len(trades))
             
             # Debug: imprimir primeros trades para verificar estructura
             count = 0
             for txid, trade in trades.items():
                 if count < 3:
-                    logger.debug(f"Trade sample: {trade}")
+                    logger.debug("Trade sample: %s", trade)
                     count += 1
             
             # 3. Analizar cada par configurado
-            for pair in self.config.get("trading_pairs", []):
+            for pair in self._trading_pairs:
                 # Determinar activo base (ej. ETHUSD -> XETH, XBTUSD -> XXBT)
                 # Kraken usa prefijos X para cripto y Z para fiat a veces, o nombres cortos
                 # Intentamos adivinar el activo base del par
@@ -260,7 +376,7 @@ class TradingBot:
                     continue
                     
                 amount = float(balance[base_asset])
-                logger.info(f"Detectado saldo de {amount} {base_asset} para par {pair}")
+                logger.info("Detectado saldo de %s %s para par %s", amount, base_asset, pair)
                 
                 # Verificar si ya tenemos esta posición trackeada
                 existing_position = False
@@ -270,7 +386,7 @@ class TradingBot:
                         break
                 
                 if existing_position:
-                    logger.info(f"Posición para {pair} ya está trackeada internamente.")
+                    logger.info("Posición para %s ya está trackeada internamente.", pair)
                     continue
                 
                 # Buscar último trade de compra para este par
@@ -301,12 +417,12 @@ class TradingBot:
                     if is_same_pair and trade.get('type') == 'buy':
                         last_buy_price = float(trade.get('price', 0))
                         last_buy_time = datetime.fromtimestamp(trade.get('time'))
-                        logger.info(f"Encontrada última compra de {pair} ({trade_pair}): Precio {last_buy_price} fecha {last_buy_time}")
+                        logger.info("Encontrada última compra de %s (%s): Precio %s fecha %s", pair, trade_pair, last_buy_price, last_buy_time)
                         break
                 
                 if last_buy_price > 0:
                     # Reconstruir posición
-                    logger.info(f"Recuperando posición histórica para {pair}")
+                    logger.info("Recuperando posición histórica para %s", pair)
                     
                     # Calcular SL y TP estimados basados en config actual
                     # Asumimos riesgo estándar ya que perdimos la señal original
@@ -334,13 +450,13 @@ class TradingBot:
                     )
                     # Ajustar fecha real
                     if position_id in self.risk_manager.positions:
-                        self.risk_manager.positions[position_id].entry_time = last_buy_time
+                        self.risk_manager.positions[position_id].entry_time = datetime_to_ns(last_buy_time)
                         self.risk_manager.save_state()
                 
                 else:
                     # FALLBACK: Si hay saldo pero no encontramos el trade, usamos precio actual
                     # Esto asegura que la posición sea gestionada aunque no sepamos el precio exacto de entrada
-                    logger.warning(f"Saldo encontrado en {pair} pero sin historial de compra reciente. Usando precio actual como referencia.")
+                    logger.warning("Saldo encontrado en %s pero sin historial de compra reciente. Usando precio actual como referencia.", pair)
                     
                     try:
                         ticker = self.kraken_client.get_ticker(pair)
@@ -377,119 +493,252 @@ class TradingBot:
                         self.risk_manager.save_state()
                         
                     except Exception as e:
-                        logger.error(f"Error creando posición fallback para {pair}: {e}")
+                        logger.error("Error creando posición fallback para %s: %s", pair, e)
                         
         except Exception as e:
-            logger.error(f"Error sincronizando posiciones: {e}")
+            logger.error("Error sincronizando posiciones: %s", e)
 
     def _trading_cycle(self):
         """
         Ejecutar un ciclo de trading.
         """
         logger.debug("Iniciando ciclo de trading")
+        # Marca de tiempo única del ciclo (intervalo entre señales e IDs)
+        now = time.time()
+        
+        # Un solo Ticker para los pares configurados y los de posiciones abiertas
+        trading_pairs = self._trading_pairs
+        prices = self._fetch_prices(dict.fromkeys((*trading_pairs, *self.risk_manager.open_pairs())))
+        
+        # Las descargas de OHLCV se solapan en hilos; el análisis y la gestión
+        # de posiciones siguen en este hilo, sin estado compartido entre pares.
+        # Los pares con una señal reciente no se descargan: su señal se descartaría
+        fetch_pairs = [
+            pair for pair in trading_pairs
+            if pair in prices and not self._in_signal_cooldown(pair, now)
+        ]
+        ohlcv_by_pair = dict(zip(fetch_pairs, self._fetch_pool.map(self._fetch_ohlcv, fetch_pairs)))
         
         # Procesar cada par de trading
-        for pair in self.config.get("trading_pairs", []):
+        for pair in trading_pairs:
             try:
-                self._process_pair(pair)
+                self._process_pair(pair, prices.get(pair), ohlcv_by_pair.get(pair), now)
             except Exception as e:
-                logger.error(f"Error procesando {pair}: {e}", exc_info=True)
+                logger.error("Error procesando %s: %s", pair, e, exc_info=True)
         
         # Monitorear posiciones abiertas
-        self._monitor_positions()
+        self._monitor_positions(prices)
     
-    def _process_pair(self, pair: str):
+    @staticmethod
+    def _match_response_key(pair: str, response: Dict, single: bool = True) -> Optional[str]:
+        """
+        Encontrar la clave de un par en una respuesta de Kraken.
+        
+        Kraken responde con nombres canónicos (XBTUSD -> XXBTZUSD), así que
+        se busca el nombre exacto y, si no está, una clave que contenga el
+        activo base y la cotizada del par.
+        
+        Args:
+            pair: Par solicitado
+            response: Respuesta indexada por par
+            single: La respuesta corresponde solo a este par
+            
+        Returns:
+            Clave del par o None si no aparece
+        """
+        if pair in response:
+            return pair
+        keys = [k for k in response if k != 'last']
+        base, quote = pair[:-3], pair[-3:]
+        for key in keys:
+            if base in key and key.endswith(quote):
+                return key
+        # Respuesta de un único par con un nombre no deducible (ej. XDGUSD)
+        return keys[0] if len(keys) == 1 and single else None
+    
+    def _fetch_prices(self, pairs: Iterable[str]) -> Dict[str, float]:
+        """
+        Obtener el último precio de varios pares con una sola solicitud.
+        
+        Si la solicitud conjunta falla (por ejemplo, por un par inválido),
+        se consulta cada par por separado para no bloquear a los demás.
+        
+        Args:
+            pairs: Pares de trading
+            
+        Returns:
+            Diccionario par -> precio (solo los pares obtenidos)
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return {}
+        
+        try:
+            tickers = self.kraken_client.get_tickers(pairs)
+            responses = dict.fromkeys(pairs, tickers)
+            single = len(pairs) == 1
+        except Exception as e:
+            logger.warning("Error obteniendo tickers en bloque, consultando por par: %s", e)
+            responses = {}
+            single = True
+            for pair in pairs:
+                try:
+                    responses[pair] = self.kraken_client.get_ticker(pair)
+                except Exception as e:
+                    logger.error("Error obteniendo ticker de %s: %s", pair, e)
+        
+        prices = {}
+        for pair, ticker in responses.items():
+            key = self._match_response_key(pair, ticker, single)
+            if key is None:
+                logger.warning("No se encontró ticker para %s", pair)
+                continue
+            prices[pair] = float(ticker[key]["c"][0])
+        return prices
+    
+    def _process_pair(
+        self,
+        pair: str,
+        current_price: Optional[float],
+        ohlcv_data: Optional[np.ndarray],
+        now: float
+    ):
         """
         Procesar un par de trading.
         
         Args:
             pair: Par de trading (ej: XBTUSD)
+            current_price: Último precio del par (None si no se obtuvo)
+            ohlcv_data: Velas del par descargadas en este ciclo (array de _fetch_ohlcv)
+            now: Marca de tiempo del ciclo
         """
-        # Obtener datos OHLCV
+        if current_price is None:
+            logger.warning("Sin precio actual para %s", pair)
+            return
+        
+        # Intervalo mínimo entre señales: ni se descargan velas ni se analizan
+        if self._in_signal_cooldown(pair, now):
+            logger.debug("Intervalo mínimo no alcanzado para %s", pair)
+            return
+        
         try:
-            ohlcv_data = self._fetch_ohlcv(pair)
-            if not ohlcv_data:
-                logger.warning(f"No se obtuvieron datos para {pair}")
+            if ohlcv_data is None or len(ohlcv_data) == 0:
+                logger.warning("No se obtuvieron datos para %s", pair)
                 return
             
-            # Obtener precio actual
-            ticker = self.kraken_client.get_ticker(pair)
-            
-            # Manejar mapeo de nombres en ticker
-            ticker_key = pair
-            if pair not in ticker:
-                 possible_keys = list(ticker.keys())
-                 if possible_keys:
-                     ticker_key = possible_keys[0]
-                     logger.debug(f"Mapeando ticker {pair} a {ticker_key}")
-                 else:
-                     logger.warning(f"No se encontró ticker para {pair}")
-                     return
-
-            current_price = float(ticker[ticker_key]["c"][0])
-            
             # Generar señal
             signal = self.signal_generator.generate_signal(
                 ohlcv_data,
                 current_price,
-                atr_multiplier=self.config.get("atr_multiplier", 2.0)
+                atr_multiplier=self._atr_multiplier
             )
             
             # Feedback visual para el usuario
             signal_desc = signal.signal_type.value if signal else "NEUTRAL"
-            logger.info(f"Análisis {pair}: Precio=${current_price:.2f} | Señal={signal_desc}")
+            logger.info("Análisis %s: Precio=$%.2f | Señal=%s", pair, current_price, signal_desc)
             
             if signal:
-                self._handle_signal(pair, signal, current_price)
+                self._handle_signal(pair, signal, current_price, now)
         
         except Exception as e:
-            logger.error(f"Error procesando {pair}: {e}")
+            logger.error("Error procesando %s: %s", pair, e)
     
-    def _fetch_ohlcv(self, pair: str) -> Optional[List]:
+    def _in_signal_cooldown(self, pair: str, now: float) -> bool:
+        """
+        Indicar si el par emitió una señal hace menos de min_signal_interval.
+        
+        Los ciclos se alinean al cierre de vela, así que dos ciclos separados
+        un timeframe pueden distar unos milisegundos menos; se tolera hasta
+        CANDLE_CLOSE_DELAY para que el intervalo no salte a una vela más.
+        
+        Args:
+            pair: Par de trading
+            now: Marca de tiempo del ciclo
+            
+        Returns:
+            True si aún no se debe buscar otra señal para el par
+        """
+        elapsed = now - self.last_signal_time.get(pair, 0)
+        return elapsed + self.CANDLE_CLOSE_DELAY < self.min_signal_interval
+    
+    def _fetch_ohlcv(self, pair: str) -> Optional[np.ndarray]:
         """
         Obtener datos OHLCV para un par.
         
+        Tras la primera descarga solo se piden las velas posteriores al
+        último "last" recibido y se combinan con las guardadas; la vela
+        abierta se sustituye por su versión más reciente. Las velas se
+        escriben en un buffer preasignado del par, así que el array devuelto
+        solo es válido hasta la siguiente descarga de ese par.
+        
         Args:
             pair: Par de trading
             
         Returns:
-            Lista de datos OHLCV o None
+            Vista float64 (N, 6) C-contigua y de solo lectura con velas
+            [time, open, high, low, close, volume] o None. Llega tal cual a
+            los kernels de Numba del análisis técnico, sin copias intermedias
         """
         try:
-            # Obtener datos OHLC de 5 minutos
-            ohlc_data = self.kraken_client.get_ohlc(pair, interval=5)
+            cached = self._ohlcv_cache.get(pair)
+            since = cached[0] if cached else None
+            
+            # Velas del mismo timeframe al que se alinean los ciclos
+            ohlc_data = self.kraken_client.get_ohlc(
+                pair, interval=self._timeframe_seconds // 60, since=since
+            )
             
             # Identificar la clave correcta (Kraken puede usar nombres canónicos como XXBTZUSD)
-            data_key = pair
-            if pair not in ohlc_data:
-                # Buscar cualquier clave que no sea 'last'
-                possible_keys = [k for k in ohlc_data.keys() if k != 'last']
-                if possible_keys:
-                    data_key = possible_keys[0]
-                    logger.debug(f"Mapeando par solicitado {pair} a respuesta {data_key}")
-                else:
-                    logger.warning(f"No se encontraron datos para {pair}. Claves: {list(ohlc_data.keys())}")
-                    return None
+            data_key = self._match_response_key(pair, ohlc_data)
+            if data_key is None:
+                logger.warning("No se encontraron datos para %s. Claves: %s", pair, list(ohlc_data.keys()))
+                return None
             
             # Convertir a formato esperado [time, open, high, low, close, volume]
-            ohlcv_list = []
-            for candle in ohlc_data[data_key]:
-                ohlcv_list.append([
-                    candle[0],  # time
-                    float(candle[1]),  # open
-                    float(candle[2]),  # high
-                    float(candle[3]),  # low
-                    float(candle[4]),  # close
-                    float(candle[6])   # volume
-                ])
+            # en una sola pasada (Kraken envía [time, o, h, l, c, vwap, volume, count]).
+            # Los precios llegan como texto: np.array los convierte en C, algo que
+            # un kernel de Numba no puede hacer sobre listas de cadenas
+            rows = ohlc_data[data_key]
+            candles = np.array(
+                [(c[0], c[1], c[2], c[3], c[4], c[6]) for c in rows],
+                dtype=np.float64
+            ).reshape(-1, 6)
+            
+            buffer = self._ohlcv_buffers.get(pair)
+            if buffer is None:
+                buffer = np.empty((self.OHLCV_HISTORY, 6), dtype=np.float64)
+                self._ohlcv_buffers[pair] = buffer
             
-            return ohlcv_list
+            count = cached[1] if cached else 0
+            if len(candles):
+                if count and candles[0, 0] > buffer[count - 1, 0] + self._timeframe_seconds:
+                    # Hueco (p. ej. tras una caída larga Kraken solo devuelve
+                    # las últimas velas): descartar el histórico no contiguo
+                    logger.warning("Hueco en las velas de %s, se descarta el histórico", pair)
+                    count = 0
+                # Las velas recibidas reemplazan a las guardadas desde su inicio
+                count = int(np.searchsorted(buffer[:count, 0], candles[0, 0]))
+                candles = candles[-self.OHLCV_HISTORY:]
+                # Sin espacio: desplazar las más antiguas fuera del buffer
+                overflow = count + len(candles) - self.OHLCV_HISTORY
+                if overflow > 0:
+                    buffer[:count - overflow] = buffer[overflow:count]
+                    count -= overflow
+                buffer[count:count + len(candles)] = candles
+                count += len(candles)
+            if not count:
+                return None
+            
+            self._ohlcv_cache[pair] = (int(ohlc_data.get("last", since or 0)), count)
+            view = buffer[:count]
+            view.flags.writeable = False
+            return view
         
         except Exception as e:
-            logger.error(f"Error obteniendo OHLCV para {pair}: {e}")
+            logger.error("Error obteniendo OHLCV para %s: %s", pair, e)
             return None
     
-    def _handle_signal(self, pair: str, signal, current_price: float):
+    def _handle_signal(self, pair: str, signal, current_price: float, now: float):
         """
         Manejar una señal de trading.
         
@@ -497,47 +746,45 @@ class TradingBot:
             pair: Par de trading
             signal: Señal generada
             current_price: Precio actual
+            now: Marca de tiempo del ciclo
         """
-        # Verificar intervalo mínimo entre señales
-        last_time = self.last_signal_time.get(pair, 0)
-        if time.time() - last_time < self.min_signal_interval:
-            logger.debug(f"Intervalo mínimo no alcanzado para {pair}")
-            return
-        
         if signal.signal_type == SignalType.BUY:
             # Verificar saldo real antes de procesar compra
-            if not self.config.get("paper_trading", True):
+            if not self._paper_trading:
                 try:
                     balance = self.kraken_client.get_account_balance()
                     usd_balance = float(balance.get('ZUSD', balance.get('USD', 0.0)))
                     # Kraken requiere un volumen mínimo que suele ser > $1-2 USD dependiendo del par
                     if usd_balance < 2.0: 
-                        logger.info(f"Saldo insuficiente (${usd_balance:.2f}) para nueva compra. Ignorando señal.")
+                        logger.info("Saldo insuficiente ($%.2f) para nueva compra. Ignorando señal.", usd_balance)
                         return
                     
                     # Actualizar capital en risk manager para este cálculo
                     self.risk_manager.config.total_capital = usd_balance
                 except Exception as e:
-                    logger.warning(f"No se pudo verificar saldo antes de operar: {e}")
+                    logger.warning("No se pudo verificar saldo antes de operar: %s", e)
 
-            self._execute_buy_signal(pair, signal, current_price)
+            self._execute_signal(pair, signal, current_price, "buy", now)
         elif signal.signal_type == SignalType.SELL:
-            self._execute_sell_signal(pair, signal, current_price)
+            self._execute_signal(pair, signal, current_price, "sell", now)
         
-        self.last_signal_time[pair] = time.time()
+        self.last_signal_time[pair] = now
     
-    def _execute_buy_signal(self, pair: str, signal, current_price: float):
+    def _execute_signal(self, pair: str, signal, current_price: float, side: str, now: float):
         """
-        Ejecutar señal de compra.
+        Ejecutar una señal de compra o de venta.
         
         Args:
             pair: Par de trading
-            signal: Señal de compra
+            signal: Señal generada
             current_price: Precio actual
+            side: Lado de la orden ("buy" o "sell")
+            now: Marca de tiempo del ciclo
         """
+        label = self._SIDE_LABELS[side]
         logger.info(
-            f"Señal de COMPRA para {pair}: Confianza {signal.confidence:.2%}, "
-            f"Precio: {current_price:.2f}"
+            "Señal de %s para %s: Confianza %.2f%%, Precio: %.2f",
+            label, pair, signal.confidence * 100, current_price
         )
         
         # Calcular tamaño de posición
@@ -548,175 +795,98 @@ class TradingBot:
         )
         
         if volume <= 0:
-            logger.warning(f"Volumen inválido para {pair}: {volume}")
+            logger.warning("Volumen inválido para %s: %s", pair, volume)
             return
         
         # Abrir posición
-        position_id = f"{pair}_{int(time.time())}"
+        position_id = f"{pair}_{int(now)}"
+        position = dict(
+            position_id=position_id,
+            pair=pair,
+            side=side,
+            entry_price=signal.entry_price,
+            volume=volume,
+            stop_loss=signal.stop_loss,
+            take_profit_1=signal.take_profit_1,
+            take_profit_2=signal.take_profit_2,
+            take_profit_3=signal.take_profit_3
+        )
         
-        if self.config.get("paper_trading", True):
+        if self._paper_trading:
             # Paper trading - simular
-            self.risk_manager.open_position(
-                position_id=position_id,
+            self.risk_manager.open_position(**position)
+            logger.info("Posición de %s simulada: %s", label, position_id)
+            return
+        
+        # Trading real
+        try:
+            result = self.kraken_client.add_order(
                 pair=pair,
-                side="buy",
-                entry_price=signal.entry_price,
+                side=side,
+                ordertype="limit",
                 volume=volume,
-                stop_loss=signal.stop_loss,
-                take_profit_1=signal.take_profit_1,
-                take_profit_2=signal.take_profit_2,
-                take_profit_3=signal.take_profit_3
+                price=signal.entry_price
             )
-            logger.info(f"Posición de COMPRA simulada: {position_id}")
-        else:
-            # Trading real
-            try:
-                result = self.kraken_client.add_order(
-                    pair=pair,
-                    side="buy",
-                    ordertype="limit",
-                    volume=volume,
-                    price=signal.entry_price
-                )
-                logger.info(f"Orden de COMPRA ejecutada: {result}")
-                
-                # Registrar posición en el gestor de riesgo para seguimiento
-                self.risk_manager.open_position(
-                    position_id=position_id,
-                    pair=pair,
-                    side="buy",
-                    entry_price=signal.entry_price,
-                    volume=volume,
-                    stop_loss=signal.stop_loss,
-                    take_profit_1=signal.take_profit_1,
-                    take_profit_2=signal.take_profit_2,
-                    take_profit_3=signal.take_profit_3
-                )
-            except Exception as e:
-                logger.error(f"Error ejecutando orden de compra: {e}")
+            logger.info("Orden de %s ejecutada: %s", label, result)
+            
+            # Registrar la compra en el gestor de riesgo para seguimiento
+            # (una venta real en spot no abre posición que vigilar)
+            if side == "buy":
+                self.risk_manager.open_position(**position)
+        except Exception as e:
+            logger.error("Error ejecutando orden de %s: %s", label.lower(), e)
     
-    def _execute_sell_signal(self, pair: str, signal, current_price: float):
+    def _monitor_positions(self, prices: Dict[str, float]):
         """
-        Ejecutar señal de venta.
+        Monitorear posiciones abiertas.
+        
+        Precios, stop loss y take profit se evalúan para todas las posiciones
+        en una pasada vectorizada del gestor de riesgos; solo se recorren
+        las posiciones que deben cerrarse.
         
         Args:
-            pair: Par de trading
-            signal: Señal de venta
-            current_price: Precio actual
+            prices: Último precio por par obtenido en el ciclo
         """
-        logger.info(
-            f"Señal de VENTA para {pair}: Confianza {signal.confidence:.2%}, "
-            f"Precio: {current_price:.2f}"
-        )
-        
-        # Calcular tamaño de posición
-        volume = self.risk_manager.calculate_position_size(
-            signal.entry_price,
-            signal.stop_loss,
-            signal.confidence
-        )
-        
-        if volume <= 0:
-            logger.warning(f"Volumen inválido para {pair}: {volume}")
+        risk_manager = self.risk_manager
+        if not risk_manager.positions:
             return
         
-        # Abrir posición
-        position_id = f"{pair}_{int(time.time())}"
+        for pair in risk_manager.open_pairs() - prices.keys():
+            logger.warning("No se encontró ticker para %s", pair)
         
-        if self.config.get("paper_trading", True):
-            # Paper trading - simular
-            self.risk_manager.open_position(
-                position_id=position_id,
-                pair=pair,
-                side="sell",
-                entry_price=signal.entry_price,
-                volume=volume,
-                stop_loss=signal.stop_loss,
-                take_profit_1=signal.take_profit_1,
-                take_profit_2=signal.take_profit_2,
-                take_profit_3=signal.take_profit_3
-            )
-            logger.info(f"Posición de VENTA simulada: {position_id}")
-        else:
-            # Trading real
-            try:
-                result = self.kraken_client.add_order(
-                    pair=pair,
-                    side="sell",
-                    ordertype="limit",
-                    volume=volume,
-                    price=signal.entry_price
-                )
-                logger.info(f"Orden de VENTA ejecutada: {result}")
-            except Exception as e:
-                logger.error(f"Error ejecutando orden de venta: {e}")
-    
-    def _monitor_positions(self):
-        """
-        Monitorear posiciones abiertas.
-        """
-        if not self.risk_manager.positions:
-            return
+        risk_manager.update_prices(prices)
         
-        for position_id, position in list(self.risk_manager.positions.items()):
+        for position_id, tp_level in risk_manager.check_all(prices):
             try:
-                # Obtener precio actual
-                ticker = self.kraken_client.get_ticker(position.pair)
-                
-                # Manejar mapeo de nombres en ticker
-                ticker_key = position.pair
-                if position.pair not in ticker:
-                     possible_keys = list(ticker.keys())
-                     if possible_keys:
-                         ticker_key = possible_keys[0]
-                     else:
-                         logger.warning(f"No se encontró ticker para {position.pair}")
-                         continue
-
-                current_price = float(ticker[ticker_key]["c"][0])
+                # Datos leídos antes de cerrar: la posición se recicla al cerrarse
+                position = risk_manager.positions[position_id]
+                pair, side = position.pair, position.side
+                current_price = prices[pair]
                 
-                # Actualizar precio
-                self.risk_manager.update_position_price(position_id, current_price)
-                
-                # Verificar stop loss
-                if self.risk_manager.check_stop_loss(position_id, current_price):
-                    volume_closed = self.risk_manager.close_position_stop_loss(position_id, current_price)
-                    logger.warning(f"Stop loss ejecutado: {position_id}")
-                    
-                    # Ejecutar venta real si aplica
-                    if not self.config.get("paper_trading", True) and volume_closed > 0:
-                        try:
-                            self.kraken_client.add_order(
-                                pair=position.pair,
-                                side="sell" if position.side == "buy" else "buy",
-                                ordertype="market",
-                                volume=volume_closed
-                            )
-                            logger.info(f"Orden de STOP LOSS enviada a Kraken para {position.pair}")
-                        except Exception as e:
-                            logger.error(f"Error ejecutando STOP LOSS en Kraken: {e}")
+                if tp_level == 0:
+                    volume_closed = risk_manager.close_position_stop_loss(position_id, current_price)
+                    logger.warning("Stop loss ejecutado: %s", position_id)
+                    event = "STOP LOSS"
+                else:
+                    volume_closed = risk_manager.close_position_partial(position_id, tp_level, current_price)
+                    logger.info("Take profit %d ejecutado: %s", tp_level, position_id)
+                    event = "TAKE PROFIT"
                 
-                # Verificar take profit
-                tp_level, reached = self.risk_manager.check_take_profit(position_id, current_price)
-                if reached:
-                    volume_closed = self.risk_manager.close_position_partial(position_id, tp_level, current_price)
-                    logger.info(f"Take profit {tp_level} ejecutado: {position_id}")
-
-                    # Ejecutar venta real si aplica
-                    if not self.config.get("paper_trading", True) and volume_closed > 0:
-                        try:
-                            self.kraken_client.add_order(
-                                pair=position.pair,
-                                side="sell" if position.side == "buy" else "buy",
-                                ordertype="market",
-                                volume=volume_closed
-                            )
-                            logger.info(f"Orden de TAKE PROFIT enviada a Kraken para {position.pair}")
-                        except Exception as e:
-                            logger.error(f"Error ejecutando TAKE PROFIT en Kraken: {e}")
+                # Ejecutar venta real si aplica
+                if not self._paper_trading and volume_closed > 0:
+                    try:
+                        self.kraken_client.add_order(
+                            pair=pair,
+                            side="sell" if side == "buy" else "buy",
+                            ordertype="market",
+                            volume=volume_closed
+                        )
+                        logger.info("Orden de %s enviada a Kraken para %s", event, pair)
+                    except Exception as e:
+                        logger.error("Error ejecutando %s en Kraken: %s", event, e)
             
             except Exception as e:
-                logger.error(f"Error monitoreando posición {position_id}: {e}")
+                logger.error("Error monitoreando posición %s: %s", position_id, e)
     
     def _generate_report(self):
         """
@@ -724,30 +894,34 @@ class TradingBot:
         """
         stats = self.risk_manager.get_statistics()
         
-        report = {
-            "timestamp": datetime.now().isoformat(),
-            "statistics": stats,
-            "positions": [
-                {
+        report_file = "trading_report.json"
+        # Cabecera y posiciones se serializan por separado y se escriben al
+        # vuelo, sin construir el reporte completo en memoria. orjson escribe
+        # las fechas en ISO 8601 (igual que isoformat)
+        with open(report_file, 'wb') as f:
+            f.write(b'{"timestamp": ')
+            f.write(orjson.dumps(datetime.now()))
+            f.write(b',\n"statistics": ')
+            f.write(orjson.dumps(stats, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
+            f.write(b',\n"positions": [')
+            separator = b'\n'
+            for p in self.risk_manager.get_recent_closed(10):  # Últimas 10 posiciones
+                f.write(separator)
+                f.write(orjson.dumps({
                     "id": p.position_id,
                     "pair": p.pair,
                     "side": p.side,
                     "entry_price": p.entry_price,
                     "volume": p.volume,
-                    "entry_time": p.entry_time.isoformat(),
-                    "status": p.status.value,
+                    "entry_time": p.entry_time_dt,
+                    "status": p.status.name,
                     "realized_pnl": p.realized_pnl
-                }
-                for p in self.risk_manager.closed_positions[-10:]  # Últimas 10 posiciones
-            ]
-        }
-        
-        report_file = "trading_report.json"
-        with open(report_file, 'w') as f:
-            json.dump(report, f, indent=2)
+                }, option=orjson.OPT_SERIALIZE_NUMPY))
+                separator = b',\n'
+            f.write(b'\n]}\n')
         
-        logger.info(f"Reporte guardado en {report_file}")
-        logger.info(f"Estadísticas finales: {stats}")
+        logger.info("Reporte guardado en %s", report_file)
+        logger.info("Estadísticas finales: %s", stats)
 
 
 def main():
@@ -760,7 +934,7 @@ def main():
     except KeyboardInterrupt:
         logger.info("Bot interrumpido")
     except Exception as e:
-        logger.error(f"Error fatal: {e}", exc_info=True)
+        logger.error("Error fatal: %s", e, exc_info=True)
         sys.exit(1)
 
 